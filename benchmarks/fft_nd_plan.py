@@ -0,0 +1,75 @@
+"""Compares the N-D plan path of cupy.fft with the per-axis 1-D path.
+
+For each shape, the script reports the number of bytes allocated for
+intermediate arrays (which is the volume of the axis swapping copies plus
+the outputs of each pass) and the elapsed time of the transforms.
+"""
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+
+import cupy
+from cupy.cuda import memory_hook
+from cupy.fft import config
+
+
+class AllocatedBytesHook(memory_hook.MemoryHook):
+
+    name = 'AllocatedBytesHook'
+
+    def __init__(self):
+        self.n_bytes = 0
+
+    def malloc_postprocess(self, **kwargs):
+        self.n_bytes += kwargs['size']
+
+
+def measure(func, a, n_run):
+    func(a)  # warm up the plan cache
+    hook = AllocatedBytesHook()
+    start = cupy.cuda.Event()
+    end = cupy.cuda.Event()
+    with hook:
+        start.record()
+        for _ in range(n_run):
+            func(a)
+        end.record()
+        end.synchronize()
+    elapsed = cupy.cuda.get_elapsed_time(start, end) / n_run
+    return hook.n_bytes // n_run, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Copy volume of N-D and per-axis FFT paths')
+    parser.add_argument('--gpu', '-g', default=0, type=int,
+                        help='ID of GPU.')
+    parser.add_argument('--n-run', default=20, type=int,
+                        help='Number of repetitions.')
+    args = parser.parse_args()
+
+    shapes = [(64, 512, 512), (16, 1024, 1024), (8, 128, 128, 128)]
+    funcs = [('fft2', cupy.fft.fft2), ('fftn', cupy.fft.fftn),
+             ('rfftn', cupy.fft.rfftn)]
+
+    cupy.cuda.set_allocator(cupy.cuda.MemoryPool().malloc)
+    print('{:8} {:>20} {:>14} {:>14} {:>10} {:>10}'.format(
+        'func', 'shape', 'per-axis [B]', 'N-D [B]', 'per-axis', 'N-D'))
+    with cupy.cuda.Device(args.gpu):
+        for shape in shapes:
+            a = cupy.random.rand(*shape).astype(cupy.complex64)
+            for name, func in funcs:
+                results = []
+                for enable in (False, True):
+                    config.enable_nd_planning = enable
+                    x = a.real.copy() if name == 'rfftn' else a
+                    results.append(measure(func, x, args.n_run))
+                config.enable_nd_planning = True
+                print('{:8} {:>20} {:>14} {:>14} {:>8.3f}ms {:>8.3f}ms'
+                      .format(name, str(shape), results[0][0], results[1][0],
+                              results[0][1], results[1][1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Measures the lookup cost of the in-memory kernel cache.
+
+The script reports the time of a hit in
+:class:`cupy.cuda.kernel_cache.MemoryCache` with a key of the same form as
+the one built by :func:`cupy.cuda.compile_with_cache`, and compares it with
+the md5 hashing of the on-disk cache key that a hit avoids. No GPU is used.
+"""
+from __future__ import print_function
+
+import argparse
+import hashlib
+import timeit
+
+from cupy.cuda import kernel_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Lookup cost of the in-memory kernel cache')
+    parser.add_argument('--source-size', default=4096, type=int,
+                        help='Length of the kernel source in characters.')
+    parser.add_argument('--n-entries', default=1024, type=int,
+                        help='Number of entries in the cache.')
+    parser.add_argument('--number', default=100000, type=int,
+                        help='Number of lookups to measure.')
+    args = parser.parse_args()
+
+    cache = kernel_cache.MemoryCache(args.n_entries)
+    options = ('-ftz=true',)
+    sources = ['{:08d}'.format(i) + 'x' * (args.source_size - 8)
+               for i in range(args.n_entries)]
+    for source in sources:
+        cache.put(('compute_70', options, source, None), b'cubin')
+
+    # The source strings generated by the kernel builders are usually new
+    # objects, whose hash is not cached yet.
+    source = sources[args.n_entries // 2]
+
+    def hit_same_object():
+        cache.get(('compute_70', options, source, None))
+
+    def hit_new_object():
+        cache.get(('compute_70', options, source[:-1] + 'x', None))
+
+    def md5_key():
+        key_src = '%s %s %s' % (('compute_70', options), source, None)
+        hashlib.md5(key_src.encode('utf-8')).hexdigest()
+
+    print('{:32} {:>10}'.format('operation', 'time [us]'))
+    for name, func in [('hit (same source object)', hit_same_object),
+                       ('hit (new source object)', hit_new_object),
+                       ('md5 of on-disk cache key', md5_key)]:
+        t = timeit.timeit(func, number=args.number) / args.number * 1e6
+        print('{:32} {:>10.3f}'.format(name, t))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Simulates the device memory pool on recorded allocation traces.
+
+The script replays traces recorded by
+:class:`cupy.cuda.memory_hooks.TraceRecorderHook` through
+:class:`cupy.cuda.memory.SingleDeviceMemoryPool` backed by a fake allocator
+with the default policy, the slab policy and geometric size classes, and
+reports the peak bytes acquired from the allocator (reserved bytes), the
+peak bytes in use, the fragmentation (the fraction of the acquired bytes
+that is not in use at the peak of the used bytes), the number of allocator
+calls and, when a limit of the pool is given, the number of allocations
+failed with :class:`~cupy.cuda.memory.OutOfMemoryError`. The allocations are
+replayed on the streams of the trace. The pool is created with an explicit
+device ID and no device memory is allocated, so the pool policies can be
+evaluated without a GPU.
+
+A trace is recorded as follows::
+
+    with cupy.cuda.memory_hooks.TraceRecorderHook('trace.bin'):
+        run_workload()
+
+When no trace is given, a synthetic trace is used, which alternates phases
+of large buffers of different sizes with small arrays, some of which live
+for several phases.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+
+from cupy.cuda import memory
+from cupy.cuda import memory_hooks
+from cupy.cuda.memory_hooks import trace_recorder
+from cupy.cuda import stream as stream_module
+
+
+MALLOC = trace_recorder.MALLOC
+FREE = trace_recorder.FREE
+
+
+class FakeMemory(memory.Memory):
+
+    next_ptr = 1 << 20
+
+    def __init__(self, size):
+        self.ptr = FakeMemory.next_ptr
+        FakeMemory.next_ptr += size
+        self.size = size
+
+    def __del__(self):
+        self.ptr = 0
+
+
+def fake_alloc(size):
+    return memory.MemoryPointer(FakeMemory(size), 0)
+
+
+class FakeStream(stream_module.Stream):
+
+    # A stream object only to make the pointer current.
+
+    def __init__(self, ptr):
+        self.ptr = ptr
+
+    def __del__(self):
+        pass
+
+
+def make_trace(n_phases, seed):
+    # The events are in the format of TraceRecorderHook. The pointers are
+    # only used to match the frees with the allocations.
+    rng = random.Random(seed)
+    mib = 1 << 20
+    events = []
+    sizes = {}
+    key = [1]
+
+    def malloc(size):
+        ptr = key[0]
+        key[0] += 1
+        sizes[ptr] = size
+        events.append(trace_recorder.TraceEvent(
+            MALLOC, 0, len(events), size, ptr, 0))
+        return ptr
+
+    def free(ptr):
+        events.append(trace_recorder.TraceEvent(
+            FREE, 0, len(events), sizes.pop(ptr), ptr, 0))
+
+    long_lived = []
+    for phase in range(n_phases):
+        size = rng.randint(8, 256) * mib
+        large = [malloc(size + rng.randint(0, mib)) for _ in range(4)]
+        for ptr in large:
+            free(ptr)
+        # Small arrays allocated while the large buffers are cached. Some of
+        # them live for several phases.
+        small = []
+        for _ in range(64):
+            ptr = malloc(rng.randint(1, 4 * mib))
+            if rng.random() < 0.05:
+                long_lived.append((phase + rng.randint(1, 20), ptr))
+            else:
+                small.append(ptr)
+            if len(small) > 8:
+                free(small.pop(rng.randrange(9)))
+        for ptr in small:
+            free(ptr)
+        for end, ptr in list(long_lived):
+            if end <= phase:
+                long_lived.remove((end, ptr))
+                free(ptr)
+    return events
+
+
+def simulate(events, configure, device_id=0):
+    pool = memory.SingleDeviceMemoryPool(
+        allocator=fake_alloc, device_id=device_id)
+    configure(pool)
+    streams = {0: stream_module.Stream.null}
+    live = {}
+    n_failures = 0
+    peak_used = 0
+    total_at_peak = 0
+    for event in events:
+        if event.op == MALLOC:
+            stream = streams.get(event.stream)
+            if stream is None:
+                stream = streams[event.stream] = FakeStream(event.stream)
+            with stream:
+                try:
+                    live[event.ptr] = pool.malloc(event.size)
+                except memory.OutOfMemoryError:
+                    n_failures += 1
+                    continue
+            used = pool.used_bytes()
+            if used > peak_used:
+                peak_used = used
+                total_at_peak = pool.total_bytes()
+        else:
+            live.pop(event.ptr, None)
+    stats = pool.get_stats()
+    live.clear()
+    if total_at_peak:
+        fragmentation = 1 - peak_used / float(total_at_peak)
+    else:
+        fragmentation = 0.0
+    return (stats['peak_total_bytes'], peak_used, fragmentation,
+            stats['n_mallocs'], n_failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Simulates the memory pool on allocation traces')
+    parser.add_argument('traces', nargs='*',
+                        help='Trace files recorded by TraceRecorderHook. '
+                             'A synthetic trace is used if omitted.')
+    parser.add_argument('--device', default=None, type=int,
+                        help='Device ID of the events to replay. All events '
+                             'are replayed if omitted.')
+    parser.add_argument('--n-phases', default=100, type=int,
+                        help='Number of phases of the synthetic trace.')
+    parser.add_argument('--seed', default=0, type=int,
+                        help='Random seed of the synthetic trace.')
+    parser.add_argument('--slab-size', default=2 << 20, type=int,
+                        help='Slab size of the slab policy in bytes.')
+    parser.add_argument('--cutoff', default=1 << 20, type=int,
+                        help='Cutoff of the geometric size classes.')
+    parser.add_argument('--n-classes', default=4, type=int,
+                        help='Number of size classes per doubling.')
+    parser.add_argument('--max-oversize', default=2.0, type=float,
+                        help='Bound of the ratio of a split block size to '
+                             'the requested size.')
+    parser.add_argument('--limit', default=0, type=int,
+                        help='Limit of the pool in bytes.')
+    args = parser.parse_args()
+
+    def default(pool):
+        pool.set_limit(args.limit)
+
+    def slab(pool):
+        default(pool)
+        pool.set_slab_size(args.slab_size)
+
+    def size_classes(pool):
+        default(pool)
+        pool.set_size_classes(args.cutoff, args.n_classes)
+
+    def bounded_size_classes(pool):
+        default(pool)
+        pool.set_size_classes(args.cutoff, args.n_classes, args.max_oversize)
+
+    policies = [('default', default), ('slab', slab),
+                ('size classes', size_classes),
+                ('bounded classes', bounded_size_classes)]
+    if args.traces:
+        traces = [(path, memory_hooks.load_trace(path))
+                  for path in args.traces]
+    else:
+        traces = [('synthetic', make_trace(args.n_phases, args.seed))]
+    mib = float(1 << 20)
+    print('{:16} {:15} {:>19} {:>15} {:>14} {:>8} {:>8}'.format(
+        'trace', 'policy', 'peak reserved [MiB]', 'peak used [MiB]',
+        'fragmentation', 'mallocs', 'failures'))
+    for name, events in traces:
+        device_id = 0
+        if args.device is not None:
+            device_id = args.device
+            events = [e for e in events if e.device_id == args.device]
+        for policy, configure in policies:
+            peak_total, peak_used, fragmentation, n_mallocs, n_failures = \
+                simulate(events, configure, device_id)
+            print('{:16} {:15} {:>19.1f} {:>15.1f} {:>14.3f} {:>8} {:>8}'
+                  .format(name[-16:], policy, peak_total / mib,
+                          peak_used / mib, fragmentation, n_mallocs,
+                          n_failures))
+
+
+if __name__ == '__main__':
+    main()
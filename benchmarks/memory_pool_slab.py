@@ -0,0 +1,102 @@
+"""Simulates the slab allocation of the device memory pool.
+
+The script replays a synthetic workload of many small temporary arrays of
+varying sizes through :class:`cupy.cuda.memory.SingleDeviceMemoryPool` backed
+by a fake allocator, and reports the number of allocator calls, the peak
+bytes acquired from the allocator and the fragmentation (the fraction of the
+peak acquired bytes that is not in use at the peak of the used bytes) with
+and without slabs. No device memory is allocated.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+
+from cupy.cuda import memory
+
+
+class FakeMemory(memory.Memory):
+
+    next_ptr = 1 << 20
+
+    def __init__(self, size):
+        self.ptr = FakeMemory.next_ptr
+        FakeMemory.next_ptr += size
+        self.size = size
+
+    def __del__(self):
+        self.ptr = 0
+
+
+def fake_alloc(size):
+    return memory.MemoryPointer(FakeMemory(size), 0)
+
+
+def make_workload(n_steps, n_live, min_size, max_size, seed):
+    # Each step allocates an array and frees a random live array, keeping
+    # about ``n_live`` arrays alive at a time. Sizes are log-uniform.
+    rng = random.Random(seed)
+    events = []
+    live = []
+    for i in range(n_steps):
+        size = int(min_size * (max_size / float(min_size)) ** rng.random())
+        events.append(('malloc', i, size))
+        live.append(i)
+        if len(live) > n_live:
+            events.append(('free', live.pop(rng.randrange(len(live))), 0))
+    return events
+
+
+def run(events, slab_size, threshold):
+    pool = memory.SingleDeviceMemoryPool(allocator=fake_alloc)
+    pool.set_slab_size(slab_size, threshold)
+    live = {}
+    peak_used = 0
+    total_at_peak = 0
+    for op, key, size in events:
+        if op == 'malloc':
+            live[key] = pool.malloc(size)
+            used = pool.used_bytes()
+            if used > peak_used:
+                peak_used = used
+                total_at_peak = pool.total_bytes()
+        else:
+            del live[key]
+    stats = pool.get_stats()
+    live.clear()
+    fragmentation = 1 - peak_used / float(total_at_peak)
+    return stats['n_mallocs'], stats['peak_total_bytes'], fragmentation
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Slab allocation of the memory pool with a fake '
+                    'allocator')
+    parser.add_argument('--n-steps', default=100000, type=int,
+                        help='Number of allocations.')
+    parser.add_argument('--n-live', default=64, type=int,
+                        help='Number of arrays alive at a time.')
+    parser.add_argument('--min-size', default=64, type=int,
+                        help='Minimum allocation size in bytes.')
+    parser.add_argument('--max-size', default=1 << 20, type=int,
+                        help='Maximum allocation size in bytes.')
+    parser.add_argument('--seed', default=0, type=int)
+    args = parser.parse_args()
+
+    events = make_workload(args.n_steps, args.n_live, args.min_size,
+                           args.max_size, args.seed)
+    mib = 1 << 20
+    configs = [('no slab', 0, None),
+               ('2 MiB slab, < 1 MiB', 2 * mib, 1 * mib),
+               ('20 MiB slab, < 10 MiB', 20 * mib, 10 * mib)]
+    print('{:24} {:>12} {:>16} {:>14}'.format(
+        'policy', 'mallocs', 'peak total [MiB]', 'fragmentation'))
+    for name, slab_size, threshold in configs:
+        n_mallocs, peak_total, fragmentation = run(
+            events, slab_size, threshold)
+        print('{:24} {:>12} {:>16.2f} {:>14.3f}'.format(
+            name, n_mallocs, peak_total / float(mib), fragmentation))
+
+
+if __name__ == '__main__':
+    main()
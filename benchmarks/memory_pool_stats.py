@@ -0,0 +1,82 @@
+"""Measures the overhead of the instrumentation of the device memory pool.
+
+The script repeats ``malloc`` and ``free`` of
+:class:`cupy.cuda.memory.SingleDeviceMemoryPool` backed by a fake allocator
+with no instrumentation, with the allocation statistics enabled by
+:meth:`~cupy.cuda.memory.SingleDeviceMemoryPool.set_allocation_stats`, and
+with a Python :class:`~cupy.cuda.MemoryHook` that does nothing, and reports
+the time per pair of ``malloc`` and ``free``. All allocations are served by
+cached blocks after the first step, so no device memory is allocated.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from cupy.cuda import memory
+from cupy.cuda import memory_hook
+
+
+class FakeMemory(memory.Memory):
+
+    next_ptr = 1 << 20
+
+    def __init__(self, size):
+        self.ptr = FakeMemory.next_ptr
+        FakeMemory.next_ptr += size
+        self.size = size
+
+    def __del__(self):
+        self.ptr = 0
+
+
+def fake_alloc(size):
+    return memory.MemoryPointer(FakeMemory(size), 0)
+
+
+class NullHook(memory_hook.MemoryHook):
+
+    name = 'NullHook'
+
+
+def step(pool, sizes):
+    for size in sizes:
+        pool.malloc(size)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Overhead of the instrumentation of the memory pool')
+    parser.add_argument('--n-steps', default=1000, type=int,
+                        help='Number of steps.')
+    parser.add_argument('--n-sizes', default=100, type=int,
+                        help='Number of allocations in a step.')
+    parser.add_argument('--max-size', default=1 << 20, type=int,
+                        help='Maximum allocation size in bytes.')
+    parser.add_argument('--seed', default=0, type=int)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = [rng.randint(1, args.max_size) for _ in range(args.n_sizes)]
+    n_calls = args.n_steps * args.n_sizes
+    print('{:16} {:>24}'.format('instrumentation', 'malloc + free [us]'))
+    for name in ('none', 'allocation stats', 'Python hook'):
+        pool = memory.SingleDeviceMemoryPool(allocator=fake_alloc)
+        pool.set_allocation_stats(name == 'allocation stats')
+        hook = NullHook()
+        if name == 'Python hook':
+            hook.__enter__()
+        try:
+            # Fill the cache.
+            step(pool, sizes)
+            elapsed = timeit.timeit(
+                lambda: step(pool, sizes), number=args.n_steps)
+        finally:
+            if name == 'Python hook':
+                hook.__exit__()
+        print('{:16} {:>24.3f}'.format(name, elapsed / n_calls * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Compares the cost of allocations from a scoped pool and a shared pool.
+
+The script repeats steps, each of which allocates a number of temporary
+buffers through :func:`cupy.cuda.alloc` and frees them, with the shared
+:class:`cupy.cuda.memory.SingleDeviceMemoryPool` as the allocator and within
+:func:`cupy.cuda.memory.scoped_pool` layered on it, and reports the time per
+allocation. The pool is backed by a fake allocator, so no device memory is
+allocated and only the host-side cost is measured.
+"""
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from cupy.cuda import memory
+
+
+class FakeMemory(memory.Memory):
+
+    next_ptr = 1 << 20
+
+    def __init__(self, size):
+        self.ptr = FakeMemory.next_ptr
+        FakeMemory.next_ptr += size
+        self.size = size
+
+    def __del__(self):
+        self.ptr = 0
+
+
+def fake_alloc(size):
+    return memory.MemoryPointer(FakeMemory(size), 0)
+
+
+def make_sizes(n_temporaries, min_size, max_size, seed):
+    rng = random.Random(seed)
+    return [rng.randint(min_size, max_size) for _ in range(n_temporaries)]
+
+
+def step(sizes):
+    buffers = [memory.alloc(size) for size in sizes]
+    del buffers
+
+
+def step_scoped(sizes, region_size):
+    with memory.scoped_pool(region_size):
+        buffers = [memory.alloc(size) for size in sizes]
+        del buffers
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Allocations from a scoped pool and a shared pool')
+    parser.add_argument('--n-steps', default=2000, type=int,
+                        help='Number of steps.')
+    parser.add_argument('--n-temporaries', default=64, type=int,
+                        help='Number of buffers allocated in a step.')
+    parser.add_argument('--min-size', default=64, type=int,
+                        help='Minimum allocation size in bytes.')
+    parser.add_argument('--max-size', default=64 << 10, type=int,
+                        help='Maximum allocation size in bytes.')
+    parser.add_argument('--region-size', default=1 << 22, type=int,
+                        help='Region size of the scoped pool in bytes.')
+    parser.add_argument('--seed', default=0, type=int)
+    args = parser.parse_args()
+
+    sizes = make_sizes(args.n_temporaries, args.min_size, args.max_size,
+                       args.seed)
+    pool = memory.SingleDeviceMemoryPool(allocator=fake_alloc)
+    memory.set_allocator(pool.malloc)
+    try:
+        configs = [
+            ('shared pool', lambda: step(sizes)),
+            ('scoped pool', lambda: step_scoped(sizes, args.region_size)),
+        ]
+        n_allocs = args.n_steps * args.n_temporaries
+        print('{:16} {:>20}'.format('allocator', 'time per alloc [us]'))
+        for name, func in configs:
+            # Warm up the shared pool.
+            func()
+            elapsed = timeit.timeit(func, number=args.n_steps)
+            print('{:16} {:>20.3f}'.format(name, elapsed / n_allocs * 1e6))
+    finally:
+        memory.set_allocator()
+
+
+if __name__ == '__main__':
+    main()
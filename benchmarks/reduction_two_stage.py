@@ -0,0 +1,64 @@
+"""Measures reductions over various ratios of the input and output sizes.
+
+For each size of the output, the script sums a float32 array of the given
+size along the leading axis and reports the launch configuration decided by
+``cupy.core.core._get_reduction_launch_config`` (the number of outputs
+reduced by a block and the number of segments of the reduced axis, which is
+1 for a single-stage reduction), the elapsed time and the effective
+bandwidth. Run the script before and after changing the heuristic to compare
+the configurations.
+"""
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+
+import cupy
+from cupy import core
+
+
+def measure(a, n_run):
+    a.sum(axis=0)  # warm up the kernel cache
+    start = cupy.cuda.Event()
+    end = cupy.cuda.Event()
+    start.record()
+    for _ in range(n_run):
+        a.sum(axis=0)
+    end.record()
+    end.synchronize()
+    return cupy.cuda.get_elapsed_time(start, end) / n_run
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Launch configurations and throughput of reductions')
+    parser.add_argument('--gpu', '-g', default=0, type=int,
+                        help='ID of GPU.')
+    parser.add_argument('--size', default=1 << 26, type=int,
+                        help='Number of elements of the input.')
+    parser.add_argument('--n-run', default=20, type=int,
+                        help='Number of repetitions.')
+    args = parser.parse_args()
+
+    block_size = core.core.simple_reduction_function._block_size
+    out_sizes = [1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, 1 << 20]
+    cupy.cuda.set_allocator(cupy.cuda.MemoryPool().malloc)
+    print('{:>10} {:>10} {:>12} {:>10} {:>10} {:>12}'.format(
+        'in/out', 'out size', 'block stride', 'segments', 'time [ms]',
+        'GB/s'))
+    with cupy.cuda.Device(args.gpu):
+        for out_size in out_sizes:
+            if out_size > args.size:
+                break
+            a = cupy.ones((args.size // out_size, out_size), cupy.float32)
+            block_stride, n_segments = \
+                core.core._get_reduction_launch_config(
+                    a.size, out_size, block_size)
+            elapsed = measure(a, args.n_run)
+            print('{:>10} {:>10} {:>12} {:>10} {:>10.3f} {:>12.1f}'.format(
+                a.size // out_size, out_size, block_stride, n_segments,
+                elapsed, a.nbytes / elapsed / 1e6))
+
+
+if __name__ == '__main__':
+    main()
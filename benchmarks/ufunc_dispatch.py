@@ -0,0 +1,72 @@
+"""Measures the host-side overhead of the dispatch of ufuncs.
+
+The script calls ufuncs on small arrays with the kernel launches disabled by
+``cupy.core.core._set_ufunc_launch_enabled``, so that the time per call only
+includes the preparation of the arguments and the allocation of the outputs.
+Each op is measured with and without the cache of the launches of
+:class:`cupy.ufunc`. Calls with scalar arguments are never cached, so both
+columns of the ``add (scalar)`` op show the uncached path.
+"""
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import cupy
+from cupy.core import core
+
+
+def get_ops(size):
+    a = cupy.ones((size,), cupy.float32)
+    b = cupy.ones((size,), cupy.float32)
+    c = cupy.empty((size,), cupy.float32)
+    m = cupy.ones((size, size), cupy.float32)
+    row = cupy.ones((1, size), cupy.float32)
+    strided = cupy.ones((size * 2,), cupy.float32)[::2]
+    return [
+        ('add', lambda: cupy.add(a, b)),
+        ('add (operator)', lambda: a + b),
+        ('add (out)', lambda: cupy.add(a, b, out=c)),
+        ('add (broadcast)', lambda: cupy.add(m, row)),
+        ('add (strided)', lambda: cupy.add(strided, b)),
+        ('add (scalar)', lambda: cupy.add(a, 1.0)),
+        ('sqrt', lambda: cupy.sqrt(a)),
+        ('modf', lambda: cupy.modf(a)),
+    ]
+
+
+def measure(op, n_run):
+    op()  # compiles the kernel and fills the cache
+    return timeit.timeit(op, number=n_run) / n_run
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Host-side dispatch overhead of ufuncs')
+    parser.add_argument('--gpu', '-g', default=0, type=int,
+                        help='ID of GPU.')
+    parser.add_argument('--size', default=16, type=int,
+                        help='Number of elements of the vectors.')
+    parser.add_argument('--n-run', default=10000, type=int,
+                        help='Number of repetitions.')
+    args = parser.parse_args()
+
+    print('{:20} {:>14} {:>14}'.format(
+        'op', 'uncached [us]', 'cached [us]'))
+    with cupy.cuda.Device(args.gpu):
+        core._set_ufunc_launch_enabled(False)
+        try:
+            for name, op in get_ops(args.size):
+                times = []
+                for use_cache in (False, True):
+                    cupy.ufunc._use_launch_cache = use_cache
+                    times.append(measure(op, args.n_run))
+                print('{:20} {:>14.2f} {:>14.2f}'.format(
+                    name, times[0] * 1e6, times[1] * 1e6))
+        finally:
+            cupy.ufunc._use_launch_cache = True
+            core._set_ufunc_launch_enabled(True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from __future__ import division
+import os
 import sys
 
 import numpy
@@ -35,6 +36,11 @@ original error: {}'''.format(exc_info[1]))  # NOQA
 from cupy import cuda
 
 
+if os.environ.get('CUPY_KERNEL_RECORD'):
+    from cupy.cuda import precompile
+    precompile.start_recording(os.environ['CUPY_KERNEL_RECORD'])
+
+
 def is_available():
     return cuda.is_available()
 
@@ -577,6 +583,7 @@ from cupy.statistics.order import nanmin  # NOQA
 from cupy.statistics.order import percentile  # NOQA
 
 from cupy.statistics.meanvar import mean  # NOQA
+from cupy.statistics.meanvar import mean_var  # NOQA
 from cupy.statistics.meanvar import std  # NOQA
 from cupy.statistics.meanvar import var  # NOQA
 
@@ -597,6 +604,7 @@ from cupy.util import memoize  # NOQA
 
 from cupy.core import ElementwiseKernel  # NOQA
 from cupy.core import ReductionKernel  # NOQA
+from cupy.core import ScanKernel  # NOQA
 
 
 # The following function is left for backward compatibility.
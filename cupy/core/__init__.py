@@ -36,6 +36,7 @@ from cupy.core.core import left_shift  # NOQA
 from cupy.core.core import less  # NOQA
 from cupy.core.core import less_equal  # NOQA
 from cupy.core.core import matmul  # NOQA
+from cupy.core.core import mean_var  # NOQA
 from cupy.core.core import moveaxis  # NOQA
 from cupy.core.core import multiply  # NOQA
 from cupy.core.core import nanmax  # NOQA
@@ -50,6 +51,7 @@ from cupy.core.core import ReductionKernel  # NOQA
 from cupy.core.core import remainder  # NOQA
 from cupy.core.core import right_shift  # NOQA
 from cupy.core.core import rollaxis  # NOQA
+from cupy.core.core import ScanKernel  # NOQA
 from cupy.core.core import size  # NOQA'
 from cupy.core.core import sqrt  # NOQA
 from cupy.core.core import subtract  # NOQA
@@ -122,8 +122,9 @@ cpdef str _get_header_source():
     return _header_source
 
 
-cpdef function.Module compile_with_cache(
-        str source, tuple options=(), arch=None, cachd_dir=None):
+cpdef tuple _get_compile_args(str source, tuple options=()):
+    # Returns the source, options and extra source that compile_with_cache
+    # passes to cupy.cuda.compile_with_cache. This does not require a device.
     source = _cupy_header + source
     extra_source = _get_header_source()
     options += ('-I%s' % _get_header_dir_path(),)
@@ -143,5 +144,11 @@ cpdef function.Module compile_with_cache(
             path = os.path.join(cuda_path, 'include')
             options += ('-I ' + path,)
 
+    return source, options, extra_source
+
+
+cpdef function.Module compile_with_cache(
+        str source, tuple options=(), arch=None, cachd_dir=None):
+    source, options, extra_source = _get_compile_args(source, options)
     return cuda.compile_with_cache(source, options, arch, cachd_dir,
                                    extra_source)
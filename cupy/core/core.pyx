@@ -1020,7 +1020,7 @@ cdef class ndarray:
             count_nonzero = 0
         else:
             r = self.ravel()
-            scan_index = scan((r != 0).astype(dtype))
+            scan_index = _scan_nonzero(r, ndarray(r.shape, dtype))
             count_nonzero = int(scan_index[-1])
         ndim = max(self._shape.size(), 1)
         if count_nonzero == 0:
@@ -1791,6 +1791,7 @@ cpdef vector.vector[Py_ssize_t] _get_strides_for_nocopy_reshape(
 include "carray.pxi"
 include "elementwise.pxi"
 include "reduction.pxi"
+include "scan.pxi"
 
 
 # =============================================================================
@@ -2987,7 +2988,8 @@ cpdef _prepare_mask_indexing_single(ndarray a, ndarray mask, Py_ssize_t axis):
         mask_type = numpy.int32
     else:
         mask_type = numpy.int64
-    mask_scanned = scan(mask.astype(mask_type).ravel())  # starts with 1
+    # starts with 1
+    mask_scanned = _scan_nonzero(mask, ndarray((mask.size,), mask_type))
     n_true = int(mask_scanned[-1])
     masked_shape = lshape + (n_true,) + rshape
 
@@ -3003,7 +3005,8 @@ cpdef _prepare_mask_indexing_single(ndarray a, ndarray mask, Py_ssize_t axis):
         mask_type = numpy.int32
     else:
         mask_type = numpy.int64
-    mask_br_scanned = scan(mask_br.astype(mask_type).ravel())
+    mask_br_scanned = _scan_nonzero(
+        mask_br, ndarray((mask_br.size,), mask_type))
     mask_br_scanned = mask_br_scanned._reshape(mask_br._shape)
     return mask_br, mask_br_scanned, masked_shape
 
@@ -4215,44 +4218,92 @@ _clip = create_ufunc(
 
 cpdef ndarray _var(ndarray a, axis=None, dtype=None, out=None, ddof=0,
                    keepdims=False):
+    return _mean_var_impl(a, axis, dtype, out, ddof, keepdims, False)[1]
+
+
+cpdef _std(a, axis=None, dtype=None, out=None, ddof=0, keepdims=False):
+    return _mean_var_impl(a, axis, dtype, out, ddof, keepdims, True)[1]
+
+
+cpdef tuple mean_var(ndarray a, axis=None, dtype=None, ddof=0,
+                     keepdims=False):
+    """Returns the mean and the variance along an axis in a single pass.
+
+    .. seealso:: :func:`cupy.mean_var`
+
+    """
+    return _mean_var_impl(a, axis, dtype, None, ddof, keepdims, False)
+
+
+cdef tuple _mean_var_impl(ndarray a, axis, dtype, out, ddof, keepdims,
+                          bint std):
     assert a.dtype.kind != 'c', 'Variance for complex numbers is not ' \
                                 'implemented. Current implemention does not ' \
                                 'convert the dtype'
-    if axis is None:
-        axis = tuple(range(a.ndim))
-    if not isinstance(axis, tuple):
-        axis = (axis,)
-
-    if dtype is None and a.dtype.kind in 'biu':
-        dtype = 'd'
+    if dtype is None:
+        dtype = 'd' if a.dtype.kind in 'biu' else a.dtype
 
-    shape = a.shape
-    items = 1
-    for ax in axis:
-        items *= shape[ax]
-    alpha = 1. / max(items - ddof, 0)
-    arrmean = a.mean(axis=axis, dtype=dtype, keepdims=True)
+    laxis, raxis = _get_axis(axis, a.ndim)
+    out_shape = _get_out_shape(a.shape, laxis, raxis, keepdims)
+    mean = ndarray(out_shape, dtype)
     if out is None:
-        return _var_core(a, arrmean, alpha, axis=axis, keepdims=keepdims)
-    else:
-        return _var_core_out(
-            a, arrmean, alpha, out, axis=axis, keepdims=keepdims)
+        out = ndarray(out_shape, dtype)
+    kern = _mean_std_core if std else _mean_var_core
+    kern(a, ddof, mean, out, axis=laxis, keepdims=keepdims)
+    return mean, out
 
 
-cpdef _std(a, axis=None, dtype=None, out=None, ddof=0, keepdims=False):
-    ret = _var(a, axis=axis, dtype=dtype, ddof=ddof, keepdims=keepdims)
-    return sqrt(ret, dtype=dtype, out=out)
+# Welford's online algorithm with the merge of Chan et al. The mean and the
+# sum of squared deviations are accumulated in float for float16.
+cdef str _welford_preamble = '''
+template <typename T> struct welford_acc { typedef T type; };
+template <> struct welford_acc<float16> { typedef float type; };
+
+template <typename T>
+struct welford_st {
+    typedef typename welford_acc<T>::type acc_t;
+    acc_t mean, m2;
+    long long n;
+    __device__ welford_st() : mean(0), m2(0), n(0) { }
+    __device__ welford_st(acc_t x) : mean(x), m2(0), n(1) { }
+    __device__ acc_t get_mean() const {
+        return n == 0 ? acc_t(0) / acc_t(0) : mean;
+    }
+    __device__ acc_t get_var(long long ddof) const {
+        long long d = n - ddof;
+        return m2 / acc_t(d > 0 ? d : 0);
+    }
+};
 
+template <typename T>
+__device__ welford_st<T> welford_merge(
+        const welford_st<T>& a, const welford_st<T>& b) {
+    typedef typename welford_st<T>::acc_t acc_t;
+    if (a.n == 0) return b;
+    if (b.n == 0) return a;
+    welford_st<T> c;
+    c.n = a.n + b.n;
+    acc_t delta = b.mean - a.mean;
+    acc_t w = acc_t(b.n) / acc_t(c.n);
+    c.mean = a.mean + delta * w;
+    c.m2 = a.m2 + b.m2 + delta * delta * acc_t(a.n) * w;
+    return c;
+}
+'''
 
-cdef _var_core = ReductionKernel(
-    'S x, T mean, T alpha', 'T out',
-    '(x - mean) * (x - mean)',
-    'a + b', 'out = alpha * a', '0', '_var_core')
+# The identity is the empty state, with which the outputs of empty inputs
+# are NaN as in NumPy.
+cdef _mean_var_core = ReductionKernel(
+    'S x, int64 ddof', 'T mean, U out',
+    'welford_st<T>(x)', 'welford_merge(a, b)',
+    'mean = a.get_mean(), out = a.get_var(ddof)', '', '_mean_var_core',
+    reduce_type='welford_st<T>', preamble=_welford_preamble)
 
-cdef _var_core_out = ReductionKernel(
-    'S x, T mean, T alpha', 'U out',
-    '(x - mean) * (x - mean)',
-    'a + b', 'out = alpha * a', '0', '_var_core')
+cdef _mean_std_core = ReductionKernel(
+    'S x, int64 ddof', 'T mean, U out',
+    'welford_st<T>(x)', 'welford_merge(a, b)',
+    'mean = a.get_mean(), out = sqrt(a.get_var(ddof))', '', '_mean_std_core',
+    reduce_type='welford_st<T>', preamble=_welford_preamble)
 
 # TODO(okuta) needs cast
 cdef _mean = create_reduction_func(
@@ -4269,91 +4320,14 @@ cdef _mean = create_reduction_func(
 # scan
 # -----------------------------------------------------------------------------
 
-@util.memoize(for_each_device=True)
-def _inclusive_scan_kernel(dtype, block_size):
-    """return Prefix Sum(Scan) cuda kernel
+cdef _scan_add = ScanKernel(
+    'T x', 'U y', 'x', 'a + b', 'y = a', '0', 'cupy_scan')
 
-    e.g
-    if blocksize * 2 >= len(src)
-    src [1, 2, 3, 4]
-    dst [1, 3, 6, 10]
 
-    if blocksize * 2 < len(src)
-    block_size: 2
-    src [1, 2, 3, 4, 5, 6]
-    dst [1, 3, 6, 10, 5, 11]
-
-    Args:
-        dtype: src, dst array type
-        block_size: block_size
-
-    Returns:
-         cupy.cuda.Function: cuda function
-    """
-
-    name = "inclusive_scan_kernel"
-    dtype = _get_typename(dtype)
-    source = string.Template("""
-    extern "C" __global__ void ${name}(const CArray<${dtype}, 1> src,
-        CArray<${dtype}, 1> dst){
-        long long n = src.size();
-        extern __shared__ ${dtype} temp[];
-        unsigned int thid = threadIdx.x;
-        unsigned int block = 2 * blockIdx.x * blockDim.x;
-
-        unsigned int idx0 = thid + block;
-        unsigned int idx1 = thid + blockDim.x + block;
-
-        temp[thid] = (idx0 < n) ? src[idx0] : (${dtype})0;
-        temp[thid + blockDim.x] = (idx1 < n) ? src[idx1] : (${dtype})0;
-        __syncthreads();
-
-        for(int i = 1; i <= ${block_size}; i <<= 1){
-            int index = (threadIdx.x + 1) * i * 2 - 1;
-            if (index < (${block_size} << 1)){
-                temp[index] = temp[index] + temp[index - i];
-            }
-            __syncthreads();
-        }
-
-        for(int i = ${block_size} >> 1; i > 0; i >>= 1){
-            int index = (threadIdx.x + 1) * i * 2 - 1;
-            if(index + i < (${block_size} << 1)){
-                temp[index + i] = temp[index + i] + temp[index];
-            }
-            __syncthreads();
-        }
-
-        if(idx0 < n){
-            dst[idx0] = temp[thid];
-        }
-        if(idx1 < n){
-            dst[idx1] = temp[thid + blockDim.x];
-        }
-    }
-    """).substitute(name=name, dtype=dtype, block_size=block_size)
-    module = compile_with_cache(source)
-    return module.get_function(name)
-
-
-@util.memoize(for_each_device=True)
-def _add_scan_blocked_sum_kernel(dtype):
-    name = "add_scan_blocked_sum_kernel"
-    dtype = _get_typename(dtype)
-    source = string.Template("""
-    extern "C" __global__ void ${name}(CArray<${dtype}, 1> src_dst){
-        long long n = src_dst.size();
-        unsigned int idxBase = (blockDim.x + 1) * (blockIdx.x + 1);
-        unsigned int idxAdded = idxBase + threadIdx.x;
-        unsigned int idxAdd = idxBase - 1;
-
-        if(idxAdded < n){
-            src_dst[idxAdded] += src_dst[idxAdd];
-        }
-    }
-    """).substitute(name=name, dtype=dtype)
-    module = compile_with_cache(source)
-    return module.get_function(name)
+# The count of the non-zero elements up to each position, which is the
+# position of the element after compaction plus one.
+cdef _scan_nonzero = ScanKernel(
+    'T x', 'U y', 'x != T(0)', 'a + b', 'y = a', '0', 'cupy_scan_nonzero')
 
 
 @util.memoize(for_each_device=True)
@@ -4429,28 +4403,13 @@ cpdef ndarray scan(ndarray a, ndarray out=None):
     if a.ndim != 1:
         raise TypeError("Input array should be 1D array.")
 
-    block_size = 256
-
     if out is None:
         out = ndarray(a.shape, dtype=a.dtype)
     else:
         if a.size != out.size:
             raise ValueError("Provided out is the wrong size")
 
-    kern_scan = _inclusive_scan_kernel(a.dtype, block_size)
-    kern_scan(grid=((a.size - 1) // (2 * block_size) + 1,),
-              block=(block_size,),
-              args=(a, out),
-              shared_mem=a.itemsize * block_size * 2)
-
-    if (a.size - 1) // (block_size * 2) > 0:
-        blocked_sum = out[block_size * 2 - 1:None:block_size * 2]
-        scan(blocked_sum, blocked_sum)
-        kern_add = _add_scan_blocked_sum_kernel(out.dtype)
-        kern_add(grid=((a.size - 1) // (2 * block_size),),
-                 block=(2 * block_size - 1,),
-                 args=(out,))
-    return out
+    return _scan_add(a, out)
 
 
 # -----------------------------------------------------------------------------
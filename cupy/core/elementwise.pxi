@@ -10,10 +10,33 @@ from cupy.cuda cimport device
 from cupy.cuda cimport function
 
 
-cpdef _get_simple_elementwise_kernel(
-        params, operation, name, preamble,
-        loop_prep='', after_loop='', options=()):
-    module_code = string.Template('''
+# Maximum number of kernels memoized by each kernel getter.
+cdef object _kernel_memo_maxsize = util.get_kernel_memo_maxsize()
+
+
+# Callable receiving the kind, the CUDA source and the arguments of each kernel
+# specialization compiled by the memoized kernel getters, or None.
+cdef object _kernel_recorder = None
+
+
+cpdef _set_kernel_recorder(recorder):
+    global _kernel_recorder
+    _kernel_recorder = recorder
+
+
+# If False, ufuncs skip the launches of their kernels after preparing the
+# arguments. Benchmarks use it to measure the host-side dispatch overhead.
+cdef bint _ufunc_launch_enabled = True
+
+
+cpdef _set_ufunc_launch_enabled(bint enabled):
+    global _ufunc_launch_enabled
+    _ufunc_launch_enabled = enabled
+
+
+cpdef str _get_simple_elementwise_kernel_source(
+        params, operation, name, preamble, loop_prep='', after_loop=''):
+    return string.Template('''
     ${preamble}
     extern "C" __global__ void ${name}(${params}) {
       ${loop_prep};
@@ -30,6 +53,13 @@ cpdef _get_simple_elementwise_kernel(
         preamble=preamble,
         loop_prep=loop_prep,
         after_loop=after_loop)
+
+
+cpdef _get_simple_elementwise_kernel(
+        params, operation, name, preamble,
+        loop_prep='', after_loop='', options=()):
+    module_code = _get_simple_elementwise_kernel_source(
+        params, operation, name, preamble, loop_prep, after_loop)
     module = compile_with_cache(module_code, options)
     return module.get_function(name)
 
@@ -422,9 +452,10 @@ cdef list _get_out_args_with_params(
     return out_args
 
 
-@util.memoize(for_each_device=True)
-def _get_elementwise_kernel(args_info, types, params, operation, name,
-                            preamble, kwargs):
+def _get_elementwise_kernel_source(args_info, types, params, operation,
+                                   name, preamble, kwargs):
+    kwargs = dict(kwargs)
+    kwargs.pop('options', None)
     kernel_params = _get_kernel_params(params, args_info)
     types_preamble = '\n'.join(
         'typedef %s %s;' % (_get_typename(v), k) for k, v in types)
@@ -440,9 +471,20 @@ def _get_elementwise_kernel(args_info, types, params, operation, name,
             op.append(fmt.format(t=p.ctype, n=p.name))
     op.append(operation)
     operation = '\n'.join(op)
-    return _get_simple_elementwise_kernel(
-        kernel_params, operation, name,
-        preamble, **dict(kwargs))
+    return _get_simple_elementwise_kernel_source(
+        kernel_params, operation, name, preamble, **kwargs)
+
+
+@util.memoize(for_each_device=True, maxsize=_kernel_memo_maxsize)
+def _get_elementwise_kernel(args_info, types, params, operation, name,
+                            preamble, kwargs):
+    source = _get_elementwise_kernel_source(
+        args_info, types, params, operation, name, preamble, kwargs)
+    if _kernel_recorder is not None:
+        _kernel_recorder('elementwise', source, (
+            args_info, types, params, operation, name, preamble, kwargs))
+    module = compile_with_cache(source, dict(kwargs).get('options', ()))
+    return module.get_function(name)
 
 
 cdef class ElementwiseKernel:
@@ -597,8 +639,7 @@ cdef class ElementwiseKernel:
         return ret
 
 
-@util.memoize(for_each_device=True)
-def _get_ufunc_kernel(
+def _get_ufunc_kernel_source(
         in_types, out_types, routine, args_info, params, name, preamble):
     kernel_params = _get_kernel_params(params, args_info)
 
@@ -622,10 +663,22 @@ def _get_ufunc_kernel(
     types.append(preamble)
     preamble = '\n'.join(types)
 
-    return _get_simple_elementwise_kernel(
+    return _get_simple_elementwise_kernel_source(
         kernel_params, operation, name, preamble)
 
 
+@util.memoize(for_each_device=True, maxsize=_kernel_memo_maxsize)
+def _get_ufunc_kernel(
+        in_types, out_types, routine, args_info, params, name, preamble):
+    source = _get_ufunc_kernel_source(
+        in_types, out_types, routine, args_info, params, name, preamble)
+    if _kernel_recorder is not None:
+        _kernel_recorder('ufunc', source, (
+            in_types, out_types, routine, args_info, params, name, preamble))
+    module = compile_with_cache(source)
+    return module.get_function(name)
+
+
 cdef tuple _guess_routine_from_in_types(list ops, tuple in_types):
     cdef Py_ssize_t i, n
     cdef tuple op, op_types
@@ -699,6 +752,91 @@ cdef tuple _guess_routine(str name, dict cache, list ops, list in_args, dtype):
                     (dtype, name))
 
 
+# Maximum number of cached launches of each ufunc. The cache is cleared when
+# it is full.
+cdef Py_ssize_t _ufunc_launch_cache_size = 256
+
+
+cdef tuple _get_ufunc_launch_key(tuple args, out, str casting):
+    # Returns the key of the cached launch, or None if the launch cannot be
+    # cached, i.e., an argument is not an array on the current device.
+    cdef ndarray arr
+    cdef int dev_id = device.get_device_id()
+    cdef list key = [dev_id, casting, out is None]
+    if out is not None:
+        args += out,
+    for a in args:
+        if type(a) is not ndarray:
+            return None
+        arr = a
+        if arr.data.device is not None and arr.data.device.id != dev_id:
+            return None
+        key += arr.dtype.type, arr.shape, arr.strides
+    return tuple(key)
+
+
+cdef class _UfuncLaunch:
+
+    """Launch of a ufunc kernel for the layout of its arguments.
+
+    It keeps the kernel, the output types and the arguments reduced by
+    :func:`_reduce_dims` for a key of :func:`_get_ufunc_launch_key`, so that
+    the arguments of the same dtypes, shapes and strides are passed to the
+    kernel without broadcasting, type resolution and dimension reduction.
+
+    """
+
+    cdef:
+        function.Function kern
+        tuple out_types
+        tuple out_shape
+        Py_ssize_t size
+        vector.vector[Py_ssize_t] shape
+        vector.vector[vector.vector[Py_ssize_t]] strides
+        function.CPointer indexer
+
+    def __init__(self, function.Function kern, tuple out_types,
+                 tuple out_shape, list inout_args, Indexer indexer):
+        cdef ndarray arr
+        self.kern = kern
+        self.out_types = out_types
+        self.out_shape = out_shape
+        self.size = indexer.size
+        self.shape = indexer.shape
+        for arr in inout_args:
+            self.strides.push_back(arr._strides)
+        self.indexer = indexer.get_pointer()
+
+    cdef launch(self, tuple args, out, Py_ssize_t nin, Py_ssize_t nout):
+        cdef ndarray arr
+        cdef CArray carray
+        cdef Py_ssize_t i, j, ndim
+        cdef list kargs = []
+        if out is not None:
+            out_args = [out]
+        elif len(args) > nin:
+            out_args = list(args[nin:])
+        else:
+            out_args = [ndarray(self.out_shape, t) for t in self.out_types]
+        ndim = self.shape.size()
+        for i, a in enumerate(list(args[:nin]) + out_args):
+            arr = a
+            carray = CArray.__new__(CArray)
+            carray.val.data = <void*>arr.data.ptr
+            carray.val.size = self.size
+            for j in range(ndim):
+                carray.val.shape_and_strides[j] = self.shape[j]
+                carray.val.shape_and_strides[j + ndim] = self.strides[i][j]
+            carray.ptr = <void*>&carray.val
+            kargs.append(carray)
+        kargs.append(self.indexer)
+        if _ufunc_launch_enabled:
+            self.kern.linear_launch(self.size, kargs)
+        if nout == 1:
+            return out_args[0]
+        return tuple(out_args)
+
+
 class ufunc(object):
 
     """Universal function.
@@ -711,6 +849,9 @@ class ufunc(object):
 
     """
 
+    # If True, the launches are cached for each layout of array arguments.
+    _use_launch_cache = True
+
     def __init__(self, name, nin, nout, ops, preamble='', doc='',
                  default_casting=None):
         self.name = name
@@ -733,6 +874,7 @@ class ufunc(object):
         self._params = _in_params + _out_params + (
             ParameterInfo('CIndexer _ind', False),)
         self._routine_cache = {}
+        self._launch_cache = {}
 
     def __repr__(self):
         return "<ufunc '%s'>" % self.name
@@ -783,6 +925,16 @@ class ufunc(object):
         if n_args != self.nin and n_args != self.nargs:
             raise TypeError('Wrong number of arguments for %s' % self.name)
 
+        launch_key = None
+        if self._use_launch_cache and dtype is None and (
+                out is None or n_args == self.nin):
+            launch_key = _get_ufunc_launch_key(args, out, casting)
+            if launch_key is not None:
+                launch = self._launch_cache.get(launch_key)
+                if launch is not None:
+                    return (<_UfuncLaunch>launch).launch(
+                        args, out, self.nin, self.nout)
+
         args = _preprocess_args(args)
         if out is None:
             in_args = args[:self.nin]
@@ -827,7 +979,14 @@ class ufunc(object):
             in_types, out_types, routine, args_info,
             self._params, self.name, self._preamble)
 
-        kern.linear_launch(indexer.size, inout_args)
+        if launch_key is not None:
+            if len(self._launch_cache) >= _ufunc_launch_cache_size:
+                self._launch_cache.clear()
+            self._launch_cache[launch_key] = _UfuncLaunch(
+                kern, out_types, broad.shape, inout_args[:-1], indexer)
+
+        if _ufunc_launch_enabled:
+            kern.linear_launch(indexer.size, inout_args)
         return ret
 
 
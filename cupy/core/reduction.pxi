@@ -7,48 +7,7 @@ from cupy.cuda import compiler
 from cupy import util
 
 
-cpdef _get_simple_reduction_kernel(
-        name, block_size, reduce_type, params, identity,
-        pre_map_expr, reduce_expr, post_map_expr,
-        type_preamble, input_expr, output_expr, preamble, options):
-    if identity is None:
-        identity = ''
-    module_code = string.Template('''
-    ${type_preamble}
-    ${preamble}
-    #define REDUCE(a, b) (${reduce_expr})
-    #define POST_MAP(a) (${post_map_expr})
-    #define _REDUCE(_offset) if (_tid < _offset) { \
-      _type_reduce _a = _sdata[_tid], _b = _sdata[(_tid + _offset)]; \
-      _sdata[_tid] = REDUCE(_a, _b); \
-    }
-
-    typedef ${reduce_type} _type_reduce;
-    extern "C" __global__ void ${name}(${params}) {
-      extern __shared__ _type_reduce _sdata_raw[];
-      _type_reduce *_sdata = _sdata_raw;
-      unsigned int _tid = threadIdx.x;
-
-      int _J_offset = _tid / _block_stride;
-      int _j_offset = _J_offset * _out_ind.size();
-      int _J_stride = ${block_size} / _block_stride;
-      long long _j_stride = (long long)_J_stride * _out_ind.size();
-
-      for (int _i_base = blockIdx.x * _block_stride;
-           _i_base < _out_ind.size();
-           _i_base += gridDim.x * _block_stride) {
-        _type_reduce _s = _type_reduce(${identity});
-        int _i = _i_base + _tid % _block_stride;
-        int _J = _J_offset;
-        for (long long _j = _i + _j_offset; _j < _in_ind.size();
-             _j += _j_stride, _J += _J_stride) {
-          _in_ind.set(_j);
-          ${input_expr}
-          _type_reduce _a = ${pre_map_expr};
-          _s = REDUCE(_s, _a);
-        }
-        if (_block_stride < ${block_size}) {
-          _sdata[_tid] = _s;
+cdef str _shared_memory_block_reduce = '''_sdata[_tid] = _s;
           __syncthreads();
           if (_block_stride <= 256) {
             _REDUCE(256);
@@ -80,28 +39,186 @@ cpdef _get_simple_reduction_kernel(
               }
             }
           }
-          _s = _sdata[_tid];
+          _s = _sdata[_tid];'''
+
+
+cdef str _warp_shuffle_preamble = '''
+    template <typename T>
+    __device__ T _shfl_down(const T& v, unsigned int delta) {
+      // Shuffles the value as words to support any reduction type.
+      const int n_words = (sizeof(T) + sizeof(int) - 1) / sizeof(int);
+      int words[n_words];
+      const char *src = reinterpret_cast<const char*>(&v);
+      char *buf = reinterpret_cast<char*>(words);
+      for (size_t k = 0; k < sizeof(T); ++k) buf[k] = src[k];
+      for (int k = 0; k < n_words; ++k) {
+    #if __CUDACC_VER_MAJOR__ >= 9
+        words[k] = __shfl_down_sync(0xffffffff, words[k], delta);
+    #else
+        words[k] = __shfl_down(words[k], delta);
+    #endif
+      }
+      T ret;
+      char *dst = reinterpret_cast<char*>(&ret);
+      for (size_t k = 0; k < sizeof(T); ++k) dst[k] = buf[k];
+      return ret;
+    }'''
+
+
+# Lanes of a warp whose distance is a multiple of _block_stride reduce to the
+# same output. If _block_stride is less than the warp size, each warp
+# reduces its values by shuffles and the first warp reduces the results of
+# the warps. Otherwise, the values are reduced through the shared memory.
+cdef str _warp_shuffle_block_reduce = '''if (_block_stride < 32) {
+            for (int _offset = 16; _offset >= _block_stride; _offset >>= 1) {
+              _s = REDUCE(_s, _shfl_down(_s, _offset));
+            }
+            if (_tid % 32 < _block_stride) {
+              _sdata[_tid / 32 * _block_stride + _tid % 32] = _s;
+            }
+            __syncthreads();
+            if (_tid < 32) {
+              _s = _type_reduce(${identity});
+              for (int _k = _tid; _k < ${block_size} / 32 * _block_stride;
+                   _k += 32) {
+                _s = REDUCE(_s, _sdata[_k]);
+              }
+              for (int _offset = 16; _offset >= _block_stride;
+                   _offset >>= 1) {
+                _s = REDUCE(_s, _shfl_down(_s, _offset));
+              }
+            }
+          } else {
+            _sdata[_tid] = _s;
+            __syncthreads();
+            for (int _offset = ${block_size} / 2; _offset >= _block_stride;
+                 _offset >>= 1) {
+              _REDUCE(_offset);
+              __syncthreads();
+            }
+            _s = _sdata[_tid];
+          }'''
+
+
+cpdef str _get_simple_reduction_kernel_source(
+        name, block_size, reduce_type, params, identity,
+        pre_map_expr, reduce_expr, post_map_expr,
+        type_preamble, input_expr, output_expr, preamble, int stage=0,
+        bint warp_shuffle=True, bint int64_index=False):
+    # stage is 0 for a single-stage reduction. A two-stage reduction splits
+    # the reduced axis into _n_segments segments, reduces each segment into
+    # _partials in stage 1 and reduces the partial results in stage 2.
+    # If warp_shuffle is True, the values of the threads in a block are
+    # reduced by warp shuffles instead of a tree in the shared memory.
+    # Indices of the output and the reduced axis are 64-bit integers if
+    # int64_index is True.
+    if identity is None:
+        identity = ''
+    if warp_shuffle:
+        shfl_preamble = _warp_shuffle_preamble
+        block_reduce = string.Template(_warp_shuffle_block_reduce).substitute(
+            block_size=block_size, identity=identity)
+    else:
+        shfl_preamble = ''
+        block_reduce = _shared_memory_block_reduce
+    load_expr = '''_in_ind.set(_j);
+          %s
+          _type_reduce _a = %s;''' % (input_expr, pre_map_expr)
+    store_expr = '''_out_ind.set(_i);
+          %s
+          POST_MAP(_s);''' % output_expr
+    in_size = '_in_ind.size()'
+    if stage == 0:
+        segment_prep = 'const int _seg = 0, _n_seg = 1;'
+    else:
+        segment_prep = '''typedef char _reduce_type_too_large[
+          sizeof(_type_reduce) <= %d ? 1 : -1];
+      _type_reduce *_partials_data =
+          reinterpret_cast<_type_reduce*>(&_partials[0]);''' % (
+            _max_partial_itemsize)
+        if stage == 1:
+            segment_prep += '''
+      const int _seg = blockIdx.x % _n_segments, _n_seg = _n_segments;'''
+            store_expr = (
+                '_partials_data[_seg * (long long)_out_ind.size() + _i] = _s;')
+        else:
+            segment_prep += '''
+      const int _seg = 0, _n_seg = 1;'''
+            in_size = '(long long)_n_segments * _out_ind.size()'
+            load_expr = '_type_reduce _a = _partials_data[_j];'
+    return string.Template('''
+    ${type_preamble}
+    ${preamble}
+    #define REDUCE(a, b) (${reduce_expr})
+    #define POST_MAP(a) (${post_map_expr})
+    #define _REDUCE(_offset) if (_tid < _offset) { \
+      _type_reduce _a = _sdata[_tid], _b = _sdata[(_tid + _offset)]; \
+      _sdata[_tid] = REDUCE(_a, _b); \
+    }
+
+    typedef ${reduce_type} _type_reduce;
+    ${shfl_preamble}
+    extern "C" __global__ void ${name}(${params}) {
+      // Raw storage, as __shared__ variables cannot have constructors.
+      __shared__ __align__(16) char _sdata_raw[
+          sizeof(_type_reduce) * ${block_size}];
+      _type_reduce *_sdata = reinterpret_cast<_type_reduce*>(_sdata_raw);
+      unsigned int _tid = threadIdx.x;
+
+      int _J_offset = _tid / _block_stride;
+      ${index_type} _j_offset = (${index_type})_J_offset * _out_ind.size();
+      int _J_stride = ${block_size} / _block_stride;
+      long long _j_stride = (long long)_J_stride * _out_ind.size();
+      ${segment_prep}
+
+      for (${index_type} _i_base = (${index_type})(blockIdx.x / _n_seg) *
+               _block_stride;
+           _i_base < _out_ind.size();
+           _i_base += (${index_type})(gridDim.x / _n_seg) * _block_stride) {
+        _type_reduce _s = _type_reduce(${identity});
+        ${index_type} _i = _i_base + _tid % _block_stride;
+        ${index_type} _J = _J_offset + (${index_type})_seg * _J_stride;
+        for (long long _j = _i + _j_offset + _seg * _j_stride;
+             _j < ${in_size};
+             _j += _j_stride * _n_seg, _J += _J_stride * _n_seg) {
+          ${load_expr}
+          _s = REDUCE(_s, _a);
+        }
+        if (_block_stride < ${block_size}) {
+          ${block_reduce}
           __syncthreads();
         }
         if (_J_offset == 0 && _i < _out_ind.size()) {
-          _out_ind.set(_i);
-          ${output_expr}
-          POST_MAP(_s);
+          ${store_expr}
         }
       }
     }''').substitute(
         name=name,
+        segment_prep=segment_prep,
+        in_size=in_size,
+        index_type='long long' if int64_index else 'int',
+        shfl_preamble=shfl_preamble,
+        block_reduce=block_reduce,
+        load_expr=load_expr,
+        store_expr=store_expr,
         block_size=block_size,
         reduce_type=reduce_type,
         params=params,
         identity=identity,
         reduce_expr=reduce_expr,
-        pre_map_expr=pre_map_expr,
         post_map_expr=post_map_expr,
         type_preamble=type_preamble,
-        input_expr=input_expr,
-        output_expr=output_expr,
         preamble=preamble)
+
+
+cpdef _get_simple_reduction_kernel(
+        name, block_size, reduce_type, params, identity,
+        pre_map_expr, reduce_expr, post_map_expr,
+        type_preamble, input_expr, output_expr, preamble, options):
+    module_code = _get_simple_reduction_kernel_source(
+        name, block_size, reduce_type, params, identity,
+        pre_map_expr, reduce_expr, post_map_expr,
+        type_preamble, input_expr, output_expr, preamble)
     module = compile_with_cache(module_code, options)
     return module.get_function(name)
 
@@ -162,11 +279,120 @@ cpdef list _get_inout_args(
     return args
 
 
-@util.memoize(for_each_device=True)
-def _get_simple_reduction_function(
+cpdef Py_ssize_t _get_block_stride(
+        Py_ssize_t reduce_size, Py_ssize_t block_size):
+    # Rounding Up to the Next Power of 2
+    # clp2_count >= reduce_size
+    clp2_count = 1 << int.bit_length(int(reduce_size - 1))
+    return max(1, block_size // clp2_count)
+
+
+cpdef tuple _get_reduction_launch_config(
+        Py_ssize_t in_size, Py_ssize_t out_size, Py_ssize_t block_size,
+        Py_ssize_t target_blocks=256, Py_ssize_t min_iterations=16):
+    """Decides how to launch a reduction of ``in_size`` elements.
+
+    Each block of ``block_size`` threads reduces ``block_stride`` elements of
+    the output. If the output occupies fewer than ``target_blocks`` blocks,
+    the reduced axis is split into ``n_segments`` segments, which are reduced
+    by separate blocks into partial results in the first stage, and the
+    partial results are reduced in the second stage. Segments are only split
+    as long as each thread reduces at least ``min_iterations`` elements in
+    the first stage.
+
+    Args:
+        in_size (int): Size of the input.
+        out_size (int): Size of the output. It must be positive.
+        block_size (int): Number of threads in a block.
+        target_blocks (int): Number of blocks to occupy the device.
+        min_iterations (int): Minimum number of elements reduced by each
+            thread in the first stage.
+
+    Returns:
+        tuple: ``(block_stride, n_segments)``. ``n_segments`` is 1 for a
+        single-stage reduction.
+
+    """
+    cdef Py_ssize_t reduce_size, block_stride, n_blocks, n_segments
+    reduce_size = in_size // out_size
+    block_stride = _get_block_stride(reduce_size, block_size)
+    n_blocks = (out_size + block_stride - 1) // block_stride
+    n_segments = min(
+        target_blocks // n_blocks,
+        reduce_size // (block_size // block_stride * min_iterations))
+    if n_segments < 2:
+        n_segments = 1
+    return block_stride, n_segments
+
+
+cpdef bint _use_int64_index(Py_ssize_t in_size, Py_ssize_t block_size):
+    # The indices of the output and the reduced axis, and their offsets in
+    # the input, are less than 3 * in_size + block_size.
+    return in_size > (0x7fffffff - block_size) // 3
+
+
+# The partial results of two-stage reductions and the carries of scans are
+# stored in slots of the size of the reduction type. The size of a type other
+# than the scalar types, e.g., a struct defined in the preamble, is not known
+# before compilation, so such a type is given slots of _max_partial_itemsize
+# bytes, and the kernel fails to compile if the type is larger.
+cdef Py_ssize_t _max_partial_itemsize = 32
+
+cdef dict _typename_itemsizes = {
+    name: numpy.dtype(t).itemsize for t, name in _typenames.items()}
+
+
+cpdef Py_ssize_t _get_partial_itemsize(str type_name, types) except -1:
+    # types is a sequence of pairs of a type name and a dtype.
+    for name, t in types:
+        if name == type_name:
+            return numpy.dtype(t).itemsize
+    return _typename_itemsizes.get(type_name, _max_partial_itemsize)
+
+
+cdef tuple _two_stage_params = (
+    _get_param_info('raw uint8 _partials', False) +
+    _get_param_info('int32 _n_segments', True))
+
+
+cdef _launch_reduction(
+        get_kernel, list inout_args, Indexer in_indexer, Indexer out_indexer,
+        Py_ssize_t block_size, Py_ssize_t block_stride,
+        Py_ssize_t n_segments, Py_ssize_t partial_itemsize, stream=None):
+    # get_kernel(stage, int64_index, args_info) returns the kernel of the
+    # stage. The kernels allocate the shared memory statically.
+    # partial_itemsize is the size of a slot of the partial results.
+    cdef Py_ssize_t n_blocks = (
+        (out_indexer.size + block_stride - 1) // block_stride)
+    cdef bint int64_index = _use_int64_index(in_indexer.size, block_size)
+
+    if n_segments == 1:
+        kern = get_kernel(0, int64_index, _get_args_info(inout_args))
+        kern.linear_launch(
+            n_blocks * block_size, inout_args, 0, block_size, stream)
+        return
+
+    partials = ndarray(
+        (n_segments * out_indexer.size * partial_itemsize,), numpy.uint8)
+    inout_args = inout_args + [partials, numpy.int32(n_segments)]
+    args_info = _get_args_info(inout_args)
+    kern = get_kernel(1, int64_index, args_info)
+    kern.linear_launch(
+        n_segments * n_blocks * block_size, inout_args, 0, block_size,
+        stream)
+
+    block_stride = _get_block_stride(n_segments, block_size)
+    inout_args[-3] = numpy.int32(block_stride)
+    kern = get_kernel(2, int64_index, args_info)
+    kern.linear_launch(
+        (out_indexer.size + block_stride - 1) // block_stride * block_size,
+        inout_args, 0, block_size, stream)
+
+
+def _get_simple_reduction_function_source(
         routine, params, args_info, in_arg_dtype, out_arg_dtype, out_types,
         name, block_size, identity, input_expr, output_expr, _preamble,
-        options):
+        stage=0, warp_shuffle=True, int64_index=False):
     reduce_type = routine[3]
     if reduce_type is None:
         reduce_type = _get_typename(out_types[0])
@@ -174,16 +400,39 @@ def _get_simple_reduction_function(
     t = (_get_typename(in_arg_dtype), _get_typename(out_arg_dtype))
     type_preamble = 'typedef %s type_in0_raw; typedef %s type_out0_raw;' % t
 
+    if stage != 0:
+        params += _two_stage_params
     params = _get_kernel_params(params, args_info)
-    return _get_simple_reduction_kernel(
+    return _get_simple_reduction_kernel_source(
         name, block_size, reduce_type, params, identity,
         routine[0], routine[1], routine[2],
-        type_preamble, input_expr, output_expr, _preamble, options)
+        type_preamble, input_expr, output_expr, _preamble, stage,
+        warp_shuffle, int64_index)
+
+
+@util.memoize(for_each_device=True, maxsize=_kernel_memo_maxsize)
+def _get_simple_reduction_function(
+        routine, params, args_info, in_arg_dtype, out_arg_dtype, out_types,
+        name, block_size, identity, input_expr, output_expr, _preamble,
+        stage, warp_shuffle, int64_index, options):
+    source = _get_simple_reduction_function_source(
+        routine, params, args_info, in_arg_dtype, out_arg_dtype, out_types,
+        name, block_size, identity, input_expr, output_expr, _preamble,
+        stage, warp_shuffle, int64_index)
+    if _kernel_recorder is not None:
+        _kernel_recorder('simple_reduction', source, (
+            routine, params, args_info, in_arg_dtype, out_arg_dtype,
+            out_types, name, block_size, identity, input_expr, output_expr,
+            _preamble, stage, warp_shuffle, int64_index, options))
+    module = compile_with_cache(source, options)
+    return module.get_function(name)
 
 
 class simple_reduction_function(object):
 
     _block_size = 512
+    # Whether the threads of a block are reduced by warp shuffles.
+    _warp_shuffle = True
 
     def __init__(self, name, ops, identity, preamble):
         self.name = name
@@ -240,40 +489,43 @@ class simple_reduction_function(object):
         block_size = self._block_size
         in_indexer = Indexer(in_shape)
         out_indexer = Indexer(out_shape)
-        # Rounding Up to the Next Power of 2
-        # clp2_count >= in_indexer.size // out_indexer.size
-        clp2_count = 1 << int.bit_length(
-            int(in_indexer.size // out_indexer.size - 1))
-        block_stride = max(1, block_size // clp2_count)
+        block_stride, n_segments = _get_reduction_launch_config(
+            in_indexer.size, out_indexer.size, block_size)
 
         inout_args = _get_inout_args(
             in_args, out_args, in_indexer, out_indexer, block_stride,
             self._params, True)
-        args_info = _get_args_info(inout_args)
 
-        kern = _get_simple_reduction_function(
-            routine, self._params, args_info,
-            in_args[0].dtype.type, out_args[0].dtype.type, out_types,
-            self.name, block_size, self.identity,
-            self._input_expr, self._output_expr, self._preamble, ())
+        def get_kernel(stage, int64_index, args_info):
+            return _get_simple_reduction_function(
+                routine, self._params, args_info,
+                in_args[0].dtype.type, out_args[0].dtype.type, out_types,
+                self.name, block_size, self.identity,
+                self._input_expr, self._output_expr, self._preamble, stage,
+                self._warp_shuffle, int64_index, ())
 
-        # TODO(okuta) set actual size
-        shared_mem = 32 * block_size
-
-        kern.linear_launch(
-            (out_indexer.size + block_stride - 1) // block_stride * block_size,
-            inout_args, shared_mem, block_size)
+        reduce_type = routine[3]
+        if reduce_type is None:
+            reduce_type = _get_typename(out_types[0])
+        partial_itemsize = _get_partial_itemsize(
+            reduce_type, (('type_in0_raw', in_args[0].dtype),
+                          ('type_out0_raw', out_args[0].dtype)))
+        _launch_reduction(get_kernel, inout_args, in_indexer, out_indexer,
+                          block_size, block_stride, n_segments,
+                          partial_itemsize)
 
         if len(out_args) == 1:
             return out_args[0]
         return tuple(out_args)
 
 
-@util.memoize(for_each_device=True)
-def _get_reduction_kernel(
+def _get_reduction_kernel_source(
         params, args_info, types,
         name, block_size, reduce_type, identity, map_expr, reduce_expr,
-        post_map_expr, preamble, options):
+        post_map_expr, preamble, stage=0, warp_shuffle=True,
+        int64_index=False):
+    if stage != 0:
+        params += _two_stage_params
     kernel_params = _get_kernel_params(params, args_info)
     arrays = [p for p, a in zip(params, args_info)
               if not p.raw and a[0] is ndarray]
@@ -287,10 +539,29 @@ def _get_reduction_kernel(
         ['{0} &{1} = _raw_{1}[_i];'.format(p.ctype, p.name)
          for p in arrays if not p.is_const])
 
-    return _get_simple_reduction_kernel(
+    return _get_simple_reduction_kernel_source(
         name, block_size, reduce_type, kernel_params, identity,
         map_expr, reduce_expr, post_map_expr,
-        type_preamble, input_expr, output_expr, preamble, options)
+        type_preamble, input_expr, output_expr, preamble, stage,
+        warp_shuffle, int64_index)
+
+
+@util.memoize(for_each_device=True, maxsize=_kernel_memo_maxsize)
+def _get_reduction_kernel(
+        params, args_info, types,
+        name, block_size, reduce_type, identity, map_expr, reduce_expr,
+        post_map_expr, preamble, stage, warp_shuffle, int64_index, options):
+    source = _get_reduction_kernel_source(
+        params, args_info, types,
+        name, block_size, reduce_type, identity, map_expr, reduce_expr,
+        post_map_expr, preamble, stage, warp_shuffle, int64_index)
+    if _kernel_recorder is not None:
+        _kernel_recorder('reduction', source, (
+            params, args_info, types, name, block_size, reduce_type,
+            identity, map_expr, reduce_expr, post_map_expr, preamble,
+            stage, warp_shuffle, int64_index, options))
+    module = compile_with_cache(source, options)
+    return module.get_function(name)
 
 
 class ReductionKernel(object):
@@ -324,6 +595,10 @@ class ReductionKernel(object):
         options (tuple of str): Additional compilation options.
 
     """
+
+    _block_size = 512
+    _warp_shuffle = True
+
     def __init__(self, in_params, out_params,
                  map_expr, reduce_expr, post_map_expr,
                  identity, name='reduce_kernel', reduce_type=None,
@@ -421,32 +696,28 @@ class ReductionKernel(object):
         in_args, in_shape = _get_trans_args(
             in_args, axis + raxis, broad_shape, self.in_params)
 
-        block_size = 512
+        block_size = self._block_size
         in_indexer = Indexer(in_shape)
         out_indexer = Indexer(out_shape)
-        # Rounding Up to the Next Power of 2
-        # clp2_count >= in_indexer.size // out_indexer.size
-        clp2_count = 1 << int.bit_length(
-            int(in_indexer.size // out_indexer.size - 1))
-        block_stride = max(1, block_size // clp2_count)
+        block_stride, n_segments = _get_reduction_launch_config(
+            in_indexer.size, out_indexer.size, block_size)
 
         inout_args = _get_inout_args(
             in_args, out_args, in_indexer, out_indexer, block_stride,
             self.params, self.reduce_dims)
-        args_info = _get_args_info(inout_args)
 
-        kern = _get_reduction_kernel(
-            self.params, args_info, types,
-            self.name, block_size, self.reduce_type, self.identity,
-            self.map_expr, self.reduce_expr, self.post_map_expr,
-            self.preamble, self.options)
-
-        # TODO(okuta) set actual size
-        shared_mem = 32 * block_size
-
-        kern.linear_launch(
-            (out_indexer.size + block_stride - 1) // block_stride * block_size,
-            inout_args, shared_mem, block_size, stream)
+        def get_kernel(stage, int64_index, args_info):
+            return _get_reduction_kernel(
+                self.params, args_info, types,
+                self.name, block_size, self.reduce_type, self.identity,
+                self.map_expr, self.reduce_expr, self.post_map_expr,
+                self.preamble, stage, self._warp_shuffle, int64_index,
+                self.options)
+
+        _launch_reduction(get_kernel, inout_args, in_indexer, out_indexer,
+                          block_size, block_stride, n_segments,
+                          _get_partial_itemsize(self.reduce_type, types),
+                          stream)
         return out_args[0]
 
 
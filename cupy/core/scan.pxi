@@ -0,0 +1,484 @@
+import string
+
+import numpy
+
+from cupy.cuda import compiler
+from cupy import util
+
+
+# Scans run over tiles of _tile_size consecutive elements, one tile for each
+# block. The scanned axis is the last axis of the (transposed) arrays, so
+# that the scan of the whole array is a segmented scan whose segments start
+# at every _scan_size elements.
+#
+# stage 0: Scans an array that fits in a single tile in a single pass.
+# stage 1: Reduces each tile into _carries.
+# stage 2: Replaces _carries with their exclusive scan by a single block.
+# stage 3: Scans each tile starting from its carry.
+cdef Py_ssize_t _scan_carry_items = 16
+
+
+cdef str _scan_block_scan = '''
+    // Inclusive scan of the values of the threads of a block in the shared
+    // memory. The scan restarts at the threads whose head flag is set.
+    __device__ void _block_scan(_type_scan *_sval, int *_shead, int _tid) {
+      for (int _offset = 1; _offset < ${block_size}; _offset <<= 1) {
+        _type_scan _v = _sval[_tid];
+        int _h = _shead[_tid];
+        if (_tid >= _offset && !_h) {
+          _v = SCAN(_sval[_tid - _offset], _v);
+          _h = _shead[_tid - _offset];
+        }
+        __syncthreads();
+        _sval[_tid] = _v;
+        _shead[_tid] = _h;
+        __syncthreads();
+      }
+    }'''
+
+
+cdef str _scan_tile_body = '''
+      __shared__ __align__(16) char _sitems_raw[
+          sizeof(_type_scan) * ${tile_size}];
+      _type_scan *_sitems = reinterpret_cast<_type_scan*>(_sitems_raw);
+      const long long _tile = (long long)blockIdx.x * ${tile_size};
+
+      // Loads the tile in a striped arrangement to coalesce the accesses.
+      for (int _k = _tid; _k < ${tile_size}; _k += ${block_size}) {
+        const long long _j = _tile + _k;
+        if (_j < _size) {
+          ${input_expr}
+          _sitems[_k] = _type_scan(${map_expr});
+        }
+      }
+      __syncthreads();
+
+      // Each thread scans its consecutive items sequentially, and then the
+      // results of the threads are scanned.
+      const int _first = _tid * ${items_per_thread};
+      const long long _first_pos = (_tile + _first) % _scan_size;
+      long long _pos = _first_pos;
+      _type_scan _s = _type_scan(${identity});
+      int _h = 0;
+      for (int _k = _first; _k < _first + ${items_per_thread}; ++_k) {
+        if (_tile + _k >= _size) break;
+        if (_pos == 0) {
+          _s = _sitems[_k];
+          _h = 1;
+        } else {
+          _s = SCAN(_s, _sitems[_k]);
+        }
+        if (++_pos == _scan_size) _pos = 0;
+      }
+      _sval[_tid] = _s;
+      _shead[_tid] = _h;
+      __syncthreads();
+      _block_scan(_sval, _shead, _tid);
+      ${epilogue}'''
+
+
+cdef str _scan_tile_reduce_epilogue = '''
+      if (_tid == ${block_size} - 1) {
+        _carries_data[blockIdx.x] = _sval[_tid];
+        _carry_heads[blockIdx.x] = _shead[_tid];
+      }'''
+
+
+cdef str _scan_tile_scan_epilogue = '''
+      _type_scan _p = ${carry_in};
+      if (_tid > 0) {
+        if (_shead[_tid - 1]) {
+          _p = _sval[_tid - 1];
+        } else {
+          _p = SCAN(_p, _sval[_tid - 1]);
+        }
+      }
+      _pos = _first_pos;
+      for (int _k = _first; _k < _first + ${items_per_thread}; ++_k) {
+        if (_tile + _k >= _size) break;
+        _type_scan _v = _sitems[_k];
+        ${scan_item}
+        if (++_pos == _scan_size) _pos = 0;
+      }
+      __syncthreads();
+
+      for (int _k = _tid; _k < ${tile_size}; _k += ${block_size}) {
+        const long long _j = _tile + _k;
+        if (_j < _size) {
+          ${output_expr}
+          POST_MAP(_sitems[_k]);
+        }
+      }'''
+
+
+cdef str _scan_inclusive_item = '''if (_pos == 0) {
+          _p = _v;
+        } else {
+          _p = SCAN(_p, _v);
+        }
+        _sitems[_k] = _p;'''
+
+
+cdef str _scan_exclusive_item = '''if (_pos == 0) {
+          _p = _type_scan(${identity});
+        }
+        _sitems[_k] = _p;
+        _p = SCAN(_p, _v);'''
+
+
+# Each thread of the single block scans _scan_carry_items consecutive carries
+# at a time. The exclusive scan of the carries gives the carry into each
+# tile.
+cdef str _scan_carry_body = '''
+      _type_scan _c = _type_scan(${identity});
+      for (long long _base = 0; _base < _n_tiles;
+           _base += ${block_size} * ${carry_items}) {
+        const long long _first = _base + (long long)_tid * ${carry_items};
+        long long _last = _first + ${carry_items};
+        if (_last > _n_tiles) _last = _n_tiles;
+        _type_scan _s = _type_scan(${identity});
+        int _h = 0;
+        for (long long _k = _first; _k < _last; ++_k) {
+          if (_carry_heads[_k]) {
+            _s = _carries_data[_k];
+            _h = 1;
+          } else {
+            _s = SCAN(_s, _carries_data[_k]);
+          }
+        }
+        _sval[_tid] = _s;
+        _shead[_tid] = _h;
+        __syncthreads();
+        _block_scan(_sval, _shead, _tid);
+
+        _type_scan _p = _c;
+        if (_tid > 0) {
+          if (_shead[_tid - 1]) {
+            _p = _sval[_tid - 1];
+          } else {
+            _p = SCAN(_p, _sval[_tid - 1]);
+          }
+        }
+        for (long long _k = _first; _k < _last; ++_k) {
+          _type_scan _v = _carries_data[_k];
+          int _hk = _carry_heads[_k];
+          _carries_data[_k] = _p;
+          if (_hk) {
+            _p = _v;
+          } else {
+            _p = SCAN(_p, _v);
+          }
+        }
+        if (_shead[${block_size} - 1]) {
+          _c = _sval[${block_size} - 1];
+        } else {
+          _c = SCAN(_c, _sval[${block_size} - 1]);
+        }
+        __syncthreads();
+      }'''
+
+
+cpdef str _get_simple_scan_kernel_source(
+        name, block_size, items_per_thread, scan_type, params, identity,
+        map_expr, scan_expr, post_map_expr, type_preamble, input_expr,
+        output_expr, preamble, int stage=0, bint exclusive=False):
+    # The stages are described at the top of this file. The structure of the
+    # kernel is assembled first, and then the expressions are substituted.
+    if stage == 2:
+        body = _scan_carry_body
+    else:
+        if stage == 1:
+            epilogue = _scan_tile_reduce_epilogue
+        else:
+            if stage == 3:
+                carry_in = '_carries_data[blockIdx.x]'
+            else:
+                carry_in = '_type_scan(${identity})'
+            if exclusive:
+                scan_item = _scan_exclusive_item
+            else:
+                scan_item = _scan_inclusive_item
+            epilogue = string.Template(
+                _scan_tile_scan_epilogue).safe_substitute(
+                    carry_in=carry_in, scan_item=scan_item)
+        body = string.Template(_scan_tile_body).safe_substitute(
+            epilogue=epilogue)
+    if stage != 0:
+        body = '''typedef char _scan_type_too_large[
+          sizeof(_type_scan) <= %d ? 1 : -1];
+      _type_scan *_carries_data =
+          reinterpret_cast<_type_scan*>(&_carries[0]);''' % (
+            _max_partial_itemsize) + body
+    source = string.Template('''
+    ${type_preamble}
+    ${preamble}
+    #define SCAN(a, b) (${scan_expr})
+    #define POST_MAP(a) (${post_map_expr})
+
+    typedef ${scan_type} _type_scan;
+    ${block_scan}
+
+    extern "C" __global__ void ${name}(${params}) {
+      // Raw storage, as __shared__ variables cannot have constructors.
+      __shared__ __align__(16) char _sval_raw[
+          sizeof(_type_scan) * ${block_size}];
+      __shared__ int _shead[${block_size}];
+      _type_scan *_sval = reinterpret_cast<_type_scan*>(_sval_raw);
+      const int _tid = threadIdx.x;
+      ${body}
+    }''').safe_substitute(block_scan=_scan_block_scan, body=body)
+    return string.Template(source).substitute(
+        name=name,
+        block_size=block_size,
+        items_per_thread=items_per_thread,
+        tile_size=block_size * items_per_thread,
+        carry_items=_scan_carry_items,
+        scan_type=scan_type,
+        params=params,
+        identity=identity,
+        map_expr=map_expr,
+        scan_expr=scan_expr,
+        post_map_expr=post_map_expr,
+        type_preamble=type_preamble,
+        input_expr=input_expr,
+        output_expr=output_expr,
+        preamble=preamble)
+
+
+cdef tuple _scan_params = _get_param_info(
+    'int64 _size, int64 _scan_size', True)
+
+
+cdef tuple _scan_carry_params = (
+    _get_param_info('raw uint8 _carries, raw int32 _carry_heads', False) +
+    _get_param_info('int64 _n_tiles', True))
+
+
+def _get_scan_kernel_source(
+        params, args_info, types, name, block_size, items_per_thread,
+        scan_type, identity, map_expr, scan_expr, post_map_expr, preamble,
+        stage=0, exclusive=False):
+    kernel_params = _get_kernel_params(params, args_info)
+    arrays = [p for p, a in zip(params, args_info)
+              if not p.raw and a[0] is ndarray]
+    type_preamble = '\n'.join(
+        'typedef %s %s;' % (_get_typename(v), k)
+        for k, v in types)
+    input_expr = '\n'.join(
+        ['const {0} {1} = _raw_{1}[_j];'.format(p.ctype, p.name)
+         for p in arrays if p.is_const])
+    output_expr = '\n'.join(
+        ['{0} &{1} = _raw_{1}[_j];'.format(p.ctype, p.name)
+         for p in arrays if not p.is_const])
+    return _get_simple_scan_kernel_source(
+        name, block_size, items_per_thread, scan_type, kernel_params,
+        identity, map_expr, scan_expr, post_map_expr, type_preamble,
+        input_expr, output_expr, preamble, stage, exclusive)
+
+
+@util.memoize(for_each_device=True, maxsize=_kernel_memo_maxsize)
+def _get_scan_kernel(
+        params, args_info, types, name, block_size, items_per_thread,
+        scan_type, identity, map_expr, scan_expr, post_map_expr, preamble,
+        stage, exclusive, options):
+    source = _get_scan_kernel_source(
+        params, args_info, types, name, block_size, items_per_thread,
+        scan_type, identity, map_expr, scan_expr, post_map_expr, preamble,
+        stage, exclusive)
+    module = compile_with_cache(source, options)
+    return module.get_function(name)
+
+
+cdef _launch_scan(
+        get_kernel, list args, Py_ssize_t size, Py_ssize_t block_size,
+        Py_ssize_t items_per_thread, Py_ssize_t carry_itemsize, stream=None):
+    # get_kernel(stage, args_info) returns the kernel of the stage. The
+    # kernels allocate the shared memory statically. carry_itemsize is the
+    # size of a slot of the carries, given by _get_partial_itemsize.
+    cdef Py_ssize_t tile_size = block_size * items_per_thread
+    cdef Py_ssize_t n_tiles = (size + tile_size - 1) // tile_size
+
+    if n_tiles == 1:
+        kern = get_kernel(0, _get_args_info(args))
+        kern.linear_launch(block_size, args, 0, block_size, stream)
+        return
+
+    carries = ndarray((n_tiles * carry_itemsize,), numpy.uint8)
+    carry_heads = ndarray((n_tiles,), numpy.int32)
+    args = args + [carries, carry_heads, numpy.int64(n_tiles)]
+    args_info = _get_args_info(args)
+    for stage, n_blocks in ((1, n_tiles), (2, 1), (3, n_tiles)):
+        kern = get_kernel(stage, args_info)
+        kern.linear_launch(
+            n_blocks * block_size, args, 0, block_size, stream)
+
+
+class ScanKernel(object):
+
+    """User-defined scan kernel.
+
+    This class can be used to define a scan (prefix reduction) kernel with an
+    associative operator, such as a cumulative sum, with or without
+    broadcasting. The scan is taken along a single axis, or over the
+    flattened array if the axis is not specified.
+
+    The kernel is compiled at an invocation of the
+    :meth:`~ScanKernel.__call__` method, which is cached for each device.
+    The compiled binary is also cached into a file under the
+    ``$HOME/.cupy/kernel_cache/`` directory with a hashed file name. The cached
+    binary is reused by other processes.
+
+    Args:
+        in_params (str): Input argument list.
+        out_params (str): Output argument list.
+        map_expr (str): Mapping expression for input values.
+        scan_expr (str): Associative operator of the scan. It combines the
+            special variables ``a`` and ``b``, where ``a`` precedes ``b``.
+        post_map_expr (str): Mapping expression for scanned values, which are
+            stored in the special variable ``a``.
+        identity (str): Identity value of the operator.
+        name (str): Name of the kernel function. It should be set for
+            readability of the performance profiling.
+        scan_type (str): Type of values to be used for the scan. This type is
+            used to store the special variables ``a`` and ``b``.
+        preamble (str): Fragment of the CUDA-C/C++ code that is inserted at the
+            top of the cu file.
+        options (tuple of str): Additional compilation options.
+
+    """
+
+    _block_size = 256
+    _items_per_thread = 4
+
+    def __init__(self, in_params, out_params,
+                 map_expr, scan_expr, post_map_expr,
+                 identity, name='scan_kernel', scan_type=None,
+                 preamble='', options=()):
+        if not compiler.is_valid_kernel_name(name):
+            raise ValueError(
+                'Invalid kernel name: "%s"' % name)
+
+        self.in_params = _get_param_info(in_params, True)
+        self.out_params = _get_param_info(out_params, False)
+        self.nin = len(self.in_params)
+        self.nout = len(self.out_params)
+        self.nargs = self.nin + self.nout
+        self.params = self.in_params + self.out_params + _scan_params
+        self.identity = identity
+        self.scan_expr = scan_expr
+        self.map_expr = map_expr
+        self.name = name
+        self.options = options
+        self.post_map_expr = post_map_expr
+        if scan_type is None:
+            self.scan_type = self.out_params[0].ctype
+        else:
+            self.scan_type = scan_type
+        self.preamble = preamble
+
+    def __call__(self, *args, **kwargs):
+        """Compiles and invokes the scan kernel.
+
+        The compilation runs only if the kernel is not cached. Note that the
+        kernels with different argument dtypes or ndims are not compatible. It
+        means that single ScanKernel object may be compiled into multiple
+        kernel binaries.
+
+        Args:
+            args: Arguments of the kernel.
+            axis (int): Axis along which the scan is taken. If it is ``None``,
+                the scan is taken over the flattened array and the outputs are
+                one-dimensional.
+            exclusive (bool): If ``True``, each output excludes the input at
+                its position, i.e., the scan starts with the identity.
+
+        Returns:
+            Arrays are returned according to the ``out_params`` argument of the
+            ``__init__`` method.
+
+        """
+
+        out = kwargs.pop('out', None)
+        axis = kwargs.pop('axis', None)
+        exclusive = kwargs.pop('exclusive', False)
+        stream = kwargs.pop('stream', None)
+        if kwargs:
+            raise TypeError('Wrong arguments %s' % kwargs)
+
+        n_args = len(args)
+        if n_args != self.nin and n_args != self.nargs:
+            raise TypeError('Wrong number of arguments for %s' % self.name)
+
+        out_args = list(args[self.nin:])
+        if out is not None:
+            if self.nout != 1:
+                raise NotImplementedError('')
+            if len(out_args) != 0:
+                raise ValueError("cannot specify 'out' as both "
+                                 "a positional and keyword argument")
+            out_args = [out]
+
+        in_args = _preprocess_args(args[:self.nin])
+        out_args = _preprocess_args(out_args)
+        in_args, broad_shape = _broadcast(in_args, self.in_params, False)
+
+        in_ndarray_types = tuple(
+            [a.dtype.type if isinstance(a, ndarray) else None
+             for a in in_args])
+        out_ndarray_types = tuple(
+            [a.dtype.type if isinstance(a, ndarray) else None
+             for a in out_args])
+        in_types, out_types, types = _decide_params_type(
+            self.in_params, self.out_params,
+            in_ndarray_types, out_ndarray_types)
+
+        ndim = len(broad_shape)
+        size = internal.prod(broad_shape)
+        if axis is None:
+            out_shape = size,
+        else:
+            if not (-ndim <= axis < ndim):
+                raise _AxisError('axis(={}) out of bounds'.format(axis))
+            axis %= ndim
+            out_shape = broad_shape
+        out_args = _get_out_args_with_params(
+            out_args, out_types, out_shape, self.out_params, False)
+        if size == 0:
+            return out_args[0]
+
+        in_args = [x if isinstance(x, ndarray) else t(x)
+                   for x, t in zip(in_args, in_types)]
+        if axis is None:
+            in_shape = broad_shape
+            scan_size = size
+            scan_out_args = out_args
+        else:
+            # The scanned axis is moved to the last axis.
+            trans = tuple([i for i in range(ndim) if i != axis]) + (axis,)
+            in_args, in_shape = _get_trans_args(
+                in_args, trans, broad_shape, self.in_params)
+            scan_out_args, out_shape = _get_trans_args(
+                out_args, trans, out_shape, self.out_params)
+            scan_size = broad_shape[axis]
+        in_args, _ = _reduce_dims(in_args, self.in_params, in_shape)
+        scan_out_args, _ = _reduce_dims(
+            scan_out_args, self.out_params, out_shape)
+        args = in_args + scan_out_args + [
+            numpy.int64(size), numpy.int64(scan_size)]
+
+        block_size = self._block_size
+        items_per_thread = self._items_per_thread
+
+        def get_kernel(stage, args_info):
+            params = self.params
+            if stage != 0:
+                params += _scan_carry_params
+            return _get_scan_kernel(
+                params, args_info, types, self.name, block_size,
+                items_per_thread, self.scan_type, self.identity,
+                self.map_expr, self.scan_expr, self.post_map_expr,
+                self.preamble, stage, exclusive, self.options)
+
+        _launch_scan(get_kernel, args, size, block_size, items_per_thread,
+                     _get_partial_itemsize(self.scan_type, types), stream)
+        return out_args[0]
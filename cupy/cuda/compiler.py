@@ -1,17 +1,25 @@
 import hashlib
 import math
+import multiprocessing
 import os
 import re
-import shutil
 import sys
 import tempfile
+import threading
 
 import six
 
 from cupy.cuda import device
 from cupy.cuda import function
+from cupy.cuda import kernel_cache
 from cupy.cuda import nvrtc
 
+try:
+    from concurrent import futures
+    _futures_available = True
+except ImportError:
+    _futures_available = False
+
 _nvrtc_version = None
 _nvrtc_max_compute_capability = None
 
@@ -107,27 +115,42 @@ def _preprocess(source, options, arch):
     return result
 
 
-_default_cache_dir = os.path.expanduser('~/.cupy/kernel_cache')
+def get_cache_dir():
+    return kernel_cache.get_cache_dir()
 
 
-def get_cache_dir():
-    return os.environ.get('CUPY_CACHE_DIR', _default_cache_dir)
+def cache_stats(cache_dir=None):
+    """Returns statistics of the kernel cache.
 
+    Args:
+        cache_dir (str): Path to the cache directory. If ``None``, the
+            default cache directory is used.
 
-_empty_file_preprocess_cache = {}
+    Returns:
+        dict: A dictionary with the keys ``cache_dir``, ``n_entries``,
+        ``total_size``, ``max_size``, ``hits``, ``misses`` and
+        ``evictions``. ``hits``, ``misses`` and ``evictions`` are counted in
+        the current process.
 
+    """
+    return kernel_cache.get_cache(cache_dir).stats()
 
-def compile_with_cache(source, options=(), arch=None, cache_dir=None,
-                       extra_source=None):
-    # NVRTC does not use extra_source. extra_source is used for cache key.
-    global _empty_file_preprocess_cache
-    if cache_dir is None:
-        cache_dir = get_cache_dir()
-    if arch is None:
-        arch = _get_arch()
 
-    options += ('-ftz=true',)
+def get_memory_cache():
+    """Returns the in-memory cache of compiled kernels.
+
+    Returns:
+        cupy.cuda.kernel_cache.MemoryCache: The cache shared by the process.
+
+    """
+    return _memory_cache
+
+
+_memory_cache = kernel_cache.MemoryCache()
+_empty_file_preprocess_cache = {}
 
+
+def _get_cache_key(source, options, arch, extra_source):
     env = (arch, options, _get_nvrtc_version())
     base = _empty_file_preprocess_cache.get(env, None)
     if base is None:
@@ -137,54 +160,264 @@ def compile_with_cache(source, options=(), arch=None, cache_dir=None,
     key_src = '%s %s %s %s' % (env, base, source, extra_source)
 
     key_src = key_src.encode('utf-8')
-    name = '%s_2.cubin' % hashlib.md5(key_src).hexdigest()
+    return '%s_2.cubin' % hashlib.md5(key_src).hexdigest()
 
-    if not os.path.isdir(cache_dir):
-        try:
-            os.makedirs(cache_dir)
-        except OSError:
-            if not os.path.isdir(cache_dir):
-                raise
 
+def get_cache_key(source, options=(), arch=None, extra_source=None):
+    """Returns the name of the cache entry of a kernel.
+
+    The name is the one :func:`compile_with_cache` uses to look up the
+    compiled binary in the kernel cache. Computing it runs the NVRTC
+    preprocessor but does not require a GPU when ``arch`` is given.
+
+    Args:
+        source (str): CUDA source code.
+        options (tuple of str): Options passed to NVRTC.
+        arch (str): Target architecture such as ``'compute_60'``. The
+            architecture of the current device is used if ``None``.
+        extra_source (str): Source code that is not compiled but is part of
+            the cache key.
+
+    Returns:
+        str: The file name of the cache entry.
+
+    """
+    if arch is None:
+        arch = _get_arch()
+    return _get_cache_key(
+        source, options + ('-ftz=true',), arch, extra_source)
+
+
+def compile_with_cache(source, options=(), arch=None, cache_dir=None,
+                       extra_source=None):
+    return _compile_with_cache(
+        source, options, arch, cache_dir, extra_source, compile_using_nvrtc)
+
+
+def _compile_with_cache(source, options, arch, cache_dir, extra_source,
+                        compile_ptx):
+    # NVRTC does not use extra_source. extra_source is used for cache key.
+    if arch is None:
+        arch = _get_arch()
+
+    options += ('-ftz=true',)
+
+    # The in-memory cache is keyed by the inputs of the hash of the on-disk
+    # cache, except for the NVRTC version which does not change in a process.
+    mem_key = (arch, options, source, extra_source)
+    cubin = _memory_cache.get(mem_key)
+    if cubin is not None:
+        mod = function.Module()
+        mod.load(cubin)
+        return mod
+
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+
+    name = _get_cache_key(source, options, arch, extra_source)
+    cache = kernel_cache.get_cache(cache_dir)
     mod = function.Module()
     # To handle conflicts in concurrent situation, we adopt lock-free method
     # to avoid performance degradation.
-    path = os.path.join(cache_dir, name)
-    if os.path.exists(path):
-        with open(path, 'rb') as file:
-            data = file.read()
-        if len(data) >= 32:
-            hash = data[:32]
-            cubin = data[32:]
-            cubin_hash = six.b(hashlib.md5(cubin).hexdigest())
-            if hash == cubin_hash:
-                mod.load(cubin)
-                return mod
-
-    ptx = compile_using_nvrtc(source, options, arch)
-    ls = function.LinkState()
-    ls.add_ptr_data(ptx, six.u('cupy.ptx'))
-    cubin = ls.complete()
-    cubin_hash = six.b(hashlib.md5(cubin).hexdigest())
-
-    # shutil.move is not atomic operation, so it could result in a corrupted
-    # file. We detect it by appending md5 hash at the beginning of each cache
-    # file. If the file is corrupted, it will be ignored next time it is read.
-    with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False) as tf:
-        tf.write(cubin_hash)
-        tf.write(cubin)
-        temp_path = tf.name
-    shutil.move(temp_path, path)
-
-    # Save .cu source file along with .cubin
-    if _get_bool_env_variable('CUPY_CACHE_SAVE_CUDA_SOURCE', False):
-        with open(path + '.cu', 'w') as f:
-            f.write(source)
+    cubin = cache.load(name)
+    if cubin is not None:
+        _memory_cache.put(mem_key, cubin)
+        mod.load(cubin)
+        return mod
+
+    def compile_and_save():
+        # The kernel may have been compiled by another thread just before
+        # this thread started the compilation.
+        cubin = _memory_cache.get(mem_key)
+        if cubin is not None:
+            return cubin
+
+        ptx = compile_ptx(source, options, arch)
+        ls = function.LinkState()
+        ls.add_ptr_data(ptx, six.u('cupy.ptx'))
+        cubin = ls.complete()
+
+        # Save .cu source file along with .cubin
+        if _get_bool_env_variable('CUPY_CACHE_SAVE_CUDA_SOURCE', False):
+            cache.save(name, cubin, source)
+        else:
+            cache.save(name, cubin)
+        _memory_cache.put(mem_key, cubin)
+        return cubin
 
+    # Threads requesting a kernel being compiled wait for the compilation
+    # instead of compiling it again.
+    cubin = _in_flight.run((cache_dir, name), compile_and_save)
     mod.load(cubin)
     return mod
 
 
+class _Compilation(object):
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._exception = None
+
+    def set_result(self, result):
+        self._result = result
+        self._event.set()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class _InFlight(object):
+
+    """Compilations in progress shared by the threads requesting them."""
+
+    def __init__(self):
+        self._compilations = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._compilations)
+
+    def run(self, key, func):
+        """Calls ``func`` unless another thread is running it for ``key``.
+
+        Args:
+            key: Key identifying the compilation.
+            func (callable): Function without arguments that compiles the
+                kernel.
+
+        Returns:
+            The value returned by ``func`` in this or another thread. The
+            exception raised by ``func`` is raised in all the threads.
+
+        """
+        with self._lock:
+            compilation = self._compilations.get(key)
+            owner = compilation is None
+            if owner:
+                compilation = _Compilation()
+                self._compilations[key] = compilation
+        if not owner:
+            return compilation.wait()
+
+        try:
+            result = func()
+        except BaseException as e:
+            compilation.set_exception(e)
+            raise
+        else:
+            compilation.set_result(result)
+        finally:
+            with self._lock:
+                del self._compilations[key]
+        return result
+
+
+_in_flight = _InFlight()
+
+
+class AsyncCompiler(object):
+
+    """Compiles kernels on background threads.
+
+    Submitted kernels are compiled with :func:`compile_with_cache` on a
+    thread pool, and the results are stored in the kernel caches. NVRTC
+    releases the GIL, so the compilations run in parallel. A call of
+    :func:`compile_with_cache` for a kernel being compiled waits for the
+    compilation instead of compiling the kernel again.
+
+    This class requires :mod:`concurrent.futures`, which is available in
+    Python 2 with the ``futures`` package.
+
+    Args:
+        max_workers (int): The number of threads. The number of CPUs is used
+            if ``None``.
+        process_executor: An executor such as
+            :class:`concurrent.futures.ProcessPoolExecutor` on which NVRTC is
+            invoked. The threads wait for the executor and link the results.
+            If ``None``, NVRTC is invoked on the threads.
+
+    """
+
+    def __init__(self, max_workers=None, process_executor=None):
+        if not _futures_available:
+            raise RuntimeError(
+                'AsyncCompiler requires concurrent.futures. '
+                'Install the futures package on Python 2.')
+        if max_workers is None:
+            max_workers = multiprocessing.cpu_count()
+        self._executor = futures.ThreadPoolExecutor(max_workers)
+        self._process_executor = process_executor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def submit(self, source, options=(), arch=None, cache_dir=None,
+               extra_source=None):
+        """Submits a kernel for compilation.
+
+        The arguments are the same as :func:`compile_with_cache`. The kernel
+        is compiled for the current device.
+
+        Returns:
+            concurrent.futures.Future: A future of the
+            :class:`cupy.cuda.function.Module` of the kernel.
+
+        """
+        if arch is None:
+            arch = _get_arch()
+        return self._executor.submit(
+            self._compile, device.get_device_id(), source, options, arch,
+            cache_dir, extra_source)
+
+    def submit_many(self, sources, options=(), arch=None, cache_dir=None,
+                    extra_source=None):
+        """Submits kernels for compilation.
+
+        Args:
+            sources (list of str): CUDA sources of the kernels.
+
+        Returns:
+            list of concurrent.futures.Future: Futures of the modules in the
+            order of ``sources``.
+
+        """
+        return [self.submit(source, options, arch, cache_dir, extra_source)
+                for source in sources]
+
+    def shutdown(self, wait=True):
+        """Shuts down the thread pool.
+
+        Args:
+            wait (bool): If ``True``, waits for the submitted compilations.
+
+        """
+        self._executor.shutdown(wait)
+
+    def _compile(self, device_id, source, options, arch, cache_dir,
+                 extra_source):
+        with device.Device(device_id):
+            return _compile_with_cache(
+                source, options, arch, cache_dir, extra_source,
+                self._compile_ptx)
+
+    def _compile_ptx(self, source, options, arch):
+        if self._process_executor is None:
+            return compile_using_nvrtc(source, options, arch)
+        return self._process_executor.submit(
+            compile_using_nvrtc, source, options, arch).result()
+
+
 class CompileException(Exception):
 
     def __init__(self, msg, source, name, options):
@@ -193,6 +426,10 @@ class CompileException(Exception):
         self.name = name
         self.options = options
 
+    def __reduce__(self):
+        # Allows the exception to be raised from a worker process.
+        return (type(self), (self._msg, self.source, self.name, self.options))
+
     def __repr__(self):
         return str(self)
 
@@ -27,6 +27,10 @@ cdef extern from "cupy_cufft.h" nogil:
     # cuFFT Plan Function
     Result cufftMakePlan1d(Handle plan, int nx, Type type, int batch,
                            size_t *workSize)
+    Result cufftMakePlanMany(Handle plan, int rank, int *n, int *inembed,
+                             int istride, int idist, int *onembed,
+                             int ostride, int odist, Type type, int batch,
+                             size_t *workSize)
 
     # cuFFT Exec Function
     Result cufftExecC2C(Handle plan, Complex *idata, Complex *odata,
@@ -94,8 +98,10 @@ class Plan1d(object):
         check_result(result)
         self.nx = nx
         self.fft_type = fft_type
+        self.batch = batch
         self.plan = plan
         self.workArea = workArea
+        self.work_size = workSize
 
     def __del__(self):
         cdef Handle plan = self.plan
@@ -104,18 +110,110 @@ class Plan1d(object):
         check_result(result)
 
     def fft(self, a, out, direction):
+        _exec(self.plan, self.fft_type, a, out, direction)
+
+    def get_output_array(self, a):
+        shape = list(a.shape)
         if self.fft_type == CUFFT_C2C:
-            execC2C(self.plan, a.data, out.data, direction)
+            return cupy.empty(shape, numpy.complex64)
         elif self.fft_type == CUFFT_R2C:
-            execR2C(self.plan, a.data, out.data)
+            shape[-1] = shape[-1] // 2 + 1
+            return cupy.empty(shape, numpy.complex64)
         elif self.fft_type == CUFFT_C2R:
-            execC2R(self.plan, a.data, out.data)
+            shape[-1] = self.nx
+            return cupy.empty(shape, numpy.float32)
         elif self.fft_type == CUFFT_Z2Z:
-            execZ2Z(self.plan, a.data, out.data, direction)
+            return cupy.empty(shape, numpy.complex128)
         elif self.fft_type == CUFFT_D2Z:
-            execD2Z(self.plan, a.data, out.data)
+            shape[-1] = shape[-1] // 2 + 1
+            return cupy.empty(shape, numpy.complex128)
         else:
-            execZ2D(self.plan, a.data, out.data)
+            shape[-1] = self.nx
+            return cupy.empty(shape, numpy.float64)
+
+
+class PlanNd(object):
+    """Multi-dimensional cuFFT plan created by ``cufftMakePlanMany``.
+
+    Args:
+        shape (tuple of ints): Shape of the transform. Its length must be 1,
+            2 or 3. For ``C2R`` and ``Z2D`` transforms it is the shape of the
+            real output.
+        fft_type (int): cuFFT transform type.
+        batch (int): Number of transforms.
+        inembed (tuple of ints): Storage dimensions of the input data for
+            the advanced data layout. If ``None``, the basic layout is used
+            and the stride and distance arguments are ignored.
+        istride (int): Distance between two successive input elements.
+        idist (int): Distance between the first elements of two successive
+            input batches.
+        onembed (tuple of ints): Storage dimensions of the output data.
+        ostride (int): Distance between two successive output elements.
+        odist (int): Distance between the first elements of two successive
+            output batches.
+
+    """
+
+    def __init__(self, shape, int fft_type, int batch, inembed=None,
+                 int istride=1, int idist=0, onembed=None, int ostride=1,
+                 int odist=0):
+        cdef Handle plan
+        cdef size_t workSize
+        cdef int rank = len(shape)
+        cdef int n[3]
+        cdef int inembed_arr[3]
+        cdef int onembed_arr[3]
+        cdef int *inembed_ptr = NULL
+        cdef int *onembed_ptr = NULL
+        cdef int i
+
+        if not 1 <= rank <= 3:
+            raise ValueError('cuFFT supports 1 to 3 dimensional transforms')
+        if (inembed is None) != (onembed is None):
+            raise ValueError('inembed and onembed must be given together')
+        for i in range(rank):
+            n[i] = shape[i]
+        if inembed is not None:
+            if len(inembed) != rank or len(onembed) != rank:
+                raise ValueError('inembed and onembed must have the same '
+                                 'length as shape')
+            for i in range(rank):
+                inembed_arr[i] = inembed[i]
+                onembed_arr[i] = onembed[i]
+            inembed_ptr = inembed_arr
+            onembed_ptr = onembed_arr
+
+        stream = stream_module.get_current_stream_ptr()
+        with nogil:
+            result = cufftCreate(&plan)
+            if result == 0:
+                result = cufftSetStream(<Handle>plan, <driver.Stream>stream)
+            if result == 0:
+                result = cufftSetAutoAllocation(plan, 0)
+            if result == 0:
+                result = cufftMakePlanMany(
+                    plan, rank, n, inembed_ptr, istride, idist, onembed_ptr,
+                    ostride, odist, <Type>fft_type, batch, &workSize)
+        check_result(result)
+        workArea = memory.alloc(workSize)
+        with nogil:
+            result = cufftSetWorkArea(plan, <void *>(workArea.ptr))
+        check_result(result)
+        self.shape = tuple(shape)
+        self.fft_type = fft_type
+        self.batch = batch
+        self.plan = plan
+        self.workArea = workArea
+        self.work_size = workSize
+
+    def __del__(self):
+        cdef Handle plan = self.plan
+        with nogil:
+            result = cufftDestroy(plan)
+        check_result(result)
+
+    def fft(self, a, out, direction):
+        _exec(self.plan, self.fft_type, a, out, direction)
 
     def get_output_array(self, a):
         shape = list(a.shape)
@@ -125,7 +223,7 @@ class Plan1d(object):
             shape[-1] = shape[-1] // 2 + 1
             return cupy.empty(shape, numpy.complex64)
         elif self.fft_type == CUFFT_C2R:
-            shape[-1] = self.nx
+            shape[-1] = self.shape[-1]
             return cupy.empty(shape, numpy.float32)
         elif self.fft_type == CUFFT_Z2Z:
             return cupy.empty(shape, numpy.complex128)
@@ -133,10 +231,25 @@ class Plan1d(object):
             shape[-1] = shape[-1] // 2 + 1
             return cupy.empty(shape, numpy.complex128)
         else:
-            shape[-1] = self.nx
+            shape[-1] = self.shape[-1]
             return cupy.empty(shape, numpy.float64)
 
 
+cdef _exec(size_t plan, int fft_type, a, out, int direction):
+    if fft_type == CUFFT_C2C:
+        execC2C(plan, a.data, out.data, direction)
+    elif fft_type == CUFFT_R2C:
+        execR2C(plan, a.data, out.data)
+    elif fft_type == CUFFT_C2R:
+        execC2R(plan, a.data, out.data)
+    elif fft_type == CUFFT_Z2Z:
+        execZ2Z(plan, a.data, out.data, direction)
+    elif fft_type == CUFFT_D2Z:
+        execD2Z(plan, a.data, out.data)
+    else:
+        execZ2D(plan, a.data, out.data)
+
+
 cpdef execC2C(size_t plan, size_t idata, size_t odata, int direction):
     with nogil:
         result = cufftExecC2C(plan, <Complex*>idata, <Complex*>odata,
@@ -0,0 +1,30 @@
+#ifndef INCLUDE_GUARD_CUPY_CLOCK_H
+#define INCLUDE_GUARD_CUPY_CLOCK_H
+
+// Monotonic clock in nanoseconds for the statistics of the memory pool.
+
+#ifdef _WIN32
+#include <windows.h>
+
+static long long cupy_clock_ns() {
+    static LARGE_INTEGER freq = {0};
+    LARGE_INTEGER count;
+    if (freq.QuadPart == 0) {
+        QueryPerformanceFrequency(&freq);
+    }
+    QueryPerformanceCounter(&count);
+    return (long long)((double)count.QuadPart * 1e9 / freq.QuadPart);
+}
+
+#else // #ifdef _WIN32
+#include <time.h>
+
+static long long cupy_clock_ns() {
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (long long)ts.tv_sec * 1000000000LL + ts.tv_nsec;
+}
+
+#endif // #ifdef _WIN32
+
+#endif // #ifndef INCLUDE_GUARD_CUPY_CLOCK_H
@@ -71,6 +71,10 @@ cufftResult_t cufftMakePlan1d(...) {
     return CUFFT_SUCCESS;
 }
 
+cufftResult_t cufftMakePlanMany(...) {
+    return CUFFT_SUCCESS;
+}
+
 
 // cuFFT Exec Function
 cufftResult_t cufftExecC2C(...) {
@@ -77,6 +77,8 @@ cdef inline CPointer _pointer(x):
     cdef Py_ssize_t itemsize
     if x is None:
         return CPointer()
+    if isinstance(x, CPointer):
+        return x
     if isinstance(x, core.ndarray):
         return (<core.ndarray>x).get_pointer()
     if isinstance(x, core.Indexer):
@@ -0,0 +1,895 @@
+"""Management of the on-disk cache of compiled kernels.
+
+Each compiled kernel is stored as a file named ``<md5>_2.cubin`` in the cache
+directory, whose content is the md5 hash of the cubin followed by the cubin
+itself. In addition to the cubin files, the cache directory holds an index
+file recording the size and the last access time of each entry, which is used
+to bound the total size of the cache by evicting least recently used entries.
+
+Alternatively, when ``CUPY_CACHE_BACKEND`` is set to ``sqlite``, all the
+kernels are stored in a single SQLite database in the cache directory, which
+avoids opening and hashing one file per kernel at startup.
+
+This module can be run as a script to inspect, prune or migrate a cache
+directory::
+
+    $ python -m cupy.cuda.kernel_cache inspect
+    $ python -m cupy.cuda.kernel_cache prune --max-size 1000000000
+    $ python -m cupy.cuda.kernel_cache migrate
+
+"""
+from __future__ import print_function
+
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import six
+
+try:
+    import sqlite3
+    _sqlite_available = True
+except ImportError:
+    _sqlite_available = False
+
+
+_default_cache_dir = os.path.expanduser('~/.cupy/kernel_cache')
+
+_index_name = 'index.json'
+_index_version = 1
+_cubin_suffix = '_2.cubin'
+
+
+def get_cache_dir():
+    return os.environ.get('CUPY_CACHE_DIR', _default_cache_dir)
+
+
+def get_cache_backend():
+    """Returns the name of the kernel cache backend.
+
+    The backend is read from the ``CUPY_CACHE_BACKEND`` environment variable,
+    which is either ``file`` (default) or ``sqlite``.
+
+    """
+    backend = os.environ.get('CUPY_CACHE_BACKEND') or 'file'
+    if backend not in _backends:
+        raise ValueError(
+            'CUPY_CACHE_BACKEND must be one of {}: {}'.format(
+                ', '.join(sorted(_backends)), backend))
+    return backend
+
+
+def get_cache_max_size():
+    """Returns the size limit of the kernel cache in bytes.
+
+    The limit is read from the ``CUPY_CACHE_MAX_SIZE`` environment variable.
+    ``0`` means that the size of the cache is not limited.
+
+    """
+    val = os.environ.get('CUPY_CACHE_MAX_SIZE')
+    if not val:
+        return 0
+    try:
+        size = int(val)
+    except ValueError:
+        raise ValueError(
+            'CUPY_CACHE_MAX_SIZE must be an integer: {}'.format(val))
+    if size < 0:
+        raise ValueError(
+            'CUPY_CACHE_MAX_SIZE must be non-negative: {}'.format(val))
+    return size
+
+
+def _makedirs(path):
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+
+
+def _atomic_write(path, dirname, *chunks):
+    # shutil.move is not atomic operation, so it could result in a corrupted
+    # file. Readers of the cubin files detect it with the md5 hash at the
+    # beginning of each file, and a broken index is rebuilt from the
+    # directory listing.
+    with tempfile.NamedTemporaryFile(dir=dirname, delete=False) as tf:
+        for chunk in chunks:
+            tf.write(chunk)
+        temp_path = tf.name
+    shutil.move(temp_path, path)
+
+
+def _read_file(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def _verify_md5(data):
+    # Returns the cubin if the md5 hash at the beginning of the data matches.
+    if len(data) >= 32:
+        hash = data[:32]
+        cubin = data[32:]
+        cubin_hash = six.b(hashlib.md5(cubin).hexdigest())
+        if hash == cubin_hash:
+            return cubin
+    return None
+
+
+def _crc32(data):
+    return zlib.crc32(data) & 0xffffffff
+
+
+class MemoryCache(object):
+
+    """Bounded in-memory cache of cubins shared by the whole process.
+
+    The cache is consulted before the on-disk cache so that loading the same
+    kernel again, e.g., after :func:`cupy.clear_memo` or on another device of
+    the same architecture, does not touch the file system. The least recently
+    used entry is evicted when the number of entries exceeds the limit.
+    The statistics are not synchronized between threads and may be slightly
+    inaccurate under concurrent lookups.
+
+    Args:
+        max_entries (int): The maximum number of cubins. ``0`` disables the
+            cache.
+
+    """
+
+    def __init__(self, max_entries=1024):
+        if max_entries < 0:
+            raise ValueError(
+                'max_entries must be non-negative: {}'.format(max_entries))
+        self.max_entries = max_entries
+        # key -> [cubin, last access tick]
+        self._entries = {}
+        self._tick = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cubin of the key, or ``None`` if it is not cached."""
+        # The hit path only records the access tick without taking the lock
+        # nor reordering the entries, which is done at eviction instead.
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._tick += 1
+        entry[1] = self._tick
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, cubin):
+        """Stores a cubin, evicting the least recently used one if needed."""
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._tick += 1
+            self._entries[key] = [cubin, self._tick]
+            self._evict()
+
+    def _evict(self):
+        # Must be called with the lock held.
+        entries = self._entries
+        n = len(entries) - self.max_entries
+        if n <= 0:
+            return
+        keys = sorted(entries, key=lambda k: entries[k][1])[:n]
+        for key in keys:
+            del entries[key]
+        self.evictions += n
+
+    def set_max_entries(self, max_entries):
+        """Changes the maximum number of cubins and evicts excess entries."""
+        if max_entries < 0:
+            raise ValueError(
+                'max_entries must be non-negative: {}'.format(max_entries))
+        with self._lock:
+            self.max_entries = max_entries
+            self._evict()
+
+    def clear(self):
+        """Removes all the cubins and resets the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Returns statistics of the cache.
+
+        Returns:
+            dict: A dictionary with the keys ``n_entries``, ``max_entries``,
+            ``total_size``, ``hits``, ``misses`` and ``evictions``.
+
+        """
+        with self._lock:
+            return {
+                'n_entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'total_size': sum(
+                    len(entry[0]) for entry in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class FileCache(object):
+
+    """Kernel cache storing each cubin in a separate file.
+
+    The index of the entries is kept in memory and written back to the cache
+    directory at most once every ``flush_interval`` seconds when entries are
+    added, and at exit. The total size of the entries is also kept in memory,
+    and the directory is rescanned only on :meth:`prune`. Concurrent processes
+    merge their indexes when writing it, and entries not found in the index
+    are recovered from the directory listing, so the index never needs to be
+    exactly in sync with the cubin files.
+
+    Args:
+        cache_dir (str): Path to the cache directory.
+        max_size (int): The maximum total size of the cubin files in bytes.
+            ``0`` means unlimited. If ``None``, the value of
+            ``CUPY_CACHE_MAX_SIZE`` is used.
+        clock (callable): A function returning the current time in seconds.
+            It is used to record the access time of the entries.
+        flush_interval (float): The minimum interval in seconds between
+            writes of the index on :meth:`save`. ``0`` writes the index on
+            every save.
+
+    """
+
+    def __init__(self, cache_dir, max_size=None, clock=time.time,
+                 flush_interval=5.0):
+        if max_size is None:
+            max_size = get_cache_max_size()
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = threading.RLock()
+        # name -> [size, access time]
+        self._entries = None
+        self._total_size = 0
+        self._dirty = False
+        self.flush_interval = flush_interval
+        self._last_flush = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, _index_name)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if (not isinstance(index, dict) or
+                index.get('version') != _index_version):
+            return None
+        entries = index.get('entries')
+        if not isinstance(entries, dict):
+            return None
+        return dict((name, list(entry)) for name, entry in entries.items())
+
+    def _scan(self):
+        entries = {}
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(_cubin_suffix):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries[name] = [st.st_size, max(st.st_atime, st.st_mtime)]
+        return entries
+
+    def _get_entries(self):
+        if self._entries is None:
+            entries = self._read_index()
+            if entries is None:
+                entries = self._scan()
+                self._dirty = bool(entries)
+            self._entries = entries
+            self._recount()
+        return self._entries
+
+    def _recount(self):
+        self._total_size = sum(entry[0] for entry in self._entries.values())
+
+    def _put_entry(self, name, size):
+        # Must be called with the lock held.
+        old = self._get_entries().get(name)
+        if old is not None:
+            self._total_size -= old[0]
+        self._entries[name] = [size, self._clock()]
+        self._total_size += size
+        self._dirty = True
+
+    def _pop_entry(self, name):
+        # Must be called with the lock held.
+        entry = self._get_entries().pop(name, None)
+        if entry is not None:
+            self._total_size -= entry[0]
+            self._dirty = True
+        return entry
+
+    def load(self, name):
+        """Reads a cubin from the cache.
+
+        Args:
+            name (str): Name of the cache entry.
+
+        Returns:
+            bytes: The cubin, or ``None`` if the entry does not exist or is
+            corrupted.
+
+        """
+        data = _read_file(os.path.join(self.cache_dir, name))
+        with self._lock:
+            if data is None:
+                self._pop_entry(name)
+            else:
+                cubin = _verify_md5(data)
+                if cubin is not None:
+                    self._put_entry(name, len(data))
+                    self.hits += 1
+                    return cubin
+            self.misses += 1
+        return None
+
+    def save(self, name, cubin, source=None):
+        """Writes a cubin to the cache and evicts old entries if necessary.
+
+        Args:
+            name (str): Name of the cache entry.
+            cubin (bytes): The compiled binary.
+            source (str): CUDA source code saved along with the cubin for
+                debugging purpose, or ``None``.
+
+        """
+        _makedirs(self.cache_dir)
+        cubin_hash = six.b(hashlib.md5(cubin).hexdigest())
+        path = os.path.join(self.cache_dir, name)
+        _atomic_write(path, self.cache_dir, cubin_hash, cubin)
+        if source is not None:
+            with open(path + '.cu', 'w') as f:
+                f.write(source)
+        with self._lock:
+            self._put_entry(name, len(cubin_hash) + len(cubin))
+            if self.max_size and self._total_size > self.max_size:
+                self._evict(self.max_size, keep=name)
+            now = self._clock()
+            if (self._last_flush is None or
+                    now - self._last_flush >= self.flush_interval):
+                self.flush()
+
+    def total_size(self):
+        """Returns the total size of the entries in bytes."""
+        with self._lock:
+            self._get_entries()
+            return self._total_size
+
+    def _evict(self, max_size, keep=None):
+        # Must be called with the lock held.
+        entries = self._get_entries()
+        if self._total_size <= max_size:
+            return []
+        evicted = []
+        for name in sorted(entries, key=lambda n: entries[n][1]):
+            if self._total_size <= max_size:
+                break
+            if name == keep:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            for p in (path, path + '.cu'):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+            self._pop_entry(name)
+            evicted.append(name)
+        self.evictions += len(evicted)
+        return evicted
+
+    def prune(self, max_size=None):
+        """Evicts least recently used entries until the cache fits the limit.
+
+        The directory is rescanned before eviction so that the entries added
+        by other processes are also taken into account.
+
+        Args:
+            max_size (int): The size limit in bytes. If ``None``, the limit
+                given to the constructor is used.
+
+        Returns:
+            list of str: Names of the evicted entries.
+
+        """
+        if max_size is None:
+            max_size = self.max_size
+        with self._lock:
+            self.refresh()
+            evicted = []
+            if max_size:
+                evicted = self._evict(max_size)
+            self.flush()
+            return evicted
+
+    def refresh(self):
+        """Synchronizes the index with the files in the cache directory."""
+        with self._lock:
+            entries = self._get_entries()
+            on_disk = self._scan()
+            for name in list(entries):
+                if name not in on_disk:
+                    del entries[name]
+            for name, entry in six.iteritems(on_disk):
+                if name in entries:
+                    # The access time in the index is more accurate than the
+                    # file system timestamps.
+                    entries[name][0] = entry[0]
+                else:
+                    entries[name] = entry
+            self._recount()
+            self._dirty = True
+
+    def _merge(self, entries):
+        # Merges entries read from the index file with the in-memory index,
+        # keeping the newest access time of each entry.
+        mine = self._get_entries()
+        for name, entry in six.iteritems(entries):
+            if name in mine:
+                mine[name] = [entry[0], max(entry[1], mine[name][1])]
+            else:
+                mine[name] = entry
+        self._recount()
+
+    def flush(self):
+        """Writes the index back to the cache directory if it is modified."""
+        with self._lock:
+            self._last_flush = self._clock()
+            if not self._dirty or not os.path.isdir(self.cache_dir):
+                return
+            on_disk = self._read_index()
+            if on_disk is not None:
+                # Keep entries added by other processes, but not the ones
+                # evicted by this process since.
+                mine = self._get_entries()
+                on_disk = dict(
+                    (name, entry) for name, entry in six.iteritems(on_disk)
+                    if name in mine or
+                    os.path.exists(os.path.join(self.cache_dir, name)))
+                self._merge(on_disk)
+            index = {'version': _index_version, 'entries': self._entries}
+            data = json.dumps(index, separators=(',', ':'))
+            _atomic_write(self.index_path, self.cache_dir,
+                          data.encode('utf-8'))
+            self._dirty = False
+
+    def stats(self):
+        """Returns statistics of the cache.
+
+        Returns:
+            dict: A dictionary with the keys ``backend``, ``cache_dir``,
+            ``n_entries``, ``total_size``, ``max_size``, ``hits``,
+            ``misses`` and ``evictions``. The last three are counted in this
+            process.
+
+        """
+        with self._lock:
+            entries = self._get_entries()
+            return {
+                'backend': 'file',
+                'cache_dir': self.cache_dir,
+                'n_entries': len(entries),
+                'total_size': self._total_size,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class SqliteCache(object):
+
+    """Kernel cache storing all cubins in a single SQLite database.
+
+    SQLite allows concurrent readers and a single writer, and a transaction
+    is never partially written, so the cubins are not hashed on load. A CRC32
+    checksum of each cubin is still verified to detect corrupted storage.
+
+    Updates of the access times are buffered in memory and written back when
+    an entry is added and at exit, so loading a kernel never takes the write
+    lock of the database.
+
+    Args:
+        cache_dir (str): Path to the cache directory. The database is created
+            in this directory.
+        max_size (int): The maximum total size of the cubins in bytes. ``0``
+            means unlimited. If ``None``, the value of ``CUPY_CACHE_MAX_SIZE``
+            is used.
+        preload (bool): If ``True``, all the cubins are read into memory at
+            the first lookup. If ``None``, it is enabled when
+            ``CUPY_CACHE_PRELOAD`` is set to 1.
+        fallback (bool): If ``True``, a kernel not found in the database is
+            looked up in the per-file cache in the same directory and copied
+            into the database, which migrates existing caches on demand.
+        clock (callable): A function returning the current time in seconds.
+
+    """
+
+    db_name = 'kernel_cache.sqlite'
+
+    def __init__(self, cache_dir, max_size=None, preload=None, fallback=True,
+                 clock=time.time):
+        if not _sqlite_available:
+            raise RuntimeError(
+                'sqlite3 module is required for the sqlite kernel cache')
+        if max_size is None:
+            max_size = get_cache_max_size()
+        if preload is None:
+            preload = os.environ.get('CUPY_CACHE_PRELOAD', '0') == '1'
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.preload = preload
+        self.fallback = fallback
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._conn = None
+        self._preloaded = None
+        # name -> access time not yet written to the database
+        self._atimes = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def path(self):
+        return os.path.join(self.cache_dir, self.db_name)
+
+    def _connect(self):
+        if self._conn is None:
+            _makedirs(self.cache_dir)
+            # Transactions are controlled explicitly.
+            conn = sqlite3.connect(self.path, timeout=60,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS kernels ('
+                'name TEXT PRIMARY KEY, cubin BLOB NOT NULL, '
+                'crc INTEGER NOT NULL, size INTEGER NOT NULL, '
+                'atime REAL NOT NULL, source TEXT)')
+            self._conn = conn
+        return self._conn
+
+    def _write(self, func, *args):
+        # Runs func(conn, *args) in a write transaction.
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            ret = func(conn, *args)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return ret
+
+    def _preload(self):
+        self._preloaded = dict(
+            (name, (bytes(cubin), crc)) for name, cubin, crc in
+            self._connect().execute('SELECT name, cubin, crc FROM kernels'))
+
+    def load(self, name):
+        """Reads a cubin from the cache.
+
+        Args:
+            name (str): Name of the cache entry.
+
+        Returns:
+            bytes: The cubin, or ``None`` if the entry does not exist or is
+            corrupted.
+
+        """
+        with self._lock:
+            row = None
+            if self.preload:
+                if self._preloaded is None:
+                    self._preload()
+                row = self._preloaded.get(name)
+            if row is None:
+                # The entry may have been added by another process.
+                row = self._connect().execute(
+                    'SELECT cubin, crc FROM kernels WHERE name = ?',
+                    (name,)).fetchone()
+            if row is not None:
+                cubin = bytes(row[0])
+                if _crc32(cubin) == row[1]:
+                    self._atimes[name] = self._clock()
+                    self.hits += 1
+                    return cubin
+            if self.fallback:
+                data = _read_file(os.path.join(self.cache_dir, name))
+                cubin = None if data is None else _verify_md5(data)
+                if cubin is not None:
+                    self.save(name, cubin)
+                    self.hits += 1
+                    return cubin
+            self.misses += 1
+        return None
+
+    def save(self, name, cubin, source=None):
+        """Writes a cubin to the cache and evicts old entries if necessary.
+
+        Args:
+            name (str): Name of the cache entry.
+            cubin (bytes): The compiled binary.
+            source (str): CUDA source code saved along with the cubin for
+                debugging purpose, or ``None``.
+
+        """
+        with self._lock:
+            self._write(self._save, name, cubin, source)
+
+    def _save(self, conn, name, cubin, source):
+        self._write_atimes(conn)
+        conn.execute(
+            'INSERT OR REPLACE INTO kernels '
+            '(name, cubin, crc, size, atime, source) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (name, sqlite3.Binary(cubin), _crc32(cubin), len(cubin),
+             self._clock(), source))
+        if self._preloaded is not None:
+            self._preloaded[name] = (cubin, _crc32(cubin))
+        if self.max_size:
+            self._evict(conn, self.max_size, keep=name)
+
+    def _write_atimes(self, conn):
+        if self._atimes:
+            conn.executemany(
+                'UPDATE kernels SET atime = max(atime, ?) WHERE name = ?',
+                [(atime, name) for name, atime in six.iteritems(self._atimes)])
+            self._atimes.clear()
+
+    def _evict(self, conn, max_size, keep=None):
+        total = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM kernels').fetchone()[0]
+        evicted = []
+        if total <= max_size:
+            return evicted
+        rows = conn.execute(
+            'SELECT name, size FROM kernels ORDER BY atime').fetchall()
+        for name, size in rows:
+            if total <= max_size:
+                break
+            if name == keep:
+                continue
+            evicted.append(name)
+            total -= size
+        conn.executemany('DELETE FROM kernels WHERE name = ?',
+                         [(name,) for name in evicted])
+        if self._preloaded is not None:
+            for name in evicted:
+                self._preloaded.pop(name, None)
+        self.evictions += len(evicted)
+        return evicted
+
+    def total_size(self):
+        """Returns the total size of the entries in bytes."""
+        with self._lock:
+            return self._connect().execute(
+                'SELECT COALESCE(SUM(size), 0) FROM kernels').fetchone()[0]
+
+    def prune(self, max_size=None):
+        """Evicts least recently used entries until the cache fits the limit.
+
+        Args:
+            max_size (int): The size limit in bytes. If ``None``, the limit
+                given to the constructor is used.
+
+        Returns:
+            list of str: Names of the evicted entries.
+
+        """
+        if max_size is None:
+            max_size = self.max_size
+        with self._lock:
+            self.flush()
+            if not max_size:
+                return []
+            return self._write(self._evict, max_size)
+
+    def refresh(self):
+        """Does nothing as the database is always consistent."""
+        pass
+
+    def flush(self):
+        """Writes the buffered access times back to the database."""
+        with self._lock:
+            if self._atimes:
+                self._write(self._write_atimes)
+
+    def import_files(self, cache_dir=None):
+        """Copies the cubins of a per-file cache into the database.
+
+        Args:
+            cache_dir (str): Path to the per-file cache directory. If
+                ``None``, the directory of this cache is used.
+
+        Returns:
+            int: The number of imported entries.
+
+        """
+        if cache_dir is None:
+            cache_dir = self.cache_dir
+        rows = []
+        for name in sorted(os.listdir(cache_dir)):
+            if not name.endswith(_cubin_suffix):
+                continue
+            path = os.path.join(cache_dir, name)
+            data = _read_file(path)
+            cubin = None if data is None else _verify_md5(data)
+            if cubin is None:
+                continue
+            source = _read_file(path + '.cu')
+            if source is not None:
+                source = source.decode('utf-8')
+            atime = os.stat(path).st_mtime
+            rows.append((name, sqlite3.Binary(cubin), _crc32(cubin),
+                         len(cubin), atime, source))
+
+        def insert(conn):
+            return conn.executemany(
+                'INSERT OR IGNORE INTO kernels '
+                '(name, cubin, crc, size, atime, source) '
+                'VALUES (?, ?, ?, ?, ?, ?)', rows).rowcount
+
+        with self._lock:
+            n = self._write(insert)
+            self._preloaded = None
+        return n
+
+    def stats(self):
+        """Returns statistics of the cache.
+
+        Returns:
+            dict: A dictionary with the keys ``backend``, ``cache_dir``,
+            ``n_entries``, ``total_size``, ``max_size``, ``hits``,
+            ``misses`` and ``evictions``. The last three are counted in this
+            process.
+
+        """
+        with self._lock:
+            n_entries, total_size = self._connect().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) '
+                'FROM kernels').fetchone()
+            return {
+                'backend': 'sqlite',
+                'cache_dir': self.cache_dir,
+                'n_entries': n_entries,
+                'total_size': total_size,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def close(self):
+        """Writes the buffered access times and closes the database."""
+        with self._lock:
+            if self._conn is not None:
+                self.flush()
+                self._conn.close()
+                self._conn = None
+
+
+_backends = {
+    'file': FileCache,
+    'sqlite': SqliteCache,
+}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(cache_dir=None):
+    """Returns the cache object managing a cache directory.
+
+    The backend is selected by the ``CUPY_CACHE_BACKEND`` environment
+    variable.
+
+    Args:
+        cache_dir (str): Path to the cache directory. If ``None``, the
+            value of ``CUPY_CACHE_DIR`` or ``~/.cupy/kernel_cache`` is used.
+
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+    key = (cache_dir, get_cache_backend())
+    cache = _caches.get(key)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(key)
+            if cache is None:
+                cache = _backends[key[1]](cache_dir)
+                _caches[key] = cache
+    return cache
+
+
+@atexit.register
+def _flush_all():
+    for cache in list(_caches.values()):
+        try:
+            cache.flush()
+        except Exception:
+            # The cache directory may be unavailable at exit.
+            pass
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m cupy.cuda.kernel_cache',
+        description='Inspect, prune or migrate the CuPy kernel cache.')
+    parser.add_argument('command', choices=('inspect', 'prune', 'migrate'))
+    parser.add_argument('--dir', default=None,
+                        help='Path to the cache directory. '
+                        'CUPY_CACHE_DIR is used by default.')
+    parser.add_argument('--max-size', type=int, default=None,
+                        help='Size limit in bytes used by prune. '
+                        'CUPY_CACHE_MAX_SIZE is used by default.')
+    parser.add_argument('--backend', choices=sorted(_backends), default=None,
+                        help='Cache backend. CUPY_CACHE_BACKEND is used by '
+                        'default. migrate always imports the per-file cache '
+                        'into the sqlite backend.')
+    args = parser.parse_args(args)
+
+    cache_dir = args.dir or get_cache_dir()
+    if args.command == 'migrate':
+        cache = SqliteCache(cache_dir, fallback=False)
+        n = cache.import_files()
+        print('Imported {} entries'.format(n))
+    else:
+        backend = args.backend or get_cache_backend()
+        cache = _backends[backend](cache_dir)
+    if args.command == 'prune':
+        evicted = cache.prune(args.max_size)
+        print('Evicted {} entries'.format(len(evicted)))
+    else:
+        cache.refresh()
+        cache.flush()
+    for key, value in sorted(cache.stats().items()):
+        if key not in ('hits', 'misses', 'evictions'):
+            print('{}: {}'.format(key, value))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -32,12 +32,49 @@ cdef class MemoryPointer:
     cpdef memset_async(self, int value, size_t size, stream=?)
 
 
+cdef class _Chunk:
+
+    cdef:
+        readonly object mem
+        readonly device.Device device
+        readonly size_t ptr
+        readonly Py_ssize_t offset
+        readonly Py_ssize_t size
+        public size_t stream_ptr
+        public _Chunk prev
+        public _Chunk next
+        public object event
+        public double free_time
+
+    cpdef _Chunk split(self, Py_ssize_t size)
+    cpdef merge(self, _Chunk remaining)
+
+
 cpdef MemoryPointer alloc(Py_ssize_t size)
 
 
 cpdef set_allocator(allocator=*)
 
 
+cdef struct _Counter:
+    Py_ssize_t bytes
+    Py_ssize_t blocks
+
+
+cdef enum:
+    _N_STATS_SIZE_CLASSES = 64
+    _N_STATS_LATENCY_BINS = 40
+
+
+cdef struct _AllocationStats:
+    Py_ssize_t mallocs[_N_STATS_SIZE_CLASSES]
+    Py_ssize_t malloc_bytes[_N_STATS_SIZE_CLASSES]
+    Py_ssize_t hits[_N_STATS_SIZE_CLASSES]
+    Py_ssize_t frees[_N_STATS_SIZE_CLASSES]
+    Py_ssize_t malloc_latency[_N_STATS_LATENCY_BINS]
+    Py_ssize_t free_latency[_N_STATS_LATENCY_BINS]
+
+
 cdef class SingleDeviceMemoryPool:
 
     cdef:
@@ -48,6 +85,34 @@ cdef class SingleDeviceMemoryPool:
         object _weakref
         object _free_lock
         object _in_use_lock
+        object _total_bytes_lock
+        Py_ssize_t _total_bytes
+        size_t _total_bytes_limit
+        Py_ssize_t _peak_total_bytes
+        Py_ssize_t _peak_used_bytes
+        Py_ssize_t _n_mallocs
+        Py_ssize_t _n_frees
+        _Counter _in_use_total
+        _Counter _free_total
+        map.map[size_t, _Counter] _in_use_stats
+        map.map[size_t, _Counter] _free_stats
+        Py_ssize_t _slab_size
+        Py_ssize_t _slab_threshold
+        Py_ssize_t _bin_cutoff
+        int _n_size_classes
+        double _max_oversize
+        int _cross_stream_mode
+        Py_ssize_t _n_cross_stream_reuses
+        Py_ssize_t _cross_stream_reused_bytes
+        object _trim_clock
+        double _trim_idle_time
+        Py_ssize_t _trim_high_water
+        double _trim_interval
+        double _next_trim_time
+        Py_ssize_t _n_trimmed
+        Py_ssize_t _trimmed_bytes
+        bint _allocation_stats_enabled
+        _AllocationStats _allocation_stats
         readonly Py_ssize_t _allocation_unit_size
         readonly int _device_id
         map.map[size_t, vector.vector[int]] _index
@@ -55,6 +120,17 @@ cdef class SingleDeviceMemoryPool:
     cpdef MemoryPointer _alloc(self, Py_ssize_t size)
     cpdef MemoryPointer malloc(self, Py_ssize_t size)
     cpdef MemoryPointer _malloc(self, Py_ssize_t size)
+    cdef _Chunk _pop_free_chunk(self, size_t stream_ptr, Py_ssize_t size,
+                                int bin_index, int max_bin_index,
+                                bint exact_bins, int cross_stream_mode)
+    cdef Memory _try_malloc(self, Py_ssize_t size)
+    cdef bint _reserve_bytes(self, Py_ssize_t size) except *
+    cdef _release_bytes(self, Py_ssize_t size)
+    cdef _count_in_use(self, size_t stream_ptr, Py_ssize_t size, int n)
+    cdef _count_free(self, size_t stream_ptr, Py_ssize_t size, int n)
+    cdef _maybe_trim(self)
+    cdef _record_malloc(self, Py_ssize_t size, bint hit, long long start)
+    cdef _record_free(self, Py_ssize_t size, long long start)
     cpdef free(self, size_t ptr, Py_ssize_t size)
     cpdef free_all_blocks(self, stream=?)
     cpdef free_all_free(self)
@@ -62,8 +138,21 @@ cdef class SingleDeviceMemoryPool:
     cpdef used_bytes(self)
     cpdef free_bytes(self)
     cpdef total_bytes(self)
+    cpdef dict get_stats(self)
+    cpdef set_allocation_stats(self, bint enabled=?)
+    cpdef dict get_allocation_stats(self, bint reset=?)
+    cpdef set_limit(self, size=?, fraction=?)
+    cpdef size_t get_limit(self)
+    cpdef set_slab_size(self, Py_ssize_t size, threshold=?)
+    cpdef set_cross_stream_reuse(self, bint enabled=?, bint wait=?)
+    cpdef set_trim_policy(self, double idle_time=?, Py_ssize_t high_water=?,
+                          double interval=?, clock=?)
+    cpdef Py_ssize_t trim(self) except -1
+    cpdef set_size_classes(self, Py_ssize_t cutoff=?, int n_classes=?,
+                           double max_oversize=?)
     cpdef Py_ssize_t _round_size(self, Py_ssize_t size)
     cpdef int _bin_index_from_size(self, Py_ssize_t size)
+    cdef int _max_bin_index(self, Py_ssize_t size)
     cpdef list _arena(self, size_t stream_ptr)
     cdef vector.vector[int]* _arena_index(self, size_t stream_ptr)
     cpdef _append_to_free_list(self, Py_ssize_t size, chunk, size_t stream_ptr)
@@ -82,3 +171,15 @@ cdef class MemoryPool:
     cpdef used_bytes(self)
     cpdef free_bytes(self)
     cpdef total_bytes(self)
+    cpdef dict get_stats(self)
+    cpdef set_allocation_stats(self, bint enabled=?)
+    cpdef dict get_allocation_stats(self, bint reset=?)
+    cpdef set_limit(self, size=?, fraction=?)
+    cpdef size_t get_limit(self)
+    cpdef set_slab_size(self, Py_ssize_t size, threshold=?)
+    cpdef set_cross_stream_reuse(self, bint enabled=?, bint wait=?)
+    cpdef set_trim_policy(self, double idle_time=?, Py_ssize_t high_water=?,
+                          double interval=?, clock=?)
+    cpdef Py_ssize_t trim(self) except -1
+    cpdef set_size_classes(self, Py_ssize_t cutoff=?, int n_classes=?,
+                           double max_oversize=?)
@@ -3,13 +3,20 @@ import atexit
 import collections
 import ctypes
 import gc
+import os
+import time
 import warnings
 import weakref
 
+from cpython.pythread cimport PyThread_get_thread_ident
 from fastrlock cimport rlock
+from libc.limits cimport INT_MAX
+from libc.string cimport memset
 from libcpp cimport algorithm
+from libcpp.utility cimport pair
 
 from cupy.cuda import runtime
+from cupy.cuda import stream as stream_module
 
 from cupy.cuda cimport device
 from cupy.cuda cimport device as device_mod
@@ -18,6 +25,10 @@ from cupy.cuda cimport runtime
 from cupy.cuda cimport stream as stream_module
 
 
+cdef extern from "cupy_clock.h" nogil:
+    long long cupy_clock_ns()
+
+
 cdef bint _exit_mode = False
 
 
@@ -28,9 +39,11 @@ def _exit():
 
 class OutOfMemoryError(MemoryError):
 
-    def __init__(self, size, total):
+    def __init__(self, size, total, limit=0):
         msg = 'out of memory to allocate %d bytes ' \
               '(total %d bytes)' % (size, total)
+        if limit != 0:
+            msg += ' (limit set to %d bytes)' % limit
         super(OutOfMemoryError, self).__init__(msg)
 
 
@@ -149,18 +162,12 @@ cdef class _Chunk:
         prev (Chunk): prev memory pointer if split from a larger allocation
         next (Chunk): next memory pointer if split from a larger allocation
         stream_ptr (size_t): Raw stream handle of cupy.cuda.Stream
+        event (~cupy.cuda.Event): Event recorded on the stream when the
+            chunk is freed if the cross-stream reuse is enabled
+        free_time (float): Time when the chunk is freed if the trim policy
+            is set
     """
 
-    cdef:
-        readonly object mem
-        readonly device.Device device
-        readonly size_t ptr
-        readonly Py_ssize_t offset
-        readonly Py_ssize_t size
-        public size_t stream_ptr
-        public _Chunk prev
-        public _Chunk next
-
     def __init__(self, *args):
         # For debug
         self._init(*args)
@@ -184,6 +191,10 @@ cdef class _Chunk:
         remaining = _Chunk.__new__(_Chunk)
         remaining._init(self.mem, self.offset + size, self.size - size,
                         self.stream_ptr)
+        # The remaining block has not been used since the event of the
+        # original block. The event can be shared as it is never recorded
+        # again; a new event is created each time a block is freed.
+        remaining.event = self.event
         self.size = size
 
         if self.next is not None:
@@ -551,6 +562,49 @@ cdef class PooledMemory(Memory):
 
 cdef int _index_compaction_threshold = 512
 
+cdef object _monotonic = getattr(time, 'monotonic', time.time)
+
+
+cdef object _first(item):
+    return item[0]
+
+
+cdef inline int _bit_length(unsigned long long x):
+    cdef int n = 0
+    while x:
+        x >>= 1
+        n += 1
+    return n
+
+
+cdef dict _histogram(Py_ssize_t* counts, int n, bint lower_bounds):
+    # Maps the lower bound of each nonempty bin to its count. The bin ``i``
+    # covers [2 ** i, 2 ** (i + 1)), or [2 ** (i - 1), 2 ** i) with 0 for
+    # ``i == 0`` if ``lower_bounds`` is False.
+    cdef dict histogram = {}
+    cdef int i
+    for i in range(n):
+        if counts[i] == 0:
+            continue
+        if lower_bounds:
+            histogram[1 << i] = counts[i]
+        else:
+            histogram[0 if i == 0 else 1 << (i - 1)] = counts[i]
+    return histogram
+
+cdef enum:
+    _CROSS_STREAM_DISABLED = 0
+    _CROSS_STREAM_WAIT = 1
+    _CROSS_STREAM_READY = 2
+
+
+cdef inline bint _is_reusable(_Chunk chunk, int cross_stream_mode) except *:
+    # A chunk freed before the cross-stream reuse is enabled has no event.
+    if chunk.event is None:
+        return False
+    return (cross_stream_mode == _CROSS_STREAM_WAIT or
+            runtime.eventQuery(chunk.event.ptr) == 0)
+
 
 cdef _compact_index(SingleDeviceMemoryPool pool, size_t stream_ptr, bint free):
     # need self._free_lock
@@ -559,6 +613,8 @@ cdef _compact_index(SingleDeviceMemoryPool pool, size_t stream_ptr, bint free):
     cdef vector.vector[int]* arena_index
     cdef vector.vector[int] new_index
     cdef size_t index
+    cdef Py_ssize_t released = 0
+    cdef int n_released = 0
 
     if stream_ptr not in pool._free:
         return
@@ -574,14 +630,22 @@ cdef _compact_index(SingleDeviceMemoryPool pool, size_t stream_ptr, bint free):
             for chunk in free_list:
                 if chunk.prev is not None or chunk.next is not None:
                     keep_list.add(chunk)
+                else:
+                    released += chunk.size
+                    n_released += 1
             if len(keep_list) == 0:
                 continue
             free_list = keep_list
 
         new_index.push_back(arena_index.at(index))
         new_arena.append(free_list)
+    if n_released:
+        pool._count_free(stream_ptr, -released, -n_released)
+        pool._n_frees += n_released
+        pool._release_bytes(released)
     if len(new_arena) == 0:
         pool._index.erase(stream_ptr)
+        pool._free_stats.erase(stream_ptr)
         del pool._free[stream_ptr]
     else:
         arena_index.swap(new_index)
@@ -597,9 +661,39 @@ cdef class SingleDeviceMemoryPool:
       cudaMalloc.
     - If the cudaMalloc fails, the allocator will free all cached blocks that
       are not split and retry the allocation.
+    - If a limit is set by :meth:`set_limit` and the allocation would exceed
+      it, the allocator frees all cached blocks that are not split and raises
+      :class:`~cupy.cuda.memory.OutOfMemoryError` without calling cudaMalloc
+      if the limit is still exceeded.
+    - If a slab size is set by :meth:`set_slab_size`, the allocator delegates
+      requests smaller than the threshold to cudaMalloc with the slab size,
+      and the rest of the slab is cached as a split block for the following
+      small requests.
+    - The free blocks are binned by 512-byte size classes. If a cutoff is set
+      by :meth:`set_size_classes`, blocks larger than the cutoff are binned
+      by geometric size classes instead, and cached blocks much larger than
+      the requested size may be left unsplit.
+    - Free blocks are cached for each stream. If the cross-stream reuse is
+      enabled by :meth:`set_cross_stream_reuse`, a block freed on a stream
+      can also be used by the other streams after the event recorded when it
+      is freed.
+    - If a trim policy is set by :meth:`set_trim_policy`, free blocks that
+      are not split and have not been reused for a while, or that exceed a
+      high-water mark, are released on :meth:`trim`, which is also called
+      periodically from the allocation and the deallocation.
+
+    Args:
+        allocator (function): The base CuPy memory allocator. It is used for
+            allocating new blocks when the blocks of the required size are all
+            in use.
+        device_id (int): ID of the device of the pool. If ``None``, the
+            current device is used. A pool with an allocator not using the
+            device, e.g., in simulations, can be created without a GPU by
+            giving it explicitly.
+
     """
 
-    def __init__(self, allocator=_malloc):
+    def __init__(self, allocator=_malloc, device_id=None):
         # cudaMalloc() is aligned to at least 512 bytes
         # cf. https://gist.github.com/sonots/41daaa6432b1c8b27ef782cd14064269
         self._allocation_unit_size = 512
@@ -607,9 +701,49 @@ cdef class SingleDeviceMemoryPool:
         self._free = {}
         self._allocator = allocator
         self._weakref = weakref.ref(self)
-        self._device_id = device.get_device_id()
+        if device_id is None:
+            device_id = device.get_device_id()
+        self._device_id = device_id
         self._free_lock = rlock.create_fastrlock()
         self._in_use_lock = rlock.create_fastrlock()
+        self._total_bytes_lock = rlock.create_fastrlock()
+        self._total_bytes = 0
+        self._total_bytes_limit = 0
+        self._peak_total_bytes = 0
+        self._peak_used_bytes = 0
+        self._n_mallocs = 0
+        self._n_frees = 0
+        self._slab_size = 0
+        self._slab_threshold = 0
+        self._bin_cutoff = 0
+        self._n_size_classes = 4
+        self._max_oversize = 0
+        self._cross_stream_mode = _CROSS_STREAM_DISABLED
+        self._n_cross_stream_reuses = 0
+        self._cross_stream_reused_bytes = 0
+        self._trim_clock = None
+        self._trim_idle_time = 0
+        self._trim_high_water = 0
+        self._trim_interval = 0
+        self._next_trim_time = 0
+        self._n_trimmed = 0
+        self._trimmed_bytes = 0
+        self._allocation_stats_enabled = False
+        memset(&self._allocation_stats, 0, sizeof(_AllocationStats))
+        self._set_limit_from_env()
+
+    def _set_limit_from_env(self):
+        limit = os.environ.get('CUPY_GPU_MEMORY_LIMIT')
+        if not limit:
+            return
+        try:
+            if limit.endswith('%'):
+                self.set_limit(fraction=float(limit[:-1]) / 100)
+            else:
+                self.set_limit(size=int(limit))
+        except ValueError:
+            raise ValueError(
+                'invalid CUPY_GPU_MEMORY_LIMIT: {}'.format(limit))
 
     cpdef Py_ssize_t _round_size(self, Py_ssize_t size):
         """Round up the memory size to fit memory alignment of cudaMalloc."""
@@ -618,8 +752,26 @@ cdef class SingleDeviceMemoryPool:
 
     cpdef int _bin_index_from_size(self, Py_ssize_t size):
         """Get appropriate bins index from the memory size"""
+        cdef Py_ssize_t base
+        cdef int exponent = 0
         unit = self._allocation_unit_size
-        return (size - 1) // unit
+        if self._bin_cutoff == 0 or size <= self._bin_cutoff:
+            return (size - 1) // unit
+        # Geometric bins of n_size_classes classes per doubling of the size
+        # follow the linear bins up to the cutoff.
+        base = self._bin_cutoff
+        while size - 1 >= base * 2:
+            base *= 2
+            exponent += 1
+        return (self._bin_cutoff // unit + exponent * self._n_size_classes +
+                (size - 1 - base) * self._n_size_classes // base)
+
+    cdef int _max_bin_index(self, Py_ssize_t size):
+        """Get the largest bins index of blocks split for the memory size"""
+        if self._max_oversize == 0:
+            return INT_MAX
+        return self._bin_index_from_size(
+            <Py_ssize_t>(max(size, self._bin_cutoff) * self._max_oversize))
 
     cpdef list _arena(self, size_t stream_ptr):
         """Get appropriate arena (list of bins) of a given stream"""
@@ -633,7 +785,7 @@ cdef class SingleDeviceMemoryPool:
 
     cpdef _append_to_free_list(self, Py_ssize_t size, chunk,
                                size_t stream_ptr):
-        cdef int index, bin_index
+        cdef int index, bin_index, length
         cdef list arena
         cdef set free_list
         cdef vector.vector[int]* arena_index
@@ -646,8 +798,8 @@ cdef class SingleDeviceMemoryPool:
             index = algorithm.lower_bound(
                 arena_index.begin(), arena_index.end(),
                 bin_index) - arena_index.begin()
-            size = <int>arena_index.size()
-            if index < size and arena_index.at(index) == bin_index:
+            length = <int>arena_index.size()
+            if index < length and arena_index.at(index) == bin_index:
                 free_list = arena[index]
                 if free_list is None:
                     arena[index] = free_list = set()
@@ -656,6 +808,7 @@ cdef class SingleDeviceMemoryPool:
                 arena_index.insert(arena_index.begin() + index, bin_index)
                 arena.insert(index, free_list)
             free_list.add(chunk)
+            self._count_free(stream_ptr, size, 1)
         finally:
             rlock.unlock_fastrlock(self._free_lock)
 
@@ -676,13 +829,15 @@ cdef class SingleDeviceMemoryPool:
             index = algorithm.lower_bound(
                 arena_index.begin(), arena_index.end(),
                 bin_index) - arena_index.begin()
-            if arena_index.at(index) != bin_index:
+            if (index == <int>arena_index.size() or
+                    arena_index.at(index) != bin_index):
                 return False
             free_list = arena[index]
             if free_list and chunk in free_list:
                 free_list.remove(chunk)
                 if len(free_list) == 0:
                     arena[index] = None
+                self._count_free(stream_ptr, -size, -1)
                 return True
         finally:
             rlock.unlock_fastrlock(self._free_lock)
@@ -740,47 +895,170 @@ cdef class SingleDeviceMemoryPool:
             return self._malloc(rounded_size)
 
     cpdef MemoryPointer _malloc(self, Py_ssize_t size):
-        cdef set free_list
         cdef _Chunk chunk = None
         cdef _Chunk remaining
-        cdef int bin_index, index, length
+        cdef int bin_index, max_bin_index
+        cdef bint exact_bins, hit
+        cdef long long start = 0
 
         if size == 0:
             return MemoryPointer(Memory(0), 0)
+        if self._allocation_stats_enabled:
+            start = cupy_clock_ns()
 
         stream_ptr = stream_module.get_current_stream_ptr()
 
         bin_index = self._bin_index_from_size(size)
-        # find best-fit, or a smallest larger allocation
+        max_bin_index = self._max_bin_index(size)
+        exact_bins = self._bin_cutoff == 0 or size <= self._bin_cutoff
         rlock.lock_fastrlock(self._free_lock, -1, True)
         try:
-            arena = self._arena(stream_ptr)
-            arena_index = self._arena_index(stream_ptr)
-            index = algorithm.lower_bound(
-                arena_index.begin(), arena_index.end(),
-                bin_index) - arena_index.begin()
-            length = arena_index.size()
-            for i in range(index, length):
-                free_list = arena[i]
-                if free_list is None:
-                    continue
-                assert len(free_list) > 0
-                chunk = free_list.pop()
-                if len(free_list) == 0:
-                    arena[i] = None
-                if i - index >= _index_compaction_threshold:
-                    _compact_index(self, stream_ptr, False)
-                break
+            chunk = self._pop_free_chunk(
+                stream_ptr, size, bin_index, max_bin_index, exact_bins, 0)
+            if chunk is None and self._cross_stream_mode != 0:
+                for other_stream_ptr in list(self._free):
+                    if other_stream_ptr == stream_ptr:
+                        continue
+                    chunk = self._pop_free_chunk(
+                        other_stream_ptr, size, bin_index, max_bin_index,
+                        False, self._cross_stream_mode)
+                    if chunk is not None:
+                        break
         finally:
             rlock.unlock_fastrlock(self._free_lock)
 
-        if chunk is not None:
-            remaining = chunk.split(size)
-            if remaining is not None:
-                self._append_to_free_list(remaining.size, remaining,
-                                          stream_ptr)
-        else:
+        if chunk is not None and chunk.stream_ptr != stream_ptr:
+            # The work on the other stream using the chunk may be still
+            # running.
+            if runtime.eventQuery(chunk.event.ptr) != 0:
+                runtime.streamWaitEvent(stream_ptr, chunk.event.ptr)
+            chunk.stream_ptr = stream_ptr
+            self._n_cross_stream_reuses += 1
+            self._cross_stream_reused_bytes += chunk.size
+
+        hit = chunk is not None
+        if not hit:
+            if self._trim_clock is not None:
+                self._maybe_trim()
             # cudaMalloc if a cache is not found
+            alloc_size = size
+            if size < self._slab_threshold:
+                alloc_size = self._slab_size
+            try:
+                mem = self._try_malloc(alloc_size)
+            except OutOfMemoryError:
+                if alloc_size == size:
+                    raise
+                # The slab does not fit; allocate the exact size instead.
+                alloc_size = size
+                mem = self._try_malloc(size)
+            chunk = _Chunk.__new__(_Chunk)
+            chunk._init(mem, 0, alloc_size, stream_ptr)
+
+        remaining = chunk.split(size)
+        if remaining is not None:
+            if self._trim_clock is not None:
+                remaining.free_time = self._trim_clock()
+            self._append_to_free_list(remaining.size, remaining, stream_ptr)
+
+        assert chunk.stream_ptr == stream_ptr
+        rlock.lock_fastrlock(self._in_use_lock, -1, True)
+        try:
+            self._in_use[chunk.ptr] = chunk
+            self._count_in_use(stream_ptr, size, 1)
+        finally:
+            rlock.unlock_fastrlock(self._in_use_lock)
+        pmem = PooledMemory(chunk, self._weakref)
+        if start != 0:
+            self._record_malloc(size, hit, start)
+        return MemoryPointer(pmem, 0)
+
+    cdef _record_malloc(self, Py_ssize_t size, bint hit, long long start):
+        cdef int size_class = _bit_length(size) - 1
+        cdef int latency_bin = _bit_length(cupy_clock_ns() - start)
+        cdef _AllocationStats* stats = &self._allocation_stats
+        stats.mallocs[size_class] += 1
+        stats.malloc_bytes[size_class] += size
+        if hit:
+            stats.hits[size_class] += 1
+        stats.malloc_latency[
+            min(latency_bin, _N_STATS_LATENCY_BINS - 1)] += 1
+
+    cdef _record_free(self, Py_ssize_t size, long long start):
+        cdef int size_class = _bit_length(size) - 1
+        cdef int latency_bin = _bit_length(cupy_clock_ns() - start)
+        cdef _AllocationStats* stats = &self._allocation_stats
+        stats.frees[size_class] += 1
+        stats.free_latency[min(latency_bin, _N_STATS_LATENCY_BINS - 1)] += 1
+
+    cdef _Chunk _pop_free_chunk(self, size_t stream_ptr, Py_ssize_t size,
+                                int bin_index, int max_bin_index,
+                                bint exact_bins, int cross_stream_mode):
+        """Find best-fit, or a smallest larger free chunk of an arena.
+
+        If ``cross_stream_mode`` is not zero, only the chunks with an event are
+        taken, and if it is ``_CROSS_STREAM_READY``, the event must be done.
+        """
+        # need self._free_lock
+        cdef set free_list
+        cdef _Chunk chunk
+        cdef list arena = self._arena(stream_ptr)
+        cdef vector.vector[int]* arena_index = self._arena_index(stream_ptr)
+        cdef int i, index, length
+
+        index = algorithm.lower_bound(
+            arena_index.begin(), arena_index.end(),
+            bin_index) - arena_index.begin()
+        length = arena_index.size()
+        for i in range(index, length):
+            if arena_index.at(i) > max_bin_index:
+                break
+            free_list = arena[i]
+            if free_list is None:
+                continue
+            assert len(free_list) > 0
+            if exact_bins or arena_index.at(i) != bin_index:
+                if cross_stream_mode == 0:
+                    chunk = free_list.pop()
+                else:
+                    for chunk in free_list:
+                        if _is_reusable(chunk, cross_stream_mode):
+                            break
+                    else:
+                        continue
+                    free_list.remove(chunk)
+            else:
+                # A geometric bin also holds smaller blocks.
+                for chunk in free_list:
+                    if chunk.size >= size and (
+                            cross_stream_mode == 0 or
+                            _is_reusable(chunk, cross_stream_mode)):
+                        break
+                else:
+                    continue
+                free_list.remove(chunk)
+            if len(free_list) == 0:
+                arena[i] = None
+            self._count_free(stream_ptr, -chunk.size, -1)
+            if i - index >= _index_compaction_threshold:
+                _compact_index(self, stream_ptr, False)
+            return chunk
+        return None
+
+    cdef Memory _try_malloc(self, Py_ssize_t size):
+        if not self._reserve_bytes(size):
+            # Release the cached blocks before giving up on the limit.
+            self.free_all_blocks()
+            if not self._reserve_bytes(size):
+                gc.collect()
+                self.free_all_blocks()
+                if not self._reserve_bytes(size):
+                    raise OutOfMemoryError(
+                        size, size + self._total_bytes,
+                        self._total_bytes_limit)
+
+        mem = None
+        try:
             try:
                 mem = self._alloc(size).mem
             except runtime.CUDARuntimeError as e:
@@ -800,26 +1078,69 @@ cdef class SingleDeviceMemoryPool:
                             raise
                         else:
                             total = size + self.total_bytes()
-                            raise OutOfMemoryError(size, total)
-            chunk = _Chunk.__new__(_Chunk)
-            chunk._init(mem, 0, size, stream_ptr)
+                            raise OutOfMemoryError(
+                                size, total, self._total_bytes_limit)
+        finally:
+            if mem is None:
+                self._release_bytes(size)
+        self._n_mallocs += 1
+        return mem
 
-        assert chunk.stream_ptr == stream_ptr
-        rlock.lock_fastrlock(self._in_use_lock, -1, True)
+    cdef bint _reserve_bytes(self, Py_ssize_t size) except *:
+        rlock.lock_fastrlock(self._total_bytes_lock, -1, True)
         try:
-            self._in_use[chunk.ptr] = chunk
+            if (self._total_bytes_limit != 0 and
+                    self._total_bytes + size > self._total_bytes_limit):
+                return False
+            self._total_bytes += size
+            if self._total_bytes > self._peak_total_bytes:
+                self._peak_total_bytes = self._total_bytes
+            return True
         finally:
-            rlock.unlock_fastrlock(self._in_use_lock)
-        pmem = PooledMemory(chunk, self._weakref)
-        return MemoryPointer(pmem, 0)
+            rlock.unlock_fastrlock(self._total_bytes_lock)
+
+    cdef _release_bytes(self, Py_ssize_t size):
+        rlock.lock_fastrlock(self._total_bytes_lock, -1, True)
+        try:
+            self._total_bytes -= size
+        finally:
+            rlock.unlock_fastrlock(self._total_bytes_lock)
+
+    cdef _count_in_use(self, size_t stream_ptr, Py_ssize_t size, int n):
+        # need self._in_use_lock
+        cdef _Counter* counter = &self._in_use_stats[stream_ptr]
+        counter.bytes += size
+        counter.blocks += n
+        if counter.blocks == 0:
+            self._in_use_stats.erase(stream_ptr)
+        self._in_use_total.bytes += size
+        self._in_use_total.blocks += n
+        if self._in_use_total.bytes > self._peak_used_bytes:
+            self._peak_used_bytes = self._in_use_total.bytes
+
+    cdef _count_free(self, size_t stream_ptr, Py_ssize_t size, int n):
+        # need self._free_lock
+        cdef _Counter* counter = &self._free_stats[stream_ptr]
+        counter.bytes += size
+        counter.blocks += n
+        self._free_total.bytes += size
+        self._free_total.blocks += n
+
+    cdef _maybe_trim(self):
+        if self._trim_clock() >= self._next_trim_time:
+            self.trim()
 
     cpdef free(self, size_t ptr, Py_ssize_t size):
         cdef set free_list
         cdef _Chunk chunk
+        cdef long long start = 0
 
+        if self._allocation_stats_enabled:
+            start = cupy_clock_ns()
         rlock.lock_fastrlock(self._in_use_lock, -1, True)
         try:
             chunk = self._in_use.pop(ptr)
+            self._count_in_use(chunk.stream_ptr, -chunk.size, -1)
         except KeyError:
             raise RuntimeError('Cannot free out-of-pool memory')
         finally:
@@ -837,7 +1158,20 @@ cdef class SingleDeviceMemoryPool:
                 chunk = chunk.prev
                 chunk.merge(chunk.next)
 
-        self._append_to_free_list(chunk.size, chunk, stream_ptr)
+        if self._cross_stream_mode != 0:
+            # Do not record the current event again, which may be shared
+            # with the blocks split from the same block on other streams.
+            chunk.event = stream_module.Event(disable_timing=True)
+            runtime.eventRecord(chunk.event.ptr, stream_ptr)
+
+        if self._trim_clock is not None:
+            chunk.free_time = self._trim_clock()
+            self._append_to_free_list(chunk.size, chunk, stream_ptr)
+            self._maybe_trim()
+        else:
+            self._append_to_free_list(chunk.size, chunk, stream_ptr)
+        if start != 0:
+            self._record_free(size, start)
 
     cpdef free_all_blocks(self, stream=None):
         """Free all **non-split** chunks"""
@@ -861,47 +1195,265 @@ cdef class SingleDeviceMemoryPool:
         self.free_all_blocks()
 
     cpdef n_free_blocks(self):
-        cdef Py_ssize_t n = 0
-        cdef set free_list
+        return self._free_total.blocks
+
+    cpdef used_bytes(self):
+        return self._in_use_total.bytes
+
+    cpdef free_bytes(self):
+        return self._free_total.bytes
+
+    cpdef total_bytes(self):
+        return self.used_bytes() + self.free_bytes()
+
+    cpdef dict get_stats(self):
+        cdef dict streams = {}
+        cdef pair[size_t, _Counter] item
+        cdef dict stats
+
+        stats = {}
+        rlock.lock_fastrlock(self._in_use_lock, -1, True)
+        try:
+            stats['used_bytes'] = self._in_use_total.bytes
+            stats['used_blocks'] = self._in_use_total.blocks
+            stats['peak_used_bytes'] = self._peak_used_bytes
+            for item in self._in_use_stats:
+                streams[item.first] = {
+                    'used_bytes': item.second.bytes,
+                    'used_blocks': item.second.blocks,
+                    'free_bytes': 0,
+                    'free_blocks': 0,
+                }
+        finally:
+            rlock.unlock_fastrlock(self._in_use_lock)
         rlock.lock_fastrlock(self._free_lock, -1, True)
         try:
-            for arena in self._free.itervalues():
-                for v in arena:
-                    if v is not None:
-                        n += len(v)
+            stats['free_bytes'] = self._free_total.bytes
+            stats['free_blocks'] = self._free_total.blocks
+            for item in self._free_stats:
+                if item.second.blocks == 0:
+                    continue
+                if item.first not in streams:
+                    streams[item.first] = {
+                        'used_bytes': 0,
+                        'used_blocks': 0,
+                    }
+                streams[item.first]['free_bytes'] = item.second.bytes
+                streams[item.first]['free_blocks'] = item.second.blocks
         finally:
             rlock.unlock_fastrlock(self._free_lock)
-        return n
+        rlock.lock_fastrlock(self._total_bytes_lock, -1, True)
+        try:
+            stats['peak_total_bytes'] = self._peak_total_bytes
+            stats['limit'] = self._total_bytes_limit
+            stats['n_mallocs'] = self._n_mallocs
+            stats['n_frees'] = self._n_frees
+            stats['cross_stream_reuses'] = self._n_cross_stream_reuses
+            stats['cross_stream_reused_bytes'] = \
+                self._cross_stream_reused_bytes
+            stats['trimmed_blocks'] = self._n_trimmed
+            stats['trimmed_bytes'] = self._trimmed_bytes
+        finally:
+            rlock.unlock_fastrlock(self._total_bytes_lock)
+        stats['total_bytes'] = stats['used_bytes'] + stats['free_bytes']
+        stats['streams'] = streams
+        return stats
 
-    cpdef used_bytes(self):
-        cdef Py_ssize_t size = 0
-        cdef _Chunk chunk
-        rlock.lock_fastrlock(self._in_use_lock, -1, True)
+    cpdef set_allocation_stats(self, bint enabled=True):
+        self._allocation_stats_enabled = enabled
+
+    cpdef dict get_allocation_stats(self, bint reset=False):
+        cdef _AllocationStats* stats = &self._allocation_stats
+        cdef dict size_classes = {}
+        cdef int i
+
+        for i in range(_N_STATS_SIZE_CLASSES):
+            if stats.mallocs[i] == 0 and stats.frees[i] == 0:
+                continue
+            size_classes[1 << i] = {
+                'mallocs': stats.mallocs[i],
+                'malloc_bytes': stats.malloc_bytes[i],
+                'hits': stats.hits[i],
+                'misses': stats.mallocs[i] - stats.hits[i],
+                'frees': stats.frees[i],
+            }
+        snapshot = {
+            'enabled': self._allocation_stats_enabled,
+            'size_classes': size_classes,
+            'malloc_latency': _histogram(
+                stats.malloc_latency, _N_STATS_LATENCY_BINS, False),
+            'free_latency': _histogram(
+                stats.free_latency, _N_STATS_LATENCY_BINS, False),
+        }
+        if reset:
+            memset(stats, 0, sizeof(_AllocationStats))
+        return snapshot
+
+    cpdef set_limit(self, size=None, fraction=None):
+        if size is None:
+            if fraction is None:
+                size = 0
+            else:
+                if not 0 <= fraction <= 1:
+                    raise ValueError(
+                        'memory limit fraction out of range: {}'.format(
+                            fraction))
+                with device.Device(self._device_id):
+                    _, total = runtime.memGetInfo()
+                size = int(fraction * total)
+        elif fraction is not None:
+            raise ValueError(
+                'size and fraction cannot be specified at one time')
+        if size < 0:
+            raise ValueError(
+                'memory limit size out of range: {}'.format(size))
+        rlock.lock_fastrlock(self._total_bytes_lock, -1, True)
         try:
-            for chunk in self._in_use.itervalues():
-                size += chunk.size
+            self._total_bytes_limit = size
         finally:
-            rlock.unlock_fastrlock(self._in_use_lock)
-        return size
+            rlock.unlock_fastrlock(self._total_bytes_lock)
 
-    cpdef free_bytes(self):
-        cdef Py_ssize_t size = 0
+    cpdef size_t get_limit(self):
+        return self._total_bytes_limit
+
+    cpdef set_size_classes(self, Py_ssize_t cutoff=0, int n_classes=4,
+                           double max_oversize=0):
+        cdef list chunks = []
+        cdef size_t stream_ptr
+
+        if cutoff < 0:
+            raise ValueError('cutoff out of range: {}'.format(cutoff))
+        if n_classes < 1:
+            raise ValueError(
+                'number of size classes out of range: {}'.format(n_classes))
+        if max_oversize != 0 and max_oversize < 1:
+            raise ValueError(
+                'max_oversize out of range: {}'.format(max_oversize))
+        rlock.lock_fastrlock(self._free_lock, -1, True)
+        try:
+            # The free blocks are binned again by the new size classes.
+            for stream_ptr, arena in self._free.items():
+                for free_list in arena:
+                    if free_list:
+                        chunks.extend([(stream_ptr, chunk)
+                                       for chunk in free_list])
+            self._free.clear()
+            self._index.clear()
+            self._free_stats.clear()
+            self._free_total.bytes = 0
+            self._free_total.blocks = 0
+            self._bin_cutoff = self._round_size(cutoff)
+            self._n_size_classes = n_classes
+            self._max_oversize = max_oversize
+            for stream_ptr, chunk in chunks:
+                self._append_to_free_list(chunk.size, chunk, stream_ptr)
+        finally:
+            rlock.unlock_fastrlock(self._free_lock)
+
+    cpdef set_cross_stream_reuse(self, bint enabled=True, bint wait=True):
+        if not enabled:
+            self._cross_stream_mode = _CROSS_STREAM_DISABLED
+        elif wait:
+            self._cross_stream_mode = _CROSS_STREAM_WAIT
+        else:
+            self._cross_stream_mode = _CROSS_STREAM_READY
+
+    cpdef set_trim_policy(self, double idle_time=0, Py_ssize_t high_water=0,
+                          double interval=1.0, clock=None):
+        cdef _Chunk chunk
         cdef set free_list
+
+        if idle_time < 0:
+            raise ValueError('idle time out of range: {}'.format(idle_time))
+        if high_water < 0:
+            raise ValueError(
+                'high-water mark out of range: {}'.format(high_water))
+        if interval < 0:
+            raise ValueError('interval out of range: {}'.format(interval))
+        if clock is None:
+            clock = _monotonic
+        rlock.lock_fastrlock(self._free_lock, -1, True)
+        try:
+            if idle_time == 0 and high_water == 0:
+                self._trim_clock = None
+                return
+            if self._trim_clock is None:
+                # The blocks freed before are regarded as freed now.
+                now = clock()
+                for arena in self._free.itervalues():
+                    for free_list in arena:
+                        if free_list is None:
+                            continue
+                        for chunk in free_list:
+                            chunk.free_time = now
+            self._trim_clock = clock
+            self._trim_idle_time = idle_time
+            self._trim_high_water = high_water
+            self._trim_interval = interval
+            self._next_trim_time = clock() + interval
+        finally:
+            rlock.unlock_fastrlock(self._free_lock)
+
+    cpdef Py_ssize_t trim(self) except -1:
         cdef _Chunk chunk
+        cdef set free_list
+        cdef list candidates = []
+        cdef list streams = []
+        cdef Py_ssize_t excess = 0, released = 0
+        cdef int n_released = 0
+        cdef size_t stream_ptr
+
+        if self._trim_clock is None:
+            return 0
+        now = self._trim_clock()
         rlock.lock_fastrlock(self._free_lock, -1, True)
         try:
-            for arena in self._free.itervalues():
+            self._next_trim_time = now + self._trim_interval
+            for stream_ptr, arena in self._free.items():
                 for free_list in arena:
                     if free_list is None:
                         continue
                     for chunk in free_list:
-                        size += chunk.size
+                        if chunk.prev is None and chunk.next is None:
+                            candidates.append((chunk.free_time, stream_ptr,
+                                               chunk))
+            # The least recently freed blocks are released first.
+            candidates.sort(key=_first)
+            if self._trim_high_water != 0:
+                excess = self._total_bytes - self._trim_high_water
+            deadline = now - self._trim_idle_time
+            for free_time, stream_ptr, chunk in candidates:
+                if excess <= 0 and (self._trim_idle_time == 0 or
+                                    free_time > deadline):
+                    break
+                self._remove_from_free_list(chunk.size, chunk, stream_ptr)
+                excess -= chunk.size
+                released += chunk.size
+                n_released += 1
+                if stream_ptr not in streams:
+                    streams.append(stream_ptr)
+            for stream_ptr in streams:
+                _compact_index(self, stream_ptr, False)
+            if n_released:
+                self._n_frees += n_released
+                self._n_trimmed += n_released
+                self._trimmed_bytes += released
+                self._release_bytes(released)
         finally:
             rlock.unlock_fastrlock(self._free_lock)
-        return size
+        return released
 
-    cpdef total_bytes(self):
-        return self.used_bytes() + self.free_bytes()
+    cpdef set_slab_size(self, Py_ssize_t size, threshold=None):
+        if size < 0:
+            raise ValueError('slab size out of range: {}'.format(size))
+        size = self._round_size(size)
+        if threshold is None:
+            threshold = size // 2
+        elif not 0 <= threshold <= size:
+            raise ValueError(
+                'slab threshold out of range: {}'.format(threshold))
+        self._slab_size = size
+        self._slab_threshold = threshold if size != 0 else 0
 
 
 cdef class MemoryPool(object):
@@ -1012,3 +1564,412 @@ cdef class MemoryPool(object):
         """
         mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
         return mp.total_bytes()
+
+    cpdef dict get_stats(self):
+        """Get a snapshot of the statistics of the current device.
+
+        The statistics are maintained incrementally by the pool, so taking a
+        snapshot does not scan the blocks and is cheap enough to be polled
+        frequently.
+
+        Returns:
+            dict: A dictionary with the following keys.
+
+            - ``used_bytes``, ``used_blocks``: Bytes and the number of blocks
+              in use.
+            - ``free_bytes``, ``free_blocks``: Bytes and the number of free
+              blocks held by the pool.
+            - ``total_bytes``: The sum of ``used_bytes`` and ``free_bytes``.
+            - ``peak_used_bytes``, ``peak_total_bytes``: The maximum values
+              of used bytes and bytes acquired from the allocator.
+            - ``n_mallocs``, ``n_frees``: The number of blocks acquired from
+              and released to the allocator.
+            - ``cross_stream_reuses``, ``cross_stream_reused_bytes``: The
+              number and the total bytes of the free blocks of other streams
+              reused by :meth:`set_cross_stream_reuse` instead of allocating
+              new blocks.
+            - ``trimmed_blocks``, ``trimmed_bytes``: The number and the total
+              bytes of the blocks released by :meth:`trim`.
+            - ``limit``: The limit set by :meth:`set_limit`.
+            - ``streams``: A dictionary mapping each raw stream pointer to a
+              dictionary of ``used_bytes``, ``used_blocks``, ``free_bytes``
+              and ``free_blocks`` of the stream arena.
+        """
+        mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
+        return mp.get_stats()
+
+    cpdef set_allocation_stats(self, bint enabled=True):
+        """Enables or disables the allocation statistics of the current device.
+
+        The allocation statistics are aggregated by the pool in C without
+        calling Python functions, so they are cheap enough to be left
+        enabled unlike :class:`~cupy.cuda.MemoryHook`. Use
+        :meth:`get_allocation_stats` to read them.
+
+        Args:
+            enabled (bool): Whether the allocation statistics are collected.
+        """
+        mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
+        mp.set_allocation_stats(enabled)
+
+    cpdef dict get_allocation_stats(self, bint reset=False):
+        """Get a snapshot of the allocation statistics of the current device.
+
+        Allocations and deallocations are counted while the statistics are
+        enabled by :meth:`set_allocation_stats`. Sizes are binned into
+        power-of-two size classes, and latencies of the pool in nanoseconds
+        are binned into power-of-two bins.
+
+        Args:
+            reset (bool): If ``True``, the statistics are cleared after the
+                snapshot is taken.
+
+        Returns:
+            dict: A dictionary with the following keys.
+
+            - ``enabled``: Whether the statistics are collected.
+            - ``size_classes``: A dictionary mapping the lower bound of each
+              size class in bytes to a dictionary of ``mallocs``,
+              ``malloc_bytes``, ``hits`` (allocations served by cached
+              blocks), ``misses`` (allocations that call the allocator) and
+              ``frees``. Sizes are rounded up to the allocation unit.
+            - ``malloc_latency``, ``free_latency``: Dictionaries mapping the
+              lower bound of each latency bin in nanoseconds to the number
+              of calls.
+        """
+        mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
+        return mp.get_allocation_stats(reset)
+
+    cpdef set_limit(self, size=None, fraction=None):
+        """Sets the upper limit of memory allocation of the current device.
+
+        When ``fraction`` is specified, its value will become a fraction of
+        the amount of GPU memory that is available for allocation.
+        For example, if you have a GPU with 2 GiB memory, you can either use
+        ``set_limit(fraction=0.5)`` or ``set_limit(size=1024**3)`` to limit
+        the memory size to 1 GiB.
+
+        ``size`` and ``fraction`` cannot be specified at one time.
+        If both of them are **not** specified or ``0`` is specified, the
+        limit will be disabled.
+
+        When an allocation would exceed the limit, the pool first releases
+        the free blocks which are not split, and then raises
+        :class:`~cupy.cuda.memory.OutOfMemoryError` without calling the
+        allocator if the limit is still exceeded.
+
+        .. note::
+            You can also set the limit by using ``CUPY_GPU_MEMORY_LIMIT``
+            environment variable.
+            See :ref:`environment` for the details.
+            The limit set by this method supersedes the value specified in
+            the environment variable.
+
+            Also note that this method only changes the limit for the current
+            device, whereas the environment variable sets the default limit
+            for all devices.
+
+        Args:
+            size (int): Limit size in bytes.
+            fraction (float): Fraction in the range of ``[0, 1]``.
+        """
+        mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
+        mp.set_limit(size, fraction)
+
+    cpdef size_t get_limit(self):
+        """Gets the upper limit of memory allocation of the current device.
+
+        Returns:
+            int: The number of bytes. ``0`` means no limit is set.
+        """
+        mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
+        return mp.get_limit()
+
+    cpdef set_slab_size(self, Py_ssize_t size, threshold=None):
+        """Sets the slab size for small allocations of the current device.
+
+        By default, each allocation that cannot be served from the free
+        blocks calls the allocator with the requested size. When the slab
+        size is set, such a request smaller than ``threshold`` instead
+        allocates a block of ``size`` bytes, and the rest of the block is
+        kept in the pool to serve the following small requests. This reduces
+        the number of synchronizing ``cudaMalloc`` calls and the
+        fragmentation caused by many small temporary arrays of varying
+        sizes. Larger requests are not affected.
+
+        A slab is returned to the allocator by :meth:`free_all_blocks` only
+        after all the blocks carved from it are freed.
+
+        Args:
+            size (int): Slab size in bytes. ``0`` disables the slab
+                allocation.
+            threshold (int): Requests smaller than this size in bytes are
+                served from slabs. The default is the half of ``size``.
+        """
+        mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
+        mp.set_slab_size(size, threshold)
+
+    cpdef set_cross_stream_reuse(self, bint enabled=True, bint wait=True):
+        """Enables the reuse of free blocks across streams.
+
+        The pool caches free blocks for each stream, and by default a block
+        freed on a stream is reused only for allocations on the same stream.
+        When the cross-stream reuse is enabled, an event is recorded on the
+        stream when a block is freed, and an allocation that cannot be
+        served from the blocks of its own stream may take a block of another
+        stream. If the event of the block is not done yet, the current stream
+        waits for the event before using the block. It avoids holding a copy
+        of the working set for each stream at the cost of creating and
+        recording an event on each free.
+
+        The blocks freed before the cross-stream reuse is enabled are not
+        reused across streams.
+
+        Args:
+            enabled (bool): If ``False``, the cross-stream reuse is disabled.
+            wait (bool): If ``False``, only the blocks whose events are done
+                are reused, so the streams never wait for each other.
+
+        .. seealso:: :meth:`get_stats` for the amount of reused memory.
+        """
+        mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
+        mp.set_cross_stream_reuse(enabled, wait)
+
+    cpdef set_trim_policy(self, double idle_time=0, Py_ssize_t high_water=0,
+                          double interval=1.0, clock=None):
+        """Sets the policy to release cached blocks of the current device.
+
+        The memory pool holds the freed blocks until :meth:`free_all_blocks`
+        is called, so a long-running process keeps the memory of its peak
+        usage. With a trim policy, :meth:`trim` releases the free blocks that
+        are not split and satisfy either of the following conditions.
+
+        - The block has not been reused for ``idle_time`` seconds.
+        - The total bytes acquired by the pool exceed ``high_water``. The
+          least recently freed blocks are released first until the total
+          bytes go below the mark.
+
+        :meth:`trim` is also called from the allocation and the deallocation
+        at most once every ``interval`` seconds. Note that releasing blocks
+        may synchronize the device.
+
+        Args:
+            idle_time (float): Idle time in seconds. ``0`` disables the
+                release of idle blocks.
+            high_water (int): High-water mark in bytes. ``0`` disables the
+                mark.
+            interval (float): The minimum interval in seconds between the
+                calls of :meth:`trim` from the allocation and the
+                deallocation.
+            clock (callable): A function returning the current time in
+                seconds. :func:`time.monotonic` is used by default.
+
+        .. seealso:: :meth:`get_stats` for the amount of released memory.
+        """
+        mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
+        mp.set_trim_policy(idle_time, high_water, interval, clock)
+
+    cpdef Py_ssize_t trim(self) except -1:
+        """Releases free blocks of the current device by the trim policy.
+
+        Returns:
+            int: The number of bytes released.
+
+        .. seealso:: :meth:`set_trim_policy`
+        """
+        mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
+        return mp.trim()
+
+    cpdef set_size_classes(self, Py_ssize_t cutoff=0, int n_classes=4,
+                           double max_oversize=0):
+        """Sets the size classes of free blocks of the current device.
+
+        Free blocks are kept in bins of size classes, and an allocation takes
+        a block from the smallest nonempty bin that fits the requested size,
+        splitting it if it is larger. By default, each size class is a
+        multiple of 512 bytes. When ``cutoff`` is set, blocks larger than
+        ``cutoff`` bytes are binned by geometric size classes, where
+        ``n_classes`` classes divide each doubling of the size. This keeps
+        the number of bins small for a large variety of sizes.
+
+        When ``max_oversize`` is set, a cached block is not used for a
+        request of ``size`` bytes if it is larger than
+        ``max(size, cutoff) * max_oversize`` bytes (rounded up to its size
+        class). The allocator is called instead, which prevents a huge cached
+        block from being split for a small request and fragmented for a long
+        time.
+
+        Args:
+            cutoff (int): The largest size in bytes of the 512-byte size
+                classes. ``0`` disables the geometric size classes.
+            n_classes (int): The number of geometric size classes for each
+                doubling of the size.
+            max_oversize (float): The maximum ratio of the size of a block to
+                be split to the requested size. ``0`` removes the bound.
+        """
+        mp = <SingleDeviceMemoryPool>self._pools[device.get_device_id()]
+        mp.set_size_classes(cutoff, n_classes, max_oversize)
+
+
+cdef class _ScopedRegion:
+
+    # A region of memory taken from the parent allocator of a scoped pool.
+    # Allocations are carved from the head of the unused part. The region
+    # is returned to the parent when it is no longer current and the last
+    # allocation from it is freed.
+
+    cdef:
+        MemoryPointer buf
+        _ScopedPool pool
+        size_t stream_ptr
+        Py_ssize_t offset
+        Py_ssize_t size
+        Py_ssize_t n_live
+
+
+cdef class _ScopedMemory(Memory):
+
+    """Memory allocation from a region of a scoped pool."""
+
+    cdef:
+        _ScopedRegion region
+
+    def __dealloc__(self):
+        cdef _ScopedRegion region = self.region
+        # The memory belongs to the region.
+        self.ptr = 0
+        if region is None:
+            return
+        region.n_live -= 1
+        region.pool._n_live -= 1
+        if region.n_live == 0:
+            # The whole region can be reused as no allocation refers to it.
+            region.offset = 0
+
+
+cdef class _ScopedPool:
+
+    cdef:
+        object _parent
+        dict _regions
+        Py_ssize_t _region_size
+        Py_ssize_t _max_size
+        long _thread_id
+        bint _active
+        readonly Py_ssize_t _n_live
+        readonly Py_ssize_t _n_regions
+
+    def __init__(self, Py_ssize_t region_size, max_size):
+        if region_size <= 0:
+            raise ValueError(
+                'region size out of range: {}'.format(region_size))
+        if max_size is None:
+            max_size = region_size // 4
+        elif not 0 <= max_size <= region_size:
+            raise ValueError('max size out of range: {}'.format(max_size))
+        self._regions = {}
+        self._region_size = region_size
+        self._max_size = max_size
+        self._active = False
+        self._n_live = 0
+        self._n_regions = 0
+
+    cpdef MemoryPointer malloc(self, Py_ssize_t size):
+        cdef _ScopedRegion region
+        cdef _ScopedMemory mem
+        cdef Py_ssize_t rounded
+        cdef size_t stream_ptr
+
+        if not self._active:
+            raise RuntimeError('The scoped pool is not active')
+        # The allocations from other threads and the large allocations are
+        # served by the parent allocator.
+        if (size == 0 or size > self._max_size or
+                PyThread_get_thread_ident() != self._thread_id):
+            return self._parent(size)
+        rounded = (size + 511) // 512 * 512
+        stream_ptr = stream_module.get_current_stream_ptr()
+        # The null stream has the same pointer on all devices.
+        key = (device.get_device_id(), stream_ptr)
+        region = self._regions.get(key)
+        if region is None or region.offset + rounded > region.size:
+            region = _ScopedRegion.__new__(_ScopedRegion)
+            region.buf = self._parent(self._region_size)
+            region.pool = self
+            region.stream_ptr = stream_ptr
+            region.offset = 0
+            region.size = self._region_size
+            region.n_live = 0
+            self._regions[key] = region
+            self._n_regions += 1
+        mem = _ScopedMemory.__new__(_ScopedMemory)
+        mem.device = region.buf.device
+        mem.ptr = region.buf.ptr + region.offset
+        mem.size = rounded
+        mem.region = region
+        region.offset += rounded
+        region.n_live += 1
+        self._n_live += 1
+        return MemoryPointer(mem, 0)
+
+    def __enter__(self):
+        global _current_allocator
+        if self._active:
+            raise RuntimeError('The scoped pool is already active')
+        self._parent = _current_allocator
+        self._thread_id = PyThread_get_thread_ident()
+        self._active = True
+        _current_allocator = self.malloc
+        return self
+
+    def __exit__(self, *args):
+        global _current_allocator
+        _current_allocator = self._parent
+        self._active = False
+        # The regions are returned to the parent when their allocations are
+        # all freed.
+        self._regions.clear()
+        if self._n_live:
+            warnings.warn(
+                '{} allocations outlive the scoped pool. The memory regions '
+                'of them are kept until they are freed.'.format(self._n_live))
+
+
+def scoped_pool(Py_ssize_t region_size=1 << 22, max_size=None):
+    """Returns a context manager of a scoped memory pool.
+
+    Within the ``with`` statement, the current allocator is replaced with a
+    scoped pool, which takes memory regions of ``region_size`` bytes from the
+    allocator current at the entry (usually the default :class:`MemoryPool`)
+    and carves allocations from them without taking any lock. Freeing an
+    allocation does not make its memory available for further allocations
+    until all the allocations from the same region are freed. At the exit,
+    the regions are returned to the parent allocator, so a scoped pool is
+    suitable for many short-lived temporary arrays.
+
+    An allocation that outlives the scope keeps its region until it is freed,
+    and a warning is emitted at the exit. Allocations larger than
+    ``max_size`` bytes, and allocations from other threads, are passed to the
+    parent allocator.
+
+    .. note::
+       As :func:`set_allocator`, the scoped pool replaces the allocator of
+       all threads.
+
+    Args:
+        region_size (int): Size of a memory region in bytes.
+        max_size (int): The largest size in bytes of an allocation carved
+            from a region. The default is ``region_size // 4``.
+
+    Returns:
+        A context manager whose ``malloc`` method allocates memory from the
+        scoped pool.
+
+    .. admonition:: Example
+
+       >>> with cupy.cuda.memory.scoped_pool():
+       ...     y = cupy.sum(cupy.arange(1000) ** 2)
+       ...     y = y.get()
+
+    """
+    return _ScopedPool(region_size, max_size)
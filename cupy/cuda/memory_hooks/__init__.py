@@ -1,6 +1,9 @@
 from cupy.cuda.memory_hooks import debug_print  # NOQA
 from cupy.cuda.memory_hooks import line_profile  # NOQA
+from cupy.cuda.memory_hooks import trace_recorder  # NOQA
 
 # import class and function
 from cupy.cuda.memory_hooks.debug_print import DebugPrintHook  # NOQA
 from cupy.cuda.memory_hooks.line_profile import LineProfileHook  # NOQA
+from cupy.cuda.memory_hooks.trace_recorder import load_trace  # NOQA
+from cupy.cuda.memory_hooks.trace_recorder import TraceRecorderHook  # NOQA
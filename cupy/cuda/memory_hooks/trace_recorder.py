@@ -0,0 +1,121 @@
+import collections
+import struct
+import time
+
+import six
+
+from cupy.cuda import memory_hook
+from cupy.cuda import stream as stream_module
+
+
+_MAGIC = b'CUPYMTR1'
+
+# op, device_id, timestamp in nanoseconds, size, pointer, stream pointer
+_RECORD = struct.Struct('<BB6xQQQQ')
+
+MALLOC = 0
+FREE = 1
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+
+TraceEvent = collections.namedtuple(
+    'TraceEvent', ('op', 'device_id', 'timestamp', 'size', 'ptr', 'stream'))
+
+
+class TraceRecorderHook(memory_hook.MemoryHook):
+    """Memory hook that records a trace of allocations to a binary file.
+
+    This memory hook records each ``malloc`` and ``free`` of memory pools
+    as a fixed-size binary record with the device ID, the time since the
+    hook was created, the requested size, the pointer and the current
+    stream. Records are buffered and written when the buffer is full and
+    when the hook exits. The trace can be read by :func:`load_trace` and
+    replayed through a memory pool without a GPU, e.g., by
+    ``benchmarks/memory_pool_simulator.py``.
+
+    Example:
+        Code example::
+
+            >>> import cupy
+            >>> from cupy.cuda import memory_hooks
+            >>>
+            >>> with memory_hooks.TraceRecorderHook('trace.bin'):
+            ...     x = cupy.arange(1000) ** 2
+            ...     del x  # doctest:+SKIP
+
+    Args:
+        file: Path or binary file-like object to write the trace to. A file
+            opened from a path is closed when the hook exits.
+        buffer_size (int): The number of records buffered before writing.
+
+    """
+
+    name = 'TraceRecorderHook'
+
+    def __init__(self, file, buffer_size=4096):
+        if isinstance(file, six.string_types):
+            self.file = open(file, 'wb')
+            self._close = True
+        else:
+            self.file = file
+            self._close = False
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._start = _clock()
+        self.file.write(_MAGIC)
+
+    def _record(self, op, device_id, size, ptr):
+        timestamp = int((_clock() - self._start) * 1e9)
+        self._buffer.append(_RECORD.pack(
+            op, device_id, timestamp, size, ptr,
+            stream_module.get_current_stream().ptr))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered records to the file."""
+        self.file.write(b''.join(self._buffer))
+        self._buffer = []
+        self.file.flush()
+
+    def __exit__(self, *_):
+        super(TraceRecorderHook, self).__exit__(*_)
+        self.flush()
+        if self._close:
+            self.file.close()
+
+    def malloc_postprocess(self, **kwargs):
+        # Failed and zero-size allocations are not recorded.
+        if kwargs['mem_ptr']:
+            self._record(MALLOC, kwargs['device_id'], kwargs['size'],
+                         kwargs['mem_ptr'])
+
+    def free_postprocess(self, **kwargs):
+        self._record(FREE, kwargs['device_id'], kwargs['mem_size'],
+                     kwargs['mem_ptr'])
+
+
+def load_trace(file):
+    """Loads a trace recorded by :class:`TraceRecorderHook`.
+
+    Args:
+        file: Path or binary file-like object to read the trace from.
+
+    Returns:
+        list of TraceEvent: The events in the order of the record. Each
+        event is a named tuple of ``op`` (``MALLOC`` or ``FREE``),
+        ``device_id``, ``timestamp`` in nanoseconds, ``size``, ``ptr`` and
+        ``stream``.
+
+    """
+    if isinstance(file, six.string_types):
+        with open(file, 'rb') as f:
+            return load_trace(f)
+    if file.read(len(_MAGIC)) != _MAGIC:
+        raise ValueError('not a trace of TraceRecorderHook')
+    data = file.read()
+    if len(data) % _RECORD.size != 0:
+        raise ValueError('truncated trace')
+    return [TraceEvent(*_RECORD.unpack_from(data, offset))
+            for offset in range(0, len(data), _RECORD.size)]
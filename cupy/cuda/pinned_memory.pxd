@@ -1,3 +1,5 @@
+from libcpp cimport vector
+
 
 cdef class PinnedMemoryPointer:
 
@@ -19,18 +21,46 @@ cpdef PinnedMemoryPointer alloc_pinned_memory(Py_ssize_t size)
 cpdef set_pinned_memory_allocator(allocator=*)
 
 
+cdef class _PinnedChunk:
+
+    cdef:
+        readonly object mem
+        readonly size_t ptr
+        readonly Py_ssize_t offset
+        readonly Py_ssize_t size
+        public _PinnedChunk prev
+        public _PinnedChunk next
+
+    cpdef _PinnedChunk split(self, Py_ssize_t size)
+    cpdef merge(self, _PinnedChunk remaining)
+
+
 cdef class PinnedMemoryPool:
 
     cdef:
         object _alloc
         dict _in_use
-        object _free
+        list _free
+        vector.vector[int] _index
         object __weakref__
         object _weakref
         object _lock
         Py_ssize_t _allocation_unit_size
+        Py_ssize_t _used_bytes
+        Py_ssize_t _free_bytes
+        Py_ssize_t _total_bytes
+        Py_ssize_t _limit
 
     cpdef PinnedMemoryPointer malloc(self, Py_ssize_t size)
+    cdef _alloc_chunk(self, Py_ssize_t size)
+    cdef _append_to_free_list(self, _PinnedChunk chunk)
+    cdef bint _remove_from_free_list(self, _PinnedChunk chunk) except *
+    cdef _PinnedChunk _pop_free_chunk(self, Py_ssize_t size)
     cpdef free(self, size_t ptr, Py_ssize_t size)
     cpdef free_all_blocks(self)
     cpdef n_free_blocks(self)
+    cpdef used_bytes(self)
+    cpdef free_bytes(self)
+    cpdef total_bytes(self)
+    cpdef set_limit(self, Py_ssize_t size)
+    cpdef Py_ssize_t get_limit(self)
@@ -1,10 +1,11 @@
 # distutils: language = c++
 
-import collections
 import weakref
 
 from fastrlock cimport rlock
+from libcpp cimport algorithm
 
+from cupy.cuda import memory
 from cupy.cuda import runtime
 
 from cupy.cuda cimport runtime
@@ -237,9 +238,9 @@ class PooledPinnedMemory(PinnedMemory):
 
     """
 
-    def __init__(self, mem, pool):
-        self.ptr = mem.ptr
-        self.size = mem.size
+    def __init__(self, chunk, pool):
+        self.ptr = chunk.ptr
+        self.size = chunk.size
         self.pool = pool
 
     def free(self):
@@ -258,32 +259,93 @@ class PooledPinnedMemory(PinnedMemory):
     __del__ = free
 
 
+cdef class _PinnedChunk:
+
+    """A chunk points to a pinned memory.
+
+    A chunk might be a split memory block from a larger allocation.
+    The prev/next pointers construct a doubly-linked list of memory addresses
+    sorted by base address that must be contiguous.
+
+    Args:
+        mem (PinnedMemory): The pinned memory buffer.
+        offset (int): An offset bytes from the head of the buffer.
+        size (int): Chunk size in bytes.
+
+    Attributes:
+        mem (PinnedMemory): The pinned memory buffer.
+        ptr (int): Memory address.
+        offset (int): An offset bytes from the head of the buffer.
+        size (int): Chunk size in bytes.
+        prev (_PinnedChunk): prev memory pointer if split from a larger
+            allocation
+        next (_PinnedChunk): next memory pointer if split from a larger
+            allocation
+    """
+
+    def __init__(self, mem, Py_ssize_t offset, Py_ssize_t size):
+        self.mem = mem
+        self.ptr = mem.ptr + offset
+        self.offset = offset
+        self.size = size
+
+    cpdef _PinnedChunk split(self, Py_ssize_t size):
+        """Split contiguous block of a larger allocation"""
+        cdef _PinnedChunk remaining
+        assert self.size >= size
+        if self.size == size:
+            return None
+        remaining = _PinnedChunk(self.mem, self.offset + size,
+                                 self.size - size)
+        self.size = size
+
+        if self.next is not None:
+            remaining.next = self.next
+            remaining.next.prev = remaining
+        self.next = remaining
+        remaining.prev = self
+        return remaining
+
+    cpdef merge(self, _PinnedChunk remaining):
+        """Merge previously split block (chunk)"""
+        self.size += remaining.size
+        self.next = remaining.next
+        if remaining.next is not None:
+            self.next.prev = self
+
+
 cdef class PinnedMemoryPool:
 
     """Memory pool for pinned memory on the host.
 
     Note that it preserves all allocated memory buffers even if the user
     explicitly release the one. Those released memory buffers are held by the
-    memory pool as *free blocks*, and reused for further memory allocations of
-    the same size.
+    memory pool as *free blocks*, and reused for further memory allocations.
+    An allocation takes the smallest free block that fits the requested
+    size, splitting it if it is larger, and a freed block is merged with the
+    adjacent free blocks split from the same buffer.
 
     Args:
         allocator (function): The base CuPy pinned memory allocator. It is
-            used for allocating new blocks when the blocks of the required
-            size are all in use.
+            used for allocating new blocks when no free block fits the
+            required size.
 
     """
 
     def __init__(self, allocator=_malloc):
         self._in_use = {}
-        self._free = collections.defaultdict(list)
+        self._free = []
         self._alloc = allocator
         self._weakref = weakref.ref(self)
         self._lock = rlock.create_fastrlock()
         self._allocation_unit_size = 512
+        self._used_bytes = 0
+        self._free_bytes = 0
+        self._total_bytes = 0
+        self._limit = 0
 
     cpdef PinnedMemoryPointer malloc(self, Py_ssize_t size):
-        cdef list free
+        cdef _PinnedChunk chunk, remaining
 
         if size == 0:
             return PinnedMemoryPointer(PinnedMemory(0), 0)
@@ -293,41 +355,143 @@ cdef class PinnedMemoryPool:
         size = ((size + unit - 1) // unit) * unit
         rlock.lock_fastrlock(self._lock, -1, True)
         try:
-            free = self._free[size]
-            if free:
-                mem = free.pop()
-            else:
-                try:
-                    mem = self._alloc(size).mem
-                except runtime.CUDARuntimeError as e:
-                    if e.status != runtime.errorMemoryAllocation:
-                        raise
-                    self.free_all_blocks()
-                    mem = self._alloc(size).mem
-
-            self._in_use[mem.ptr] = mem
+            chunk = self._pop_free_chunk(size)
+            if chunk is None:
+                chunk = _PinnedChunk(self._alloc_chunk(size), 0, size)
+            remaining = chunk.split(size)
+            if remaining is not None:
+                self._append_to_free_list(remaining)
+            self._in_use[chunk.ptr] = chunk
+            self._used_bytes += size
         finally:
             rlock.unlock_fastrlock(self._lock)
-        pmem = PooledPinnedMemory(mem, self._weakref)
+        pmem = PooledPinnedMemory(chunk, self._weakref)
         return PinnedMemoryPointer(pmem, 0)
 
+    cdef _alloc_chunk(self, Py_ssize_t size):
+        # need self._lock
+        if self._limit != 0 and self._total_bytes + size > self._limit:
+            self.free_all_blocks()
+            if self._total_bytes + size > self._limit:
+                raise memory.OutOfMemoryError(
+                    size, size + self._total_bytes, self._limit)
+        try:
+            mem = self._alloc(size).mem
+        except runtime.CUDARuntimeError as e:
+            if e.status != runtime.errorMemoryAllocation:
+                raise
+            self.free_all_blocks()
+            mem = self._alloc(size).mem
+        self._total_bytes += size
+        return mem
+
+    cdef _append_to_free_list(self, _PinnedChunk chunk):
+        # need self._lock
+        cdef int index, bin_index
+        cdef set free_list
+
+        bin_index = (chunk.size - 1) // self._allocation_unit_size
+        index = algorithm.lower_bound(
+            self._index.begin(), self._index.end(),
+            bin_index) - self._index.begin()
+        if (index < <int>self._index.size() and
+                self._index.at(index) == bin_index):
+            free_list = self._free[index]
+        else:
+            free_list = set()
+            self._index.insert(self._index.begin() + index, bin_index)
+            self._free.insert(index, free_list)
+        free_list.add(chunk)
+        self._free_bytes += chunk.size
+
+    cdef bint _remove_from_free_list(self, _PinnedChunk chunk) except *:
+        # need self._lock
+        cdef int index, bin_index
+        cdef set free_list
+
+        bin_index = (chunk.size - 1) // self._allocation_unit_size
+        index = algorithm.lower_bound(
+            self._index.begin(), self._index.end(),
+            bin_index) - self._index.begin()
+        if (index == <int>self._index.size() or
+                self._index.at(index) != bin_index):
+            return False
+        free_list = self._free[index]
+        if chunk not in free_list:
+            return False
+        free_list.remove(chunk)
+        if len(free_list) == 0:
+            self._index.erase(self._index.begin() + index)
+            del self._free[index]
+        self._free_bytes -= chunk.size
+        return True
+
+    cdef _PinnedChunk _pop_free_chunk(self, Py_ssize_t size):
+        """Find best-fit, or a smallest larger free chunk."""
+        # need self._lock
+        cdef int index
+        cdef set free_list
+        cdef _PinnedChunk chunk
+
+        index = algorithm.lower_bound(
+            self._index.begin(), self._index.end(),
+            (size - 1) // self._allocation_unit_size) - self._index.begin()
+        if index == <int>self._index.size():
+            return None
+        free_list = self._free[index]
+        chunk = free_list.pop()
+        if len(free_list) == 0:
+            self._index.erase(self._index.begin() + index)
+            del self._free[index]
+        self._free_bytes -= chunk.size
+        return chunk
+
     cpdef free(self, size_t ptr, Py_ssize_t size):
-        cdef list free
+        cdef _PinnedChunk chunk
         rlock.lock_fastrlock(self._lock, -1, True)
         try:
-            mem = self._in_use.pop(ptr, None)
-            if mem is None:
+            chunk = self._in_use.pop(ptr, None)
+            if chunk is None:
                 raise RuntimeError('Cannot free out-of-pool memory')
-            free = self._free[size]
-            free.append(mem)
+            self._used_bytes -= chunk.size
+
+            if chunk.next is not None:
+                if self._remove_from_free_list(chunk.next):
+                    chunk.merge(chunk.next)
+
+            if chunk.prev is not None:
+                if self._remove_from_free_list(chunk.prev):
+                    chunk = chunk.prev
+                    chunk.merge(chunk.next)
+
+            self._append_to_free_list(chunk)
         finally:
             rlock.unlock_fastrlock(self._lock)
 
     cpdef free_all_blocks(self):
-        """Release free all blocks."""
+        """Release free blocks that are not split."""
+        cdef _PinnedChunk chunk
+        cdef set free_list, keep_list
+        cdef list new_free = []
+        cdef vector.vector[int] new_index
+        cdef size_t i
+
         rlock.lock_fastrlock(self._lock, -1, True)
         try:
-            self._free.clear()
+            for i in range(self._index.size()):
+                free_list = self._free[i]
+                keep_list = set()
+                for chunk in free_list:
+                    if chunk.prev is not None or chunk.next is not None:
+                        keep_list.add(chunk)
+                    else:
+                        self._free_bytes -= chunk.size
+                        self._total_bytes -= chunk.size
+                if keep_list:
+                    new_index.push_back(self._index.at(i))
+                    new_free.append(keep_list)
+            self._index.swap(new_index)
+            self._free = new_free
         finally:
             rlock.unlock_fastrlock(self._lock)
 
@@ -340,8 +504,55 @@ cdef class PinnedMemoryPool:
         cdef Py_ssize_t n = 0
         rlock.lock_fastrlock(self._lock, -1, True)
         try:
-            for v in self._free.values():
+            for v in self._free:
                 n += len(v)
         finally:
             rlock.unlock_fastrlock(self._lock)
         return n
+
+    cpdef used_bytes(self):
+        """Get the total number of bytes used.
+
+        Returns:
+            int: The total number of bytes used.
+        """
+        return self._used_bytes
+
+    cpdef free_bytes(self):
+        """Get the total number of bytes acquired but not used in the pool.
+
+        Returns:
+            int: The total number of bytes acquired but not used in the pool.
+        """
+        return self._free_bytes
+
+    cpdef total_bytes(self):
+        """Get the total number of bytes acquired in the pool.
+
+        Returns:
+            int: The total number of bytes acquired in the pool.
+        """
+        return self._total_bytes
+
+    cpdef set_limit(self, Py_ssize_t size):
+        """Sets the upper limit of pinned memory allocation of the pool.
+
+        When the total bytes acquired by the pool would exceed the limit,
+        the free blocks that are not split are released first, and then
+        :class:`~cupy.cuda.memory.OutOfMemoryError` is raised if the
+        allocation still exceeds the limit.
+
+        Args:
+            size (int): Limit size in bytes. ``0`` removes the limit.
+        """
+        if size < 0:
+            raise ValueError('limit out of range: {}'.format(size))
+        self._limit = size
+
+    cpdef Py_ssize_t get_limit(self):
+        """Gets the upper limit of pinned memory allocation of the pool.
+
+        Returns:
+            int: The number of bytes. ``0`` means no limit.
+        """
+        return self._limit
@@ -0,0 +1,673 @@
+"""Ahead-of-time compilation of CuPy kernels.
+
+This module compiles the kernels listed in a manifest into the kernel cache
+so that processes started later find the binaries there and never invoke
+NVRTC. Run it as ``python -m cupy.cuda.precompile MANIFEST``.
+
+A manifest is a JSON file of the following form::
+
+    {"kernels": [
+        {"kind": "ufunc", "kernel": "cupy.add",
+         "dtypes": ["float32", "float32"], "ndim": 1},
+        {"kind": "simple_reduction", "kernel": "cupy.core.core._sum",
+         "dtypes": ["float32"], "ndim": 1, "out_ndim": 0},
+        {"kind": "elementwise",
+         "definition": {"in_params": "T x, T y", "out_params": "T z",
+                        "operation": "z = (x - y) * (x - y)",
+                        "name": "squared_diff"},
+         "dtypes": ["float64", "float64"], "ndim": 2}
+    ]}
+
+Each entry has the following keys.
+
+- ``kind``: One of ``ufunc``, ``elementwise``
+  (:class:`cupy.ElementwiseKernel`), ``reduction``
+  (:class:`cupy.ReductionKernel`) and ``simple_reduction`` (reduction
+  routines such as :func:`cupy.sum`).
+- ``kernel``: Import path of the kernel object, e.g. ``cupy.add`` or
+  ``mypackage.kernels:squared_diff``.
+- ``definition``: Keyword arguments to construct the kernel, which are
+  passed to :func:`cupy.core.create_ufunc`, :class:`cupy.ElementwiseKernel`,
+  :class:`cupy.ReductionKernel` or :func:`cupy.core.create_reduction_func`.
+  Either ``kernel`` or ``definition`` is required.
+- ``dtypes``: Dtypes of the arguments. The output dtypes can be omitted.
+- ``ndim``: Number of dimensions of the arrays after dimension reduction.
+  For reductions, this is the number of dimensions of the inputs.
+- ``out_ndim``: Number of dimensions of the outputs of reductions.
+- ``arg_ndims``: Number of dimensions of each argument, used for ``raw``
+  arguments whose dimensions differ from ``ndim``.
+- ``scalars``: Indices of the arguments passed as scalars.
+- ``signature``: Type signature of the routine of ``ufunc`` and
+  ``simple_reduction`` kernels, e.g. ``ff->f``. By default, the routine is
+  chosen from the input dtypes in the same way as the kernel call.
+- ``stage``: Stage of a two-stage reduction, which is 1 for the kernel
+  reducing segments of the input into partial results and 2 for the kernel
+  reducing the partial results. Reductions launched in a single stage omit
+  it.
+- ``int64_index``: Whether reductions use 64-bit indices, which is ``true``
+  for inputs of about 2**31 / 3 elements or more.
+
+Generating the sources and computing the cache keys does not require a GPU
+if the target architecture is given by ``--arch``. Only compiling the
+kernels with ``--compile`` does.
+
+A manifest can also be recorded from a workload by setting the
+``CUPY_KERNEL_RECORD`` environment variable to a file path or by calling
+:func:`start_recording`. Each kernel compiled by the process is appended to
+the file as an entry in a line of JSON, which can be passed to this module
+in place of a manifest.
+
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import threading
+import warnings
+
+import numpy
+
+from cupy.core import core
+from cupy.cuda import compiler
+
+
+_kinds = {
+    'ufunc': core.ufunc,
+    'elementwise': core.ElementwiseKernel,
+    'reduction': core.ReductionKernel,
+    'simple_reduction': core.simple_reduction_function,
+}
+
+
+def _tuples(ops):
+    return [tuple(op) if isinstance(op, list) else op for op in ops]
+
+
+def _define_ufunc(name, ops, routine=None, preamble=''):
+    return core.create_ufunc(name, _tuples(ops), routine, preamble)
+
+
+def _define_simple_reduction(name, ops, routine=None, identity=None,
+                             preamble=''):
+    if routine is not None:
+        routine = tuple(routine)
+    return core.create_reduction_func(
+        name, _tuples(ops), routine, identity, preamble)
+
+
+_constructors = {
+    'ufunc': _define_ufunc,
+    'elementwise': core.ElementwiseKernel,
+    'reduction': core.ReductionKernel,
+    'simple_reduction': _define_simple_reduction,
+}
+
+
+def load_manifest(path):
+    """Reads and validates a manifest.
+
+    Args:
+        path (str): Path to the JSON manifest or to a file written by
+            :class:`KernelRecorder`.
+
+    Returns:
+        list of dict: Entries of the manifest.
+
+    """
+    with open(path) as f:
+        text = f.read()
+    try:
+        manifest = json.loads(text)
+    except ValueError:
+        manifest = None
+    if not isinstance(manifest, dict) or 'kernels' not in manifest:
+        # A recorded file has an entry per line. Processes sharing the file
+        # may have recorded the same entries.
+        lines = []
+        seen = set()
+        for line in text.splitlines():
+            if line.strip() and line not in seen:
+                seen.add(line)
+                lines.append(line)
+        manifest = {'kernels': [json.loads(line) for line in lines]}
+    return validate_manifest(manifest)
+
+
+def validate_manifest(manifest):
+    """Validates the entries of a manifest.
+
+    Args:
+        manifest (dict): Manifest with the ``kernels`` key.
+
+    Returns:
+        list of dict: Entries of the manifest.
+
+    """
+    if not isinstance(manifest, dict) or \
+            not isinstance(manifest.get('kernels'), list):
+        raise ValueError('manifest must be an object with a "kernels" list')
+    entries = manifest['kernels']
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise ValueError('entry {} is not an object'.format(i))
+        kind = entry.get('kind')
+        if kind not in _kinds:
+            raise ValueError('entry {}: unknown kind: {}'.format(i, kind))
+        if ('kernel' in entry) == ('definition' in entry):
+            raise ValueError(
+                'entry {}: exactly one of "kernel" and "definition" is '
+                'required'.format(i))
+        if not isinstance(entry.get('dtypes'), list):
+            raise ValueError('entry {}: "dtypes" list is required'.format(i))
+    return entries
+
+
+def _import_object(path):
+    if ':' in path:
+        module_name, attr = path.split(':', 1)
+    else:
+        module_name, _, attr = path.rpartition('.')
+    obj = importlib.import_module(module_name)
+    for name in attr.split('.'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _get_kernel(entry):
+    kind = entry['kind']
+    if 'definition' in entry:
+        kwargs = dict(entry['definition'])
+        if 'options' in kwargs:
+            kwargs['options'] = tuple(kwargs['options'])
+        return _constructors[kind](**kwargs)
+    kernel = _import_object(entry['kernel'])
+    if not isinstance(kernel, _kinds[kind]):
+        raise TypeError('{} is not a {} kernel'.format(entry['kernel'], kind))
+    return kernel
+
+
+def _get_dtypes(entry):
+    return [None if d is None else numpy.dtype(d).type
+            for d in entry['dtypes']]
+
+
+def _get_arg_ndims(entry, nargs, ndim):
+    arg_ndims = entry.get('arg_ndims')
+    if arg_ndims is None:
+        return [ndim] * nargs
+    if len(arg_ndims) != nargs:
+        raise ValueError('"arg_ndims" must have {} items'.format(nargs))
+    return arg_ndims
+
+
+def _check_nargs(kernel, dtypes):
+    if len(dtypes) != kernel.nin and len(dtypes) != kernel.nargs:
+        raise TypeError('Wrong number of dtypes for {}'.format(kernel.name))
+
+
+def _find_routine(kernel, in_dtypes, signature):
+    if signature is not None:
+        types = [
+            '%s->%s' % (''.join([numpy.dtype(t).char for t in op[0]]),
+                        ''.join([numpy.dtype(t).char for t in op[1]]))
+            for op in kernel._ops]
+        if signature not in types:
+            raise TypeError('Unknown signature {} for {}'.format(
+                signature, kernel.name))
+        return kernel._ops[types.index(signature)]
+    for op in kernel._ops:
+        if all([numpy.can_cast(a, b) for a, b in zip(in_dtypes, op[0])]):
+            return op
+    raise TypeError('Wrong type ({}) of arguments for {}'.format(
+        tuple(in_dtypes), kernel.name))
+
+
+def _array(dtype, ndim):
+    return core.ndarray, dtype, ndim
+
+
+def _scalar(dtype):
+    return dtype, dtype, 0
+
+
+def _indexer(ndim):
+    return core.Indexer, None, ndim
+
+
+def _ufunc_source(kernel, entry):
+    dtypes = _get_dtypes(entry)
+    _check_nargs(kernel, dtypes)
+    ndim = entry.get('ndim', 1)
+    scalars = entry.get('scalars', ())
+    arg_ndims = _get_arg_ndims(entry, kernel.nargs, ndim)
+    in_dtypes = dtypes[:kernel.nin]
+    in_types, out_types, routine = _find_routine(
+        kernel, in_dtypes, entry.get('signature'))
+    out_dtypes = dtypes[kernel.nin:] or out_types
+
+    args_info = []
+    for i, t in enumerate(in_types):
+        if i in scalars:
+            args_info.append(_scalar(t))
+        else:
+            args_info.append(_array(in_dtypes[i], arg_ndims[i]))
+    for i, t in enumerate(out_dtypes):
+        args_info.append(_array(t, arg_ndims[kernel.nin + i]))
+    args_info.append(_indexer(ndim))
+
+    source = core._get_ufunc_kernel_source(
+        in_types, tuple(out_types), routine, tuple(args_info),
+        kernel._params, kernel.name, kernel._preamble)
+    return source, ()
+
+
+def _decide_types(kernel, dtypes, scalars):
+    in_ndarray_types = tuple([
+        None if i in scalars else t
+        for i, t in enumerate(dtypes[:kernel.nin])])
+    out_ndarray_types = tuple(dtypes[kernel.nin:])
+    return core._decide_params_type(
+        kernel.in_params, kernel.out_params,
+        in_ndarray_types, out_ndarray_types)
+
+
+def _elementwise_source(kernel, entry):
+    dtypes = _get_dtypes(entry)
+    _check_nargs(kernel, dtypes)
+    ndim = entry.get('ndim', 1)
+    scalars = entry.get('scalars', ())
+    arg_ndims = _get_arg_ndims(entry, kernel.nargs, ndim)
+    in_types, out_types, types = _decide_types(kernel, dtypes, scalars)
+
+    args_info = []
+    for i, t in enumerate(in_types):
+        if i in scalars:
+            args_info.append(_scalar(t))
+        else:
+            args_info.append(_array(dtypes[i], arg_ndims[i]))
+    for i, t in enumerate(out_types):
+        args_info.append(_array(t, arg_ndims[kernel.nin + i]))
+    args_info.append(_indexer(ndim))
+
+    source = core._get_elementwise_kernel_source(
+        tuple(args_info), types, kernel.params, kernel.operation,
+        kernel.name, kernel.preamble, kernel.kwargs)
+    return source, tuple(dict(kernel.kwargs).get('options', ()))
+
+
+# Partial results and the number of segments of two-stage reductions.
+_two_stage_args_info = [_array(numpy.uint8, 1), _scalar(numpy.int32)]
+
+
+def _reduction_source(kernel, entry):
+    dtypes = _get_dtypes(entry)
+    _check_nargs(kernel, dtypes)
+    ndim = entry.get('ndim', 1)
+    out_ndim = entry.get('out_ndim', 0)
+    scalars = entry.get('scalars', ())
+    in_types, out_types, types = _decide_types(kernel, dtypes, scalars)
+
+    args_info = []
+    for i, t in enumerate(in_types):
+        if i in scalars:
+            args_info.append(_scalar(t))
+        else:
+            args_info.append(_array(dtypes[i], ndim))
+    for t in out_types:
+        args_info.append(_array(t, out_ndim))
+    args_info += [_indexer(ndim), _indexer(out_ndim), _scalar(numpy.int32)]
+    stage = entry.get('stage', 0)
+    if stage:
+        args_info += _two_stage_args_info
+
+    source = core._get_reduction_kernel_source(
+        kernel.params, tuple(args_info), types, kernel.name,
+        kernel._block_size, kernel.reduce_type, kernel.identity,
+        kernel.map_expr, kernel.reduce_expr, kernel.post_map_expr,
+        kernel.preamble, stage, kernel._warp_shuffle,
+        entry.get('int64_index', False))
+    return source, tuple(kernel.options)
+
+
+def _simple_reduction_source(kernel, entry):
+    dtypes = _get_dtypes(entry)
+    _check_nargs(kernel, dtypes)
+    ndim = entry.get('ndim', 1)
+    out_ndim = entry.get('out_ndim', 0)
+    in_types, out_types, routine = _find_routine(
+        kernel, dtypes[:1], entry.get('signature'))
+    in_dtype = dtypes[0]
+    out_dtype = dtypes[1] if len(dtypes) == 2 else out_types[0]
+
+    args_info = [
+        _array(in_dtype, ndim), _array(out_dtype, out_ndim),
+        _indexer(ndim), _indexer(out_ndim), _scalar(numpy.int32)]
+    stage = entry.get('stage', 0)
+    if stage:
+        args_info += _two_stage_args_info
+
+    source = core._get_simple_reduction_function_source(
+        routine, kernel._params, tuple(args_info), in_dtype, out_dtype,
+        out_types, kernel.name, kernel._block_size, kernel.identity,
+        kernel._input_expr, kernel._output_expr, kernel._preamble, stage,
+        kernel._warp_shuffle, entry.get('int64_index', False))
+    return source, ()
+
+
+_generators = {
+    'ufunc': _ufunc_source,
+    'elementwise': _elementwise_source,
+    'reduction': _reduction_source,
+    'simple_reduction': _simple_reduction_source,
+}
+
+
+def generate_source(entry):
+    """Generates the CUDA source of a manifest entry.
+
+    The source is the same as the one generated when the kernel is called
+    with arguments described by the entry. This does not require a GPU.
+
+    Args:
+        entry (dict): An entry of a manifest.
+
+    Returns:
+        tuple: The kernel name, the CUDA source and the compile options.
+
+    """
+    kernel = _get_kernel(entry)
+    source, options = _generators[entry['kind']](kernel, entry)
+    return kernel.name, source, options
+
+
+def precompile(entries, arch=None, cache_dir=None, compile=False,
+               source_dir=None, jobs=1):
+    """Computes the cache keys of kernels and optionally compiles them.
+
+    Args:
+        entries (list of dict): Entries of a manifest.
+        arch (str): Target architecture such as ``'compute_60'``. The
+            architecture of the current device is used if ``None``.
+        cache_dir (str): Path to the cache directory. If ``None``, the
+            default cache directory is used.
+        compile (bool): If ``True``, the kernels missing in the cache are
+            compiled into it. This requires a GPU.
+        source_dir (str): If given, the CUDA source of each kernel is written
+            to a file named after its cache key in this directory.
+        jobs (int): The number of kernels compiled in parallel with
+            :class:`cupy.cuda.compiler.AsyncCompiler`.
+
+    Returns:
+        list of dict: The ``name``, ``kind`` and cache ``key`` of each kernel.
+
+    """
+    if arch is None:
+        arch = compiler._get_arch()
+    results = []
+    compile_args = []
+    for entry in entries:
+        name, source, options = generate_source(entry)
+        source, options, extra_source = core._get_compile_args(
+            source, options)
+        key = compiler.get_cache_key(source, options, arch, extra_source)
+        if source_dir is not None:
+            if not os.path.isdir(source_dir):
+                os.makedirs(source_dir)
+            with open(os.path.join(source_dir, key + '.cu'), 'w') as f:
+                f.write(source)
+        compile_args.append((source, options, arch, cache_dir, extra_source))
+        results.append({'name': name, 'kind': entry['kind'], 'key': key})
+
+    if compile and jobs > 1:
+        with compiler.AsyncCompiler(jobs) as async_compiler:
+            fs = [async_compiler.submit(*args) for args in compile_args]
+            for f in fs:
+                f.result()
+    elif compile:
+        for args in compile_args:
+            compiler.compile_with_cache(*args)
+    return results
+
+
+def _dtype_name(dtype):
+    return numpy.dtype(dtype).name
+
+
+def _type_chars(types):
+    return ''.join([numpy.dtype(t).char for t in types])
+
+
+def _param_str(p):
+    t = p.ctype if p.dtype is None else _dtype_name(p.dtype)
+    return '{}{} {}'.format('raw ' if p.raw else '', t, p.name)
+
+
+def _split_params(params):
+    return (', '.join([_param_str(p) for p in params if p.is_const]),
+            ', '.join([_param_str(p) for p in params if not p.is_const]))
+
+
+def _describe_args(entry, args_info, ndim):
+    # Fills the dtypes, ndims and scalars of an entry from args_info.
+    entry['dtypes'] = [_dtype_name(a[1]) for a in args_info]
+    entry['ndim'] = ndim
+    scalars = [i for i, a in enumerate(args_info) if a[0] is not core.ndarray]
+    if scalars:
+        entry['scalars'] = scalars
+    arg_ndims = [a[2] for a in args_info]
+    if any([n != ndim for i, n in enumerate(arg_ndims)
+            if i not in scalars]):
+        entry['arg_ndims'] = arg_ndims
+    return entry
+
+
+def _with_inputs_only(entry, nin):
+    # Output dtypes of a recorded entry are only needed if the types of the
+    # kernel cannot be decided from the inputs in the same order.
+    entry = dict(entry)
+    entry['dtypes'] = entry['dtypes'][:nin]
+    return entry
+
+
+def _record_ufunc(args):
+    in_types, out_types, routine, args_info, params, name, preamble = args
+    nargs = len(in_types) + len(out_types)
+    signature = '%s->%s' % (_type_chars(in_types), _type_chars(out_types))
+    definition = {'name': name, 'ops': [[signature, routine]]}
+    if preamble:
+        definition['preamble'] = preamble
+    entry = {'kind': 'ufunc', 'definition': definition,
+             'signature': signature}
+    return [_describe_args(entry, args_info[:nargs], args_info[nargs][2])]
+
+
+def _record_elementwise(args):
+    args_info, types, params, operation, name, preamble, kwargs = args
+    in_params, out_params = _split_params(params[:-1])
+    definition = {'in_params': in_params, 'out_params': out_params,
+                  'operation': operation, 'name': name}
+    if preamble:
+        definition['preamble'] = preamble
+    for key, value in kwargs:
+        definition[key] = list(value) if key == 'options' else value
+    entry = _describe_args(
+        {'kind': 'elementwise', 'definition': definition},
+        args_info[:-1], args_info[-1][2])
+    nin = len([p for p in params[:-1] if p.is_const])
+    return [_with_inputs_only(entry, nin), entry]
+
+
+def _record_reduction(args):
+    (params, args_info, types, name, block_size, reduce_type, identity,
+     map_expr, reduce_expr, post_map_expr, preamble, stage, warp_shuffle,
+     int64_index, options) = args
+    nargs = len(params) - 3
+    in_params, out_params = _split_params(params[:nargs])
+    definition = {'in_params': in_params, 'out_params': out_params,
+                  'map_expr': map_expr, 'reduce_expr': reduce_expr,
+                  'post_map_expr': post_map_expr, 'identity': identity,
+                  'name': name, 'reduce_type': reduce_type}
+    if preamble:
+        definition['preamble'] = preamble
+    if options:
+        definition['options'] = list(options)
+    entry = _describe_args(
+        {'kind': 'reduction', 'definition': definition},
+        args_info[:nargs], args_info[nargs][2])
+    entry['out_ndim'] = args_info[nargs + 1][2]
+    entry.pop('arg_ndims', None)
+    if stage:
+        entry['stage'] = stage
+    if int64_index:
+        entry['int64_index'] = True
+    nin = len([p for p in params[:nargs] if p.is_const])
+    return [_with_inputs_only(entry, nin), entry]
+
+
+def _record_simple_reduction(args):
+    (routine, params, args_info, in_arg_dtype, out_arg_dtype, out_types,
+     name, block_size, identity, input_expr, output_expr, preamble,
+     stage, warp_shuffle, int64_index, options) = args
+    signature = '%s->%s' % (
+        _type_chars((in_arg_dtype,)), _type_chars(out_types))
+    definition = {'name': name, 'ops': [signature], 'routine': list(routine),
+                  'identity': identity}
+    if preamble:
+        definition['preamble'] = preamble
+    entry = {'kind': 'simple_reduction', 'definition': definition,
+             'signature': signature,
+             'dtypes': [_dtype_name(in_arg_dtype),
+                        _dtype_name(out_arg_dtype)],
+             'ndim': args_info[2][2], 'out_ndim': args_info[3][2]}
+    if stage:
+        entry['stage'] = stage
+    if int64_index:
+        entry['int64_index'] = True
+    return [entry]
+
+
+_recorders = {
+    'ufunc': _record_ufunc,
+    'elementwise': _record_elementwise,
+    'reduction': _record_reduction,
+    'simple_reduction': _record_simple_reduction,
+}
+
+
+def make_entry(kind, source, args):
+    """Makes a manifest entry of a kernel specialization.
+
+    Args:
+        kind (str): Kind of the kernel.
+        source (str): CUDA source of the kernel.
+        args (tuple): Arguments of the memoized kernel getter of the kind.
+
+    Returns:
+        dict: A manifest entry from which :func:`generate_source` generates
+        the same source, or ``None`` if no such entry is found.
+
+    """
+    for entry in _recorders[kind](args):
+        try:
+            if generate_source(entry)[1] == source:
+                return entry
+        except (KeyError, TypeError, ValueError):
+            # The types cannot be decided from the inputs only.
+            pass
+    return None
+
+
+class KernelRecorder(object):
+
+    """Records kernel specializations compiled by the process.
+
+    Each distinct specialization is appended to a file as a manifest entry
+    in a line of JSON. An entry is recorded only if the same source is
+    generated from it, so that the cache keys computed from the file match
+    the ones of the workload.
+
+    Args:
+        path (str): Path to the file to append the entries to.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._recorded = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, kind, source, args):
+        try:
+            entry = make_entry(kind, source, args)
+            if entry is None:
+                raise ValueError(
+                    'the source cannot be reproduced from a manifest entry')
+            line = json.dumps(entry, sort_keys=True, separators=(',', ':'))
+        except Exception as e:
+            warnings.warn(
+                'Failed to record a {} kernel: {}'.format(kind, e))
+            return
+        with self._lock:
+            if line in self._recorded:
+                return
+            self._recorded.add(line)
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+
+def start_recording(path):
+    """Starts recording the kernels compiled by the process.
+
+    Kernels compiled before the call are not recorded as they are already
+    memoized.
+
+    Args:
+        path (str): Path to the file to append the entries to.
+
+    Returns:
+        KernelRecorder: The recorder.
+
+    """
+    recorder = KernelRecorder(path)
+    core._set_kernel_recorder(recorder)
+    return recorder
+
+
+def stop_recording():
+    """Stops recording the kernels compiled by the process."""
+    core._set_kernel_recorder(None)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m cupy.cuda.precompile',
+        description='Compile the kernels listed in a manifest into the CuPy '
+        'kernel cache ahead of time.')
+    parser.add_argument('manifest', help='Path to the JSON manifest.')
+    parser.add_argument('--arch', default=None,
+                        help='Target architecture such as compute_60. '
+                        'The architecture of the current device is used by '
+                        'default.')
+    parser.add_argument('--dir', default=None,
+                        help='Path to the cache directory. '
+                        'CUPY_CACHE_DIR is used by default.')
+    parser.add_argument('--source-dir', default=None,
+                        help='Directory to write the CUDA sources to.')
+    parser.add_argument('--compile', action='store_true',
+                        help='Compile the kernels into the cache. '
+                        'This requires a GPU.')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='Number of kernels compiled in parallel.')
+    args = parser.parse_args(args)
+
+    entries = load_manifest(args.manifest)
+    results = precompile(entries, args.arch, args.dir, args.compile,
+                         args.source_dir, args.jobs)
+    for result in results:
+        print('{key} {kind} {name}'.format(**result))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,5 @@
+from cupy.fft import cache  # NOQA
+from cupy.fft import config  # NOQA
 from cupy.fft.fft import fft  # NOQA
 from cupy.fft.fft import fft2  # NOQA
 from cupy.fft.fft import fftfreq  # NOQA
@@ -0,0 +1,241 @@
+import collections
+import threading
+
+from cupy.cuda import cufft
+from cupy.cuda import device
+from cupy.cuda import stream as stream_module
+
+
+def _create_plan(shape, fft_type, batch):
+    if isinstance(shape, tuple):
+        return cufft.PlanNd(shape, fft_type, batch)
+    return cufft.Plan1d(shape, fft_type, batch)
+
+
+class PlanCache(object):
+
+    """LRU cache of cuFFT plans for a single device.
+
+    Creating a cuFFT plan requires a call to the planner and an allocation
+    of its work area, which is expensive compared to the transform itself
+    for small inputs. This cache keeps created plans keyed by the transform
+    size, the FFT type (which determines the input and output dtypes), the
+    batch size and the stream the plan is bound to, and evicts the least
+    recently used plans when either limit is exceeded.
+
+    Args:
+        size (int): The maximum number of plans to keep. ``0`` disables the
+            cache and ``-1`` removes the limit.
+        memsize (int): The maximum total size in bytes of the work areas held
+            by the cached plans. ``-1`` removes the limit.
+        plan_factory (callable): A callable creating a new plan from
+            ``(shape, fft_type, batch)``. The returned object must have a
+            ``work_size`` attribute. By default,
+            :class:`cupy.cuda.cufft.Plan1d` is created for an integer shape
+            and :class:`cupy.cuda.cufft.PlanNd` for a tuple.
+
+    """
+
+    def __init__(self, size=16, memsize=-1, plan_factory=None):
+        if plan_factory is None:
+            plan_factory = _create_plan
+        self._validate_size(size)
+        self._validate_size(memsize)
+        self._size = size
+        self._memsize = memsize
+        self._plan_factory = plan_factory
+        self._plans = collections.OrderedDict()
+        self._curr_memsize = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _validate_size(size):
+        if size < -1:
+            raise ValueError('size must be non-negative or -1: {}'.format(
+                size))
+
+    def __len__(self):
+        return len(self._plans)
+
+    def __contains__(self, key):
+        return key in self._plans
+
+    @property
+    def size(self):
+        """The maximum number of cached plans."""
+        return self._size
+
+    @property
+    def memsize(self):
+        """The maximum total work area size of cached plans in bytes."""
+        return self._memsize
+
+    @property
+    def curr_memsize(self):
+        """The total work area size of cached plans in bytes."""
+        return self._curr_memsize
+
+    def set_size(self, size):
+        """Sets the maximum number of cached plans.
+
+        Plans exceeding the new limit are evicted immediately.
+
+        Args:
+            size (int): The maximum number of plans. ``0`` disables the cache
+                and ``-1`` removes the limit.
+
+        """
+        self._validate_size(size)
+        with self._lock:
+            self._size = size
+            self._evict(0)
+
+    def set_memsize(self, memsize):
+        """Sets the maximum total work area size of cached plans.
+
+        Plans exceeding the new limit are evicted immediately.
+
+        Args:
+            memsize (int): The maximum size in bytes. ``-1`` removes the
+                limit.
+
+        """
+        self._validate_size(memsize)
+        with self._lock:
+            self._memsize = memsize
+            self._evict(0)
+
+    def get_plan(self, shape, fft_type, batch, stream_ptr=None):
+        """Returns a plan, creating and caching it on a miss.
+
+        Args:
+            shape (int or tuple of ints): Length of a 1-D transform or shape
+                of a multi-dimensional transform.
+            fft_type (int): cuFFT transform type such as
+                ``cupy.cuda.cufft.CUFFT_C2C``.
+            batch (int): Number of transforms.
+            stream_ptr (int): Pointer of the stream the plan is bound to. The
+                current stream is used if ``None``.
+
+        Returns:
+            A plan created by the plan factory.
+
+        """
+        if stream_ptr is None:
+            stream_ptr = stream_module.get_current_stream().ptr
+        key = (shape, fft_type, batch, stream_ptr)
+        with self._lock:
+            plan = self._plans.pop(key, None)
+            if plan is not None:
+                self._plans[key] = plan
+                self._hits += 1
+                return plan
+            self._misses += 1
+
+        plan = self._plan_factory(shape, fft_type, batch)
+        if self._size == 0:
+            return plan
+        work_size = plan.work_size
+        if self._memsize != -1 and work_size > self._memsize:
+            # The plan alone exceeds the budget; do not flush the cache for it.
+            return plan
+
+        with self._lock:
+            old = self._plans.pop(key, None)
+            if old is not None:
+                # Another thread inserted the same plan in the meantime.
+                self._curr_memsize -= old.work_size
+            self._evict(work_size)
+            self._plans[key] = plan
+            self._curr_memsize += work_size
+        return plan
+
+    def _evict(self, incoming):
+        # Must be called with the lock held.
+        plans = self._plans
+        if self._size == 0:
+            self._evictions += len(plans)
+            plans.clear()
+            self._curr_memsize = 0
+            return
+        n = 1 if incoming else 0
+        while plans and (
+                (self._size != -1 and len(plans) + n > self._size) or
+                (self._memsize != -1 and
+                 self._curr_memsize + incoming > self._memsize)):
+            _, plan = plans.popitem(last=False)
+            self._curr_memsize -= plan.work_size
+            self._evictions += 1
+
+    def clear(self):
+        """Removes all cached plans and resets the statistics."""
+        with self._lock:
+            self._plans.clear()
+            self._curr_memsize = 0
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def get_info(self):
+        """Returns the statistics of the cache.
+
+        Returns:
+            dict: A dictionary with the keys ``size``, ``memsize``,
+            ``n_plans``, ``curr_memsize``, ``hits``, ``misses`` and
+            ``evictions``.
+
+        """
+        with self._lock:
+            return {
+                'size': self._size,
+                'memsize': self._memsize,
+                'n_plans': len(self._plans),
+                'curr_memsize': self._curr_memsize,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
+
+    def keys(self):
+        """Returns the keys of cached plans from the least recently used.
+
+        Each key is a tuple of ``(shape, fft_type, batch, stream_ptr)``.
+
+        """
+        with self._lock:
+            return list(self._plans.keys())
+
+
+_plan_caches = {}
+_plan_caches_lock = threading.Lock()
+
+
+def get_plan_cache(device_id=None):
+    """Returns the cuFFT plan cache of a device.
+
+    Args:
+        device_id (int): Device ID. The current device is used if ``None``.
+
+    Returns:
+        cupy.fft.cache.PlanCache: The plan cache of the device.
+
+    """
+    if device_id is None:
+        device_id = device.get_device_id()
+    cache = _plan_caches.get(device_id)
+    if cache is None:
+        with _plan_caches_lock:
+            cache = _plan_caches.get(device_id)
+            if cache is None:
+                cache = PlanCache()
+                _plan_caches[device_id] = cache
+    return cache
+
+
+def clear_plan_cache():
+    """Removes all cached cuFFT plans of all devices."""
+    for cache in list(_plan_caches.values()):
+        cache.clear()
@@ -0,0 +1,3 @@
+# If True, multi-dimensional transforms over the trailing axes of an array are
+# executed with a single cuFFT N-D plan instead of one 1-D plan per axis.
+enable_nd_planning = True
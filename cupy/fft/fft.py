@@ -3,7 +3,10 @@ import six
 import numpy as np
 
 import cupy
+from cupy import internal
 from cupy.cuda import cufft
+from cupy.fft import cache
+from cupy.fft import config
 
 
 def _convert_dtype(a, value_type):
@@ -60,42 +63,155 @@ def _convert_fft_type(a, value_type):
         return cufft.CUFFT_Z2D
 
 
-def _exec_fft(a, direction, value_type, norm, axis, out_size=None):
+def _get_output_shape_and_dtype(shape, dtype, value_type, axis=-1,
+                                out_size=None):
+    # Returns the shape and the dtype of the output of a transform whose
+    # real axis is ``axis``. ``dtype`` must be already converted by
+    # _convert_dtype.
+    shape = list(shape)
+    dtype = np.dtype(dtype)
+    if value_type == 'R2C':
+        shape[axis] = shape[axis] // 2 + 1
+        dtype = np.dtype(np.complex64 if dtype == np.float32
+                         else np.complex128)
+    elif value_type == 'C2R':
+        shape[axis] = out_size
+        dtype = np.dtype(np.float32 if dtype == np.complex64
+                         else np.float64)
+    return tuple(shape), dtype
+
+
+def _check_output_array(out, shape, dtype):
+    if not isinstance(out, cupy.ndarray):
+        raise TypeError('out must be a cupy.ndarray')
+    if out.shape != shape:
+        raise ValueError(
+            'out has an invalid shape: expected %s, got %s'
+            % (shape, out.shape))
+    if out.dtype != dtype:
+        raise TypeError(
+            'out has an invalid dtype: expected %s, got %s'
+            % (dtype, out.dtype))
+
+
+def _can_exec_inplace(a, value_type, overwrite_x):
+    # cuFFT can run C2C transforms in-place on a contiguous input. Real
+    # transforms need a padded layout and are always done out-of-place.
+    return (overwrite_x and value_type == 'C2C' and a.base is None and
+            a.flags.c_contiguous)
+
+
+def _get_output_array(plan, a, value_type, overwrite_x, out, out_size):
+    # Returns the array the plan writes into. If it differs from ``out``,
+    # the caller must copy the result into ``out``.
+    if out is not None:
+        if out.flags.c_contiguous:
+            return out
+        shape, dtype = _get_output_shape_and_dtype(
+            a.shape, a.dtype, value_type, out_size=out_size)
+        return cupy.empty(shape, dtype)
+    if _can_exec_inplace(a, value_type, overwrite_x):
+        return a
+    return plan.get_output_array(a)
+
+
+def _exec_fft(a, direction, value_type, norm, axis, overwrite_x,
+              out_size=None, out=None):
     fft_type = _convert_fft_type(a, value_type)
+    out_orig = out
 
     if axis % a.ndim != a.ndim - 1:
         a = a.swapaxes(axis, -1)
+        if out is not None:
+            out = out.swapaxes(axis, -1)
 
     if a.base is not None:
         a = a.copy()
 
-    plan = cufft.Plan1d(a.shape[-1] if out_size is None else out_size,
-                        fft_type, a.size // a.shape[-1])
-    out = plan.get_output_array(a)
-    plan.fft(a, out, direction)
+    plan = cache.get_plan_cache().get_plan(
+        a.shape[-1] if out_size is None else out_size,
+        fft_type, a.size // a.shape[-1])
+    result = _get_output_array(plan, a, value_type, overwrite_x, out,
+                               out_size)
+    plan.fft(a, result, direction)
 
-    sz = out.shape[-1]
+    sz = result.shape[-1]
     if fft_type == cufft.CUFFT_R2C or fft_type == cufft.CUFFT_D2Z:
         sz = a.shape[-1]
     if norm is None:
         if direction == cufft.CUFFT_INVERSE:
-            out /= sz
+            result /= sz
     else:
-        out /= cupy.sqrt(sz)
+        result /= cupy.sqrt(sz)
+
+    if out is not None:
+        if result is not out:
+            out[...] = result
+        return out_orig
 
     if axis % a.ndim != a.ndim - 1:
-        out = out.swapaxes(axis, -1)
+        result = result.swapaxes(axis, -1)
 
-    return out
+    return result
 
 
-def _fft_c2c(a, direction, norm, axes):
-    for axis in axes:
-        a = _exec_fft(a, direction, 'C2C', norm, axis)
+def _exec_fftn(a, direction, value_type, norm, ndim, overwrite_x, out=None):
+    fft_type = _convert_fft_type(a, value_type)
+
+    if a.base is not None or not a.flags.c_contiguous:
+        a = a.copy()
+
+    shape = a.shape[-ndim:]
+    batch = a.size // internal.prod(shape)
+
+    plan = cache.get_plan_cache().get_plan(shape, fft_type, batch)
+    result = _get_output_array(plan, a, value_type, overwrite_x, out, None)
+    plan.fft(a, result, direction)
+
+    sz = internal.prod(shape)
+    if norm is None:
+        if direction == cufft.CUFFT_INVERSE:
+            result /= sz
+    else:
+        result /= cupy.sqrt(sz)
+
+    if out is not None and result is not out:
+        out[...] = result
+        return out
+
+    return result
+
+
+def _nd_plan_is_possible(axes, ndim, value_type):
+    # A single N-D plan can be used when the axes are the trailing dimensions
+    # of the array. For R2C transforms the last axis must be the real one.
+    # C2R transforms always use the per-axis path because cuFFT assumes
+    # Hermitian symmetry over all the axes, unlike NumPy.
+    if value_type == 'C2R':
+        return False
+    n_axes = len(axes)
+    if not 1 < n_axes <= 3:
+        return False
+    axes = [axis % ndim for axis in axes]
+    if sorted(axes) != list(six.moves.range(ndim - n_axes, ndim)):
+        return False
+    return value_type == 'C2C' or axes[-1] == ndim - 1
+
+
+def _fft_c2c(a, direction, norm, axes, overwrite_x, out=None):
+    for i, axis in enumerate(axes):
+        if i == len(axes) - 1:
+            a = _exec_fft(a, direction, 'C2C', norm, axis, overwrite_x,
+                          out=out)
+        else:
+            a = _exec_fft(a, direction, 'C2C', norm, axis, overwrite_x)
+        # The following passes work on the temporary output of this pass.
+        overwrite_x = True
     return a
 
 
-def _fft(a, s, axes, norm, direction, value_type='C2C'):
+def _fft(a, s, axes, norm, direction, value_type='C2C', out=None,
+         overwrite_x=False):
     if norm not in (None, 'ortho'):
         raise ValueError('Invalid norm value %s, should be None or \"ortho\".'
                          % norm)
@@ -109,6 +225,7 @@ def _fft(a, s, axes, norm, direction, value_type='C2C'):
     if (s is not None) and (axes is not None) and len(s) != len(axes):
         raise ValueError("Shape and axes have different lengths.")
 
+    x = a
     a = _convert_dtype(a, value_type)
     if axes is None:
         if s is None:
@@ -117,24 +234,53 @@ def _fft(a, s, axes, norm, direction, value_type='C2C'):
             dim = len(s)
         axes = [i for i in six.moves.range(-dim, 0)]
     a = _cook_shape(a, s, axes, value_type)
-
-    if value_type == 'C2C':
-        a = _fft_c2c(a, direction, norm, axes)
+    if a is not x and a.base is None:
+        # The input is already a temporary array owned by this function.
+        overwrite_x = True
+
+    if (config.enable_nd_planning and a.size != 0 and
+            _nd_plan_is_possible(axes, a.ndim, value_type)):
+        if out is not None:
+            shape, dtype = _get_output_shape_and_dtype(
+                a.shape, a.dtype, value_type)
+            _check_output_array(out, shape, dtype)
+        a = _exec_fftn(a, direction, value_type, norm, len(axes),
+                       overwrite_x, out)
+    elif value_type == 'C2C':
+        if out is not None:
+            _check_output_array(out, a.shape, a.dtype)
+        a = _fft_c2c(a, direction, norm, axes, overwrite_x, out)
     elif value_type == 'R2C':
-        a = _exec_fft(a, direction, value_type, norm, axes[-1])
-        a = _fft_c2c(a, direction, norm, axes[:-1])
+        if out is not None:
+            shape, dtype = _get_output_shape_and_dtype(
+                a.shape, a.dtype, value_type, axes[-1])
+            _check_output_array(out, shape, dtype)
+        if len(axes) == 1:
+            a = _exec_fft(a, direction, value_type, norm, axes[-1],
+                          overwrite_x, out=out)
+        else:
+            a = _exec_fft(a, direction, value_type, norm, axes[-1],
+                          overwrite_x)
+            a = _fft_c2c(a, direction, norm, axes[:-1], True, out)
     else:
-        a = _fft_c2c(a, direction, norm, axes[:-1])
         if (s is None) or (s[-1] is None):
             out_size = a.shape[axes[-1]] * 2 - 2
         else:
             out_size = s[-1]
-        a = _exec_fft(a, direction, value_type, norm, axes[-1], out_size)
+        if out is not None:
+            shape, dtype = _get_output_shape_and_dtype(
+                a.shape, a.dtype, value_type, axes[-1], out_size)
+            _check_output_array(out, shape, dtype)
+        if len(axes) > 1:
+            a = _fft_c2c(a, direction, norm, axes[:-1], overwrite_x)
+            overwrite_x = True
+        a = _exec_fft(a, direction, value_type, norm, axes[-1], overwrite_x,
+                      out_size, out)
 
     return a
 
 
-def fft(a, n=None, axis=-1, norm=None):
+def fft(a, n=None, axis=-1, norm=None, overwrite_x=False, out=None):
     """Compute the one-dimensional FFT.
 
     Args:
@@ -144,6 +290,10 @@ def fft(a, n=None, axis=-1, norm=None):
             ``axis`` is used.
         axis (int): Axis over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -152,10 +302,11 @@ def fft(a, n=None, axis=-1, norm=None):
 
     .. seealso:: :func:`numpy.fft.fft`
     """
-    return _fft(a, (n,), (axis,), norm, cupy.cuda.cufft.CUFFT_FORWARD)
+    return _fft(a, (n,), (axis,), norm, cupy.cuda.cufft.CUFFT_FORWARD,
+                out=out, overwrite_x=overwrite_x)
 
 
-def ifft(a, n=None, axis=-1, norm=None):
+def ifft(a, n=None, axis=-1, norm=None, overwrite_x=False, out=None):
     """Compute the one-dimensional inverse FFT.
 
     Args:
@@ -165,6 +316,10 @@ def ifft(a, n=None, axis=-1, norm=None):
             ``axis`` is used.
         axis (int): Axis over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -173,10 +328,11 @@ def ifft(a, n=None, axis=-1, norm=None):
 
     .. seealso:: :func:`numpy.fft.ifft`
     """
-    return _fft(a, (n,), (axis,), norm, cufft.CUFFT_INVERSE)
+    return _fft(a, (n,), (axis,), norm, cufft.CUFFT_INVERSE,
+                out=out, overwrite_x=overwrite_x)
 
 
-def fft2(a, s=None, axes=(-2, -1), norm=None):
+def fft2(a, s=None, axes=(-2, -1), norm=None, overwrite_x=False, out=None):
     """Compute the two-dimensional FFT.
 
     Args:
@@ -186,6 +342,10 @@ def fft2(a, s=None, axes=(-2, -1), norm=None):
             axes specified by ``axes`` are used.
         axes (tuple of ints): Axes over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -194,10 +354,11 @@ def fft2(a, s=None, axes=(-2, -1), norm=None):
 
     .. seealso:: :func:`numpy.fft.fft2`
     """
-    return _fft(a, s, axes, norm, cufft.CUFFT_FORWARD)
+    return _fft(a, s, axes, norm, cufft.CUFFT_FORWARD,
+                out=out, overwrite_x=overwrite_x)
 
 
-def ifft2(a, s=None, axes=(-2, -1), norm=None):
+def ifft2(a, s=None, axes=(-2, -1), norm=None, overwrite_x=False, out=None):
     """Compute the two-dimensional inverse FFT.
 
     Args:
@@ -207,6 +368,10 @@ def ifft2(a, s=None, axes=(-2, -1), norm=None):
             axes specified by ``axes`` are used.
         axes (tuple of ints): Axes over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -215,10 +380,11 @@ def ifft2(a, s=None, axes=(-2, -1), norm=None):
 
     .. seealso:: :func:`numpy.fft.ifft2`
     """
-    return _fft(a, s, axes, norm, cufft.CUFFT_INVERSE)
+    return _fft(a, s, axes, norm, cufft.CUFFT_INVERSE,
+                out=out, overwrite_x=overwrite_x)
 
 
-def fftn(a, s=None, axes=None, norm=None):
+def fftn(a, s=None, axes=None, norm=None, overwrite_x=False, out=None):
     """Compute the N-dimensional FFT.
 
     Args:
@@ -228,6 +394,10 @@ def fftn(a, s=None, axes=None, norm=None):
             axes specified by ``axes`` are used.
         axes (tuple of ints): Axes over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -236,10 +406,11 @@ def fftn(a, s=None, axes=None, norm=None):
 
     .. seealso:: :func:`numpy.fft.fftn`
     """
-    return _fft(a, s, axes, norm, cufft.CUFFT_FORWARD)
+    return _fft(a, s, axes, norm, cufft.CUFFT_FORWARD,
+                out=out, overwrite_x=overwrite_x)
 
 
-def ifftn(a, s=None, axes=None, norm=None):
+def ifftn(a, s=None, axes=None, norm=None, overwrite_x=False, out=None):
     """Compute the N-dimensional inverse FFT.
 
     Args:
@@ -249,6 +420,10 @@ def ifftn(a, s=None, axes=None, norm=None):
             axes specified by ``axes`` are used.
         axes (tuple of ints): Axes over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -257,10 +432,11 @@ def ifftn(a, s=None, axes=None, norm=None):
 
     .. seealso:: :func:`numpy.fft.ifftn`
     """
-    return _fft(a, s, axes, norm, cufft.CUFFT_INVERSE)
+    return _fft(a, s, axes, norm, cufft.CUFFT_INVERSE,
+                out=out, overwrite_x=overwrite_x)
 
 
-def rfft(a, n=None, axis=-1, norm=None):
+def rfft(a, n=None, axis=-1, norm=None, overwrite_x=False, out=None):
     """Compute the one-dimensional FFT for real input.
 
     Args:
@@ -270,6 +446,10 @@ def rfft(a, n=None, axis=-1, norm=None):
             the axis specified by ``axis`` is used.
         axis (int): Axis over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -279,10 +459,11 @@ def rfft(a, n=None, axis=-1, norm=None):
 
     .. seealso:: :func:`numpy.fft.rfft`
     """
-    return _fft(a, (n,), (axis,), norm, cufft.CUFFT_FORWARD, 'R2C')
+    return _fft(a, (n,), (axis,), norm, cufft.CUFFT_FORWARD, 'R2C',
+                out=out, overwrite_x=overwrite_x)
 
 
-def irfft(a, n=None, axis=-1, norm=None):
+def irfft(a, n=None, axis=-1, norm=None, overwrite_x=False, out=None):
     """Compute the one-dimensional inverse FFT for real input.
 
     Args:
@@ -293,6 +474,10 @@ def irfft(a, n=None, axis=-1, norm=None):
             along the axis specified by ``axis``.
         axis (int): Axis over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -303,10 +488,11 @@ def irfft(a, n=None, axis=-1, norm=None):
 
     .. seealso:: :func:`numpy.fft.irfft`
     """
-    return _fft(a, (n,), (axis,), norm, cufft.CUFFT_INVERSE, 'C2R')
+    return _fft(a, (n,), (axis,), norm, cufft.CUFFT_INVERSE, 'C2R',
+                out=out, overwrite_x=overwrite_x)
 
 
-def rfft2(a, s=None, axes=(-2, -1), norm=None):
+def rfft2(a, s=None, axes=(-2, -1), norm=None, overwrite_x=False, out=None):
     """Compute the two-dimensional FFT for real input.
 
     Args:
@@ -316,6 +502,10 @@ def rfft2(a, s=None, axes=(-2, -1), norm=None):
             ``axes`` are used.
         axes (tuple of ints): Axes over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -325,10 +515,11 @@ def rfft2(a, s=None, axes=(-2, -1), norm=None):
 
     .. seealso:: :func:`numpy.fft.rfft2`
     """
-    return _fft(a, s, axes, norm, cufft.CUFFT_FORWARD, 'R2C')
+    return _fft(a, s, axes, norm, cufft.CUFFT_FORWARD, 'R2C',
+                out=out, overwrite_x=overwrite_x)
 
 
-def irfft2(a, s=None, axes=(-2, -1), norm=None):
+def irfft2(a, s=None, axes=(-2, -1), norm=None, overwrite_x=False, out=None):
     """Compute the two-dimensional inverse FFT for real input.
 
     Args:
@@ -338,6 +529,10 @@ def irfft2(a, s=None, axes=(-2, -1), norm=None):
             specified by ``axes``.
         axes (tuple of ints): Axes over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -349,10 +544,11 @@ def irfft2(a, s=None, axes=(-2, -1), norm=None):
 
     .. seealso:: :func:`numpy.fft.irfft2`
     """
-    return _fft(a, s, axes, norm, cufft.CUFFT_INVERSE, 'C2R')
+    return _fft(a, s, axes, norm, cufft.CUFFT_INVERSE, 'C2R',
+                out=out, overwrite_x=overwrite_x)
 
 
-def rfftn(a, s=None, axes=None, norm=None):
+def rfftn(a, s=None, axes=None, norm=None, overwrite_x=False, out=None):
     """Compute the N-dimensional FFT for real input.
 
     Args:
@@ -362,6 +558,10 @@ def rfftn(a, s=None, axes=None, norm=None):
             ``axes`` are used.
         axes (tuple of ints): Axes over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -371,10 +571,11 @@ def rfftn(a, s=None, axes=None, norm=None):
 
     .. seealso:: :func:`numpy.fft.rfftn`
     """
-    return _fft(a, s, axes, norm, cufft.CUFFT_FORWARD, 'R2C')
+    return _fft(a, s, axes, norm, cufft.CUFFT_FORWARD, 'R2C',
+                out=out, overwrite_x=overwrite_x)
 
 
-def irfftn(a, s=None, axes=None, norm=None):
+def irfftn(a, s=None, axes=None, norm=None, overwrite_x=False, out=None):
     """Compute the N-dimensional inverse FFT for real input.
 
     Args:
@@ -384,6 +585,10 @@ def irfftn(a, s=None, axes=None, norm=None):
             specified by ``axes``.
         axes (tuple of ints): Axes over which to compute the FFT.
         norm (None or ``"ortho"``): Keyword to specify the normalization mode.
+        overwrite_x (bool): If ``True``, the contents of ``a`` can be
+            destroyed and its buffer may be reused for the output.
+        out (cupy.ndarray): Array to store the result. Its shape and dtype
+            must match those of the transformed array.
 
     Returns:
         cupy.ndarray:
@@ -395,7 +600,8 @@ def irfftn(a, s=None, axes=None, norm=None):
 
     .. seealso:: :func:`numpy.fft.irfftn`
     """
-    return _fft(a, s, axes, norm, cufft.CUFFT_INVERSE, 'C2R')
+    return _fft(a, s, axes, norm, cufft.CUFFT_INVERSE, 'C2R',
+                out=out, overwrite_x=overwrite_x)
 
 
 def hfft(a, n=None, axis=-1, norm=None):
@@ -1,5 +1,4 @@
 import numpy
-import six
 
 from cupy import core
 
@@ -49,31 +48,7 @@ def prod(a, axis=None, dtype=None, out=None, keepdims=False):
 # TODO(okuta): Implement nansum
 
 
-def _axis_to_first(x, axis):
-    if axis < 0:
-        axis = x.ndim + axis
-    trans = [axis] + [a for a in six.moves.range(x.ndim) if a != axis]
-    pre = list(six.moves.range(1, axis + 1))
-    succ = list(six.moves.range(axis + 1, x.ndim))
-    revert = pre + [0] + succ
-    return trans, revert
-
-
-def _proc_as_batch(proc, x, axis):
-    trans, revert = _axis_to_first(x, axis)
-    t = x.transpose(trans)
-    s = t.shape
-    r = t.reshape(x.shape[axis], -1)
-    pos = 1
-    size = r.size
-    batch = r.shape[1]
-    while pos < size:
-        proc(pos, batch, r, size=size)
-        pos <<= 1
-    return r.reshape(s).transpose(revert)
-
-
-def _cum_core(a, axis, dtype, out, kern, batch_kern):
+def _cum_core(a, axis, dtype, out, kern):
     if out is None:
         if dtype is None:
             kind = a.dtype.kind
@@ -85,47 +60,16 @@ def _cum_core(a, axis, dtype, out, kern, batch_kern):
                 dtype = numpy.dtype('L')
             else:
                 dtype = a.dtype
+        if axis is None:
+            out = core.ndarray((a.size,), dtype)
+        else:
+            out = core.ndarray(a.shape, dtype)
 
-        out = a.astype(dtype)
-    else:
-        out[...] = a
-
-    if axis is None:
-        out = out.ravel()
-    elif not (-a.ndim <= axis < a.ndim):
-        raise core.core._AxisError('axis(={}) out of bounds'.format(axis))
-    else:
-        return _proc_as_batch(batch_kern, out, axis=axis)
-
-    pos = 1
-    while pos < out.size:
-        kern(pos, out, size=out.size)
-        pos <<= 1
-    return out
-
-
-_cumsum_batch_kern = core.ElementwiseKernel(
-    'int64 pos, int64 batch', 'raw T x',
-    '''
-    ptrdiff_t b = i % batch;
-    ptrdiff_t j = i / batch;
-    if (j & pos) {
-      const ptrdiff_t dst_index[] = {j, b};
-      const ptrdiff_t src_index[] = {j ^ pos | (pos - 1), b};
-      x[dst_index] += x[src_index];
-    }
-    ''',
-    'cumsum_batch_kernel'
-)
-_cumsum_kern = core.ElementwiseKernel(
-    'int64 pos', 'raw T x',
-    '''
-    if (i & pos) {
-      x[i] += x[i ^ pos | (pos - 1)];
-    }
-    ''',
-    'cumsum_kernel'
-)
+    return kern(a, out, axis=axis)
+
+
+_cumsum_kern = core.ScanKernel(
+    'T x', 'U y', 'x', 'a + b', 'y = a', '0', 'cupy_cumsum')
 
 
 def cumsum(a, axis=None, dtype=None, out=None):
@@ -144,31 +88,11 @@ def cumsum(a, axis=None, dtype=None, out=None):
     .. seealso:: :func:`numpy.cumsum`
 
     """
-    return _cum_core(a, axis, dtype, out, _cumsum_kern, _cumsum_batch_kern)
-
-
-_cumprod_batch_kern = core.ElementwiseKernel(
-    'int64 pos, int64 batch', 'raw T x',
-    '''
-    ptrdiff_t b = i % batch;
-    ptrdiff_t j = i / batch;
-    if (j & pos) {
-      const ptrdiff_t dst_index[] = {j, b};
-      const ptrdiff_t src_index[] = {j ^ pos | (pos - 1), b};
-      x[dst_index] *= x[src_index];
-    }
-    ''',
-    'cumprod_batch_kernel'
-)
-_cumprod_kern = core.ElementwiseKernel(
-    'int64 pos', 'raw T x',
-    '''
-    if (i & pos) {
-      x[i] *= x[i ^ pos | (pos - 1)];
-    }
-    ''',
-    'cumprod_kernel'
-)
+    return _cum_core(a, axis, dtype, out, _cumsum_kern)
+
+
+_cumprod_kern = core.ScanKernel(
+    'T x', 'U y', 'x', 'a * b', 'y = a', '1', 'cupy_cumprod')
 
 
 def cumprod(a, axis=None, dtype=None, out=None):
@@ -187,7 +111,7 @@ def cumprod(a, axis=None, dtype=None, out=None):
     .. seealso:: :func:`numpy.cumprod`
 
     """
-    return _cum_core(a, axis, dtype, out, _cumprod_kern, _cumprod_batch_kern)
+    return _cum_core(a, axis, dtype, out, _cumprod_kern)
 
 
 # TODO(okuta): Implement diff
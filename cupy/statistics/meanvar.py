@@ -1,3 +1,6 @@
+from cupy import core
+
+
 # TODO(okuta): Implement median
 
 
@@ -72,6 +75,33 @@ def std(a, axis=None, dtype=None, out=None, ddof=0, keepdims=False):
                  keepdims=keepdims)
 
 
+def mean_var(a, axis=None, dtype=None, ddof=0, keepdims=False):
+    """Returns the mean and the variance along an axis.
+
+    The mean and the variance are computed in a single pass over the input
+    by Welford's algorithm, which reads the input once and is more robust
+    against cancellation than subtracting the mean in a second pass.
+    :func:`cupy.var` and :func:`cupy.std` use the same algorithm.
+
+    Args:
+        a (cupy.ndarray): Array to compute the mean and the variance.
+        axis (int): Along which axis to compute them. The flattened array is
+            used by default.
+        dtype: Data type specifier.
+        ddof (int): Delta degrees of freedom of the variance.
+        keepdims (bool): If ``True``, the axis is remained as an axis of
+            size one.
+
+    Returns:
+        tuple: The mean and the variance of the input array along the axis.
+
+    .. seealso:: :func:`cupy.mean`, :func:`cupy.var`
+
+    """
+    return core.mean_var(a, axis=axis, dtype=dtype, ddof=ddof,
+                         keepdims=keepdims)
+
+
 # TODO(okuta): Implement nanmean
 
 
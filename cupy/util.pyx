@@ -2,6 +2,7 @@
 
 import atexit
 import functools
+import os
 import warnings
 
 import cupy
@@ -11,7 +12,84 @@ from cupy.cuda cimport device
 cdef list _memos = []
 
 
-def memoize(bint for_each_device=False):
+cdef class _Memo:
+
+    # Memoized results of a function. Each entry is a list of the result and
+    # the tick of its last use, which is only updated if the memo is bounded.
+
+    cdef:
+        readonly str name
+        readonly Py_ssize_t maxsize
+        readonly Py_ssize_t hits
+        readonly Py_ssize_t misses
+        readonly Py_ssize_t evictions
+        dict _entries
+        unsigned long long _tick
+
+    def __init__(self, str name, Py_ssize_t maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = {}
+        self._tick = 0
+
+    cdef _add(self, key, result):
+        self.misses += 1
+        if self.maxsize == 0:
+            return
+        self._tick += 1
+        self._entries[key] = [result, self._tick]
+        if 0 < self.maxsize < len(self._entries):
+            self._evict()
+
+    cdef _evict(self):
+        # This loop does not run Python code, so that other threads cannot
+        # modify the entries during the iteration.
+        cdef unsigned long long tick, min_tick = self._tick + 1
+        cdef list entry
+        victim = None
+        for key, entry in self._entries.items():
+            tick = entry[1]
+            if tick < min_tick:
+                min_tick = tick
+                victim = key
+        del self._entries[victim]
+        self.evictions += 1
+
+    cpdef set_maxsize(self, Py_ssize_t maxsize):
+        cdef dict entries = self._entries
+        cdef Py_ssize_t n
+        self.maxsize = maxsize
+        n = len(entries) - maxsize
+        if maxsize < 0 or n <= 0:
+            return
+        # The ticks are unique, so the keys are never compared.
+        victims = sorted([(entry[1], key) for key, entry in entries.items()])
+        for _, key in victims[:n]:
+            del entries[key]
+        self.evictions += n
+
+    cpdef clear(self, device_id):
+        cdef dict entries = self._entries
+        if device_id is None:
+            entries.clear()
+            return
+        for key in [k for k in entries if k[0] == device_id]:
+            del entries[key]
+
+    cpdef dict stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': None if self.maxsize < 0 else self.maxsize,
+        }
+
+
+def memoize(bint for_each_device=False, maxsize=None):
     """Makes a function memoizing the result for each argument and device.
 
     This decorator provides automatic memoization of the function result.
@@ -20,36 +98,141 @@ def memoize(bint for_each_device=False):
         for_each_device (bool): If ``True``, it memoizes the results for each
             device. Otherwise, it memoizes the results only based on the
             arguments.
+        maxsize (int): The maximum number of memoized results. When a new
+            result is memoized beyond the limit, the least recently used one
+            is discarded. ``None`` means that the number of results is not
+            limited.
 
     """
+    if maxsize is not None and maxsize < 0:
+        raise ValueError('maxsize must be non-negative: {}'.format(maxsize))
+
     def decorator(f):
-        memo = {}
+        memo = _Memo('{}.{}'.format(f.__module__, f.__name__),
+                     -1 if maxsize is None else maxsize)
         _memos.append(memo)
 
         @functools.wraps(f)
         def ret(*args, **kwargs):
             cdef int id = -1
-            cdef dict m = memo
+            cdef _Memo m = memo
+            cdef list entry
             if for_each_device:
                 id = device.get_device_id()
             arg_key = (id, args, frozenset(kwargs.items()))
-            if arg_key in m:
-                result = m[arg_key]
-            else:
-                result = f(*args, **kwargs)
-                m[arg_key] = result
+            entry = m._entries.get(arg_key)
+            if entry is not None:
+                m.hits += 1
+                if m.maxsize > 0:
+                    m._tick += 1
+                    entry[1] = m._tick
+                return entry[0]
+            result = f(*args, **kwargs)
+            m._add(arg_key, result)
             return result
 
+        ret._memo = memo
         return ret
 
     return decorator
 
 
+def get_kernel_memo_maxsize():
+    """Returns the maximum number of kernels memoized by each kernel getter.
+
+    The kernel getters of :class:`~cupy.ElementwiseKernel`,
+    :class:`~cupy.ReductionKernel`, :class:`~cupy.ScanKernel` and the
+    universal and reduction functions memoize the compiled kernels for each
+    combination of the argument types and layouts. The limit of each of them
+    is read from the ``CUPY_KERNEL_MEMO_MAXSIZE`` environment variable when
+    CuPy is imported, which is 1024 by default. ``0`` means that the number
+    of kernels is not limited.
+
+    Returns:
+        int: The limit, or ``None`` if the number of kernels is not limited.
+
+    """
+    val = os.environ.get('CUPY_KERNEL_MEMO_MAXSIZE')
+    if not val:
+        return 1024
+    try:
+        maxsize = int(val)
+    except ValueError:
+        raise ValueError(
+            'CUPY_KERNEL_MEMO_MAXSIZE must be an integer: {}'.format(val))
+    if maxsize < 0:
+        raise ValueError(
+            'CUPY_KERNEL_MEMO_MAXSIZE must be non-negative: {}'.format(val))
+    return maxsize or None
+
+
+cdef list _get_memos(func):
+    if func is None:
+        return _memos
+    try:
+        return [func._memo]
+    except AttributeError:
+        raise TypeError('{} is not memoized'.format(func))
+
+
+def set_memo_maxsize(maxsize, func=None):
+    """Changes the maximum number of memoized results.
+
+    The least recently used results beyond the new limit are discarded.
+
+    Args:
+        maxsize (int): The maximum number of results. ``None`` means that the
+            number of results is not limited.
+        func (callable): A function decorated by :func:`memoize`. If
+            ``None``, the limits of all functions decorated by
+            :func:`memoize` are changed.
+
+    """
+    cdef _Memo memo
+    if maxsize is not None and maxsize < 0:
+        raise ValueError('maxsize must be non-negative: {}'.format(maxsize))
+    for memo in _get_memos(func):
+        memo.set_maxsize(-1 if maxsize is None else maxsize)
+
+
 @atexit.register
-def clear_memo():
-    """Clears the memoized results for all functions decorated by memoize."""
+def clear_memo(func=None, device_id=None):
+    """Clears the memoized results.
+
+    Args:
+        func (callable): A function decorated by :func:`memoize`. If
+            ``None``, the results of all functions decorated by
+            :func:`memoize` are cleared.
+        device_id (int): If given, only the results memoized for the device
+            by functions with ``for_each_device=True`` are cleared.
+
+    """
+    cdef _Memo memo
+    for memo in _get_memos(func):
+        memo.clear(device_id)
+
+
+def memo_stats():
+    """Returns the statistics of the functions decorated by :func:`memoize`.
+
+    Returns:
+        dict: A dictionary from the name of each function to a dictionary
+        with the keys ``hits``, ``misses``, ``evictions``, ``size`` and
+        ``maxsize``. The counts of functions with the same name are summed
+        up.
+
+    """
+    cdef _Memo memo
+    ret = {}
     for memo in _memos:
-        memo.clear()
+        stats = memo.stats()
+        total = ret.get(memo.name)
+        if total is None:
+            ret[memo.name] = stats
+        else:
+            for key in ('hits', 'misses', 'evictions', 'size'):
+                total[key] += stats[key]
+    return ret
 
 
 def experimental(api_name):
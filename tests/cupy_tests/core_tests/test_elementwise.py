@@ -130,3 +130,74 @@ class TestElementwiseType(unittest.TestCase):
         a = xp.array([xp.iinfo(dtype).min + 1], dtype=dtype)
         b = xp.int8(-1)
         return a + b
+
+
+@testing.gpu
+class TestUfuncLaunchCache(unittest.TestCase):
+
+    def setUp(self):
+        self.ufunc = core.create_ufunc(
+            'my_sub', ('ii->i', 'ff->f', 'dd->d'), 'out0 = in0 - in1')
+
+    def check(self, *args, **kwargs):
+        expected = [self.ufunc(*args, **kwargs) for _ in range(2)]
+        self.assertEqual(len(self.ufunc._launch_cache), 1)
+        actual = self.ufunc(*args, **kwargs)
+        for e in expected:
+            testing.assert_array_equal(actual, e)
+        return actual
+
+    def test_contiguous(self):
+        a = testing.shaped_arange((2, 3), dtype=numpy.float32)
+        b = testing.shaped_reverse_arange((2, 3), dtype=numpy.float32)
+        out = self.check(a, b)
+        testing.assert_array_equal(out, a.get() - b.get())
+
+    def test_broadcast_and_strides(self):
+        a = testing.shaped_arange((4, 6), dtype=numpy.float64)[:, ::2]
+        b = testing.shaped_arange((1, 3), dtype=numpy.float64)
+        out = self.check(a, b)
+        testing.assert_array_equal(out, a.get() - b.get())
+
+    def test_out(self):
+        a = testing.shaped_arange((5,), dtype=numpy.int32)
+        out = cupy.empty((5,), dtype=numpy.int32)
+        ret = self.check(a, a, out=out)
+        self.assertIs(ret, out)
+        testing.assert_array_equal(out, numpy.zeros(5))
+
+    def test_new_output_per_call(self):
+        a = testing.shaped_arange((5,), dtype=numpy.int32)
+        self.assertIsNot(self.ufunc(a, a), self.ufunc(a, a))
+
+    def test_layouts(self):
+        a = testing.shaped_arange((2, 3), dtype=numpy.float32)
+        self.ufunc(a, a)
+        self.ufunc(a.T, a.T)
+        self.ufunc(a.astype(numpy.float64), a)
+        self.assertEqual(len(self.ufunc._launch_cache), 3)
+
+    def test_scalar_not_cached(self):
+        a = testing.shaped_arange((5,), dtype=numpy.int32)
+        testing.assert_array_equal(self.ufunc(a, 1), numpy.arange(5))
+        self.assertEqual(len(self.ufunc._launch_cache), 0)
+
+    def test_zero_size_not_cached(self):
+        a = cupy.empty((0,), dtype=numpy.int32)
+        self.ufunc(a, a)
+        self.assertEqual(len(self.ufunc._launch_cache), 0)
+
+    def test_disabled(self):
+        a = testing.shaped_arange((5,), dtype=numpy.int32)
+        self.ufunc._use_launch_cache = False
+        testing.assert_array_equal(self.ufunc(a, a), numpy.zeros(5))
+        self.assertEqual(len(self.ufunc._launch_cache), 0)
+
+    @testing.multi_gpu(2)
+    def test_other_device(self):
+        with cuda.Device(0):
+            a = testing.shaped_arange((5,), dtype=numpy.int32)
+            self.ufunc(a, a)
+        with cuda.Device(1):
+            with self.assertRaises(ValueError):
+                self.ufunc(a, a)
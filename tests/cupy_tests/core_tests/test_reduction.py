@@ -1,5 +1,6 @@
 import unittest
 
+import numpy
 import six
 
 import cupy
@@ -100,6 +101,193 @@ class TestReductionKernel(unittest.TestCase):
         self.check_int8_sum((512 + 1, 256 * 256 + 1), axis=1)
 
 
+@testing.gpu
+class TestTwoStageReduction(unittest.TestCase):
+
+    _multiprocess_can_split_ = True
+
+    def setUp(self):
+        self.my_sum = core.ReductionKernel(
+            'T x', 'T out', 'x', 'a + b', 'out = a', '0', 'my_sum')
+
+    @testing.for_all_dtypes(no_bool=True, no_float16=True)
+    @testing.numpy_cupy_allclose(rtol=1e-4)
+    def test_sum_all(self, xp, dtype):
+        a = testing.shaped_random((1 << 20,), xp, dtype)
+        return a.sum()
+
+    @testing.numpy_cupy_allclose(rtol=1e-5)
+    def test_sum_axis(self, xp):
+        a = testing.shaped_random((1 << 16, 5), xp, 'd')
+        return a.sum(axis=0)
+
+    @testing.numpy_cupy_allclose(rtol=1e-5)
+    def test_sum_keepdims(self, xp):
+        a = testing.shaped_random((3, 1 << 16), xp, 'f')
+        return a.sum(axis=1, keepdims=True)
+
+    @testing.numpy_cupy_allclose()
+    def test_mean(self, xp):
+        a = testing.shaped_random((1 << 20,), xp, 'd')
+        return a.mean()
+
+    @testing.numpy_cupy_array_equal()
+    def test_max(self, xp):
+        a = testing.shaped_random((1 << 20,), xp, 'f')
+        return a.max()
+
+    @testing.numpy_cupy_array_equal()
+    def test_argmax(self, xp):
+        a = xp.zeros((1 << 20,), 'f')
+        a[12345] = 1
+        a[(1 << 20) - 1] = 1
+        return a.argmax()
+
+    @testing.numpy_cupy_array_equal()
+    def test_argmin_axis(self, xp):
+        a = testing.shaped_random((1 << 16, 3), xp, 'i')
+        return a.argmin(axis=0)
+
+    @testing.numpy_cupy_allclose(rtol=1e-5)
+    def test_reduction_kernel(self, xp):
+        a = testing.shaped_random((1 << 20,), xp, 'd')
+        if xp is cupy:
+            return self.my_sum(a)
+        return a.sum()
+
+
+class TestReductionLaunchConfig(unittest.TestCase):
+
+    def test_full_reduction(self):
+        self.assertEqual(
+            core.core._get_reduction_launch_config(1 << 20, 1, 512),
+            (1, 128))
+        self.assertEqual(
+            core.core._get_reduction_launch_config(1 << 30, 1, 512),
+            (1, 256))
+
+    def test_small_input(self):
+        self.assertEqual(
+            core.core._get_reduction_launch_config(1000, 1, 512), (1, 1))
+        self.assertEqual(
+            core.core._get_reduction_launch_config(0, 1, 512), (256, 1))
+
+    def test_many_outputs(self):
+        # Outputs fill the device without splitting the reduced axis.
+        self.assertEqual(
+            core.core._get_reduction_launch_config(
+                1 << 26, 1 << 20, 512), (8, 1))
+        self.assertEqual(
+            core.core._get_reduction_launch_config(
+                1 << 20, 1 << 20, 512), (512, 1))
+
+    def test_few_outputs(self):
+        self.assertEqual(
+            core.core._get_reduction_launch_config(1 << 24, 4, 512),
+            (1, 64))
+
+    def test_parameters(self):
+        self.assertEqual(
+            core.core._get_reduction_launch_config(
+                1 << 20, 1, 512, target_blocks=16), (1, 16))
+        self.assertEqual(
+            core.core._get_reduction_launch_config(
+                1 << 20, 1, 512, min_iterations=1024), (1, 2))
+
+    def test_segments(self):
+        for in_size, out_size in ((1 << 26, 1), (1 << 24, 100),
+                                  (1 << 22, 1000), (12345678, 3)):
+            block_stride, n_segments = \
+                core.core._get_reduction_launch_config(
+                    in_size, out_size, 512)
+            n_blocks = -(-out_size // block_stride)
+            self.assertLessEqual(n_blocks * n_segments, 256)
+            # Each thread reduces at least 16 elements of a segment.
+            reduce_size = in_size // out_size
+            self.assertGreaterEqual(
+                reduce_size // n_segments // (512 // block_stride), 16)
+
+    def test_partial_itemsize(self):
+        get_partial_itemsize = core.core._get_partial_itemsize
+        self.assertEqual(get_partial_itemsize('float', ()), 4)
+        self.assertEqual(get_partial_itemsize('complex<double>', ()), 16)
+        self.assertEqual(
+            get_partial_itemsize('T', (('T', numpy.int16),)), 2)
+        # Types other than scalars are given the maximum size.
+        self.assertEqual(
+            get_partial_itemsize('welford_st<T>', (('T', numpy.float64),)),
+            32)
+
+    def test_block_stride(self):
+        for reduce_size, block_stride in ((1, 512), (2, 256), (3, 128),
+                                          (512, 1), (1000, 1)):
+            self.assertEqual(
+                core.core._get_block_stride(reduce_size, 512), block_stride)
+
+
+class TestReductionKernelSource(unittest.TestCase):
+
+    def _source(self, **kwargs):
+        source = core.core._get_simple_reduction_kernel_source(
+            'my_sum', 512, 'float', 'CArray<float, 1> _raw_in0', '0',
+            'in0', 'a + b', 'out0 = a', '', 'const float in0 = 0;',
+            'float &out0 = _raw_out0[_i];', '', **kwargs)
+        self.assertNotIn('$', source)
+        return source
+
+    def test_warp_shuffle(self):
+        source = self._source()
+        self.assertIn('__shfl_down_sync(0xffffffff, words[k], delta)', source)
+        self.assertIn('_s = REDUCE(_s, _shfl_down(_s, _offset));', source)
+        self.assertIn('_k < 512 / 32 * _block_stride', source)
+        self.assertNotIn('_REDUCE(256);', source)
+
+    def test_shared_memory(self):
+        source = self._source(warp_shuffle=False)
+        self.assertIn('_REDUCE(256);', source)
+        self.assertIn('_REDUCE(1);', source)
+        self.assertNotIn('_shfl_down', source)
+
+    def test_shared_memory_size(self):
+        for warp_shuffle in (True, False):
+            source = self._source(warp_shuffle=warp_shuffle)
+            self.assertIn('char _sdata_raw[\n          sizeof(_type_reduce) '
+                          '* 512]', source)
+            self.assertNotIn('extern __shared__', source)
+
+    def test_int32_index(self):
+        source = self._source()
+        self.assertIn('int _i = _i_base + _tid % _block_stride;', source)
+        self.assertIn('int _J = _J_offset', source)
+        self.assertNotIn('long long _i', source)
+
+    def test_int64_index(self):
+        source = self._source(int64_index=True)
+        self.assertIn(
+            'long long _i = _i_base + _tid % _block_stride;', source)
+        self.assertIn('long long _J = _J_offset', source)
+        self.assertIn('long long _j_offset', source)
+
+    def test_two_stage(self):
+        source = self._source(stage=1)
+        self.assertIn('_seg = blockIdx.x % _n_segments', source)
+        self.assertIn('sizeof(_type_reduce) <= 32 ? 1 : -1', source)
+        self.assertIn('_partials_data[_seg * (long long)_out_ind.size() + _i]'
+                      ' = _s;', source)
+        self.assertNotIn('POST_MAP(_s);', source)
+        source = self._source(stage=2)
+        self.assertIn('_type_reduce _a = _partials_data[_j];', source)
+        self.assertIn('POST_MAP(_s);', source)
+        self.assertNotIn('_in_ind.set(_j);', source)
+
+    def test_use_int64_index(self):
+        self.assertFalse(core.core._use_int64_index(1 << 20, 512))
+        self.assertFalse(core.core._use_int64_index(
+            (0x7fffffff - 512) // 3, 512))
+        self.assertTrue(core.core._use_int64_index(
+            (0x7fffffff - 512) // 3 + 1, 512))
+
+
 @testing.gpu
 class TestReductionKernelInvalidArgument(unittest.TestCase):
 
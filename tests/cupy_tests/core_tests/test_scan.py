@@ -2,6 +2,8 @@
 
 import unittest
 
+import numpy
+
 import cupy
 from cupy import cuda
 from cupy import testing
@@ -53,3 +55,122 @@ class TestScan(unittest.TestCase):
 
         cupy.core.core.scan(a, a)
         testing.assert_array_equal(a, expect)
+
+
+@testing.parameterize(*testing.product({
+    'shape_axis': [((5,), None), ((3, 4), None), ((40, 50), None),
+                   ((3000,), 0), ((3, 4), 1), ((2, 3000), 1),
+                   ((3000, 3), 0), ((4, 5, 6), 1)],
+    'exclusive': [False, True],
+}))
+@testing.gpu
+class TestScanKernel(unittest.TestCase):
+
+    @testing.for_all_dtypes(no_bool=True, no_float16=True)
+    def test_sum(self, dtype):
+        shape, axis = self.shape_axis
+        kern = cupy.ScanKernel(
+            'T x', 'T y', 'x', 'a + b', 'y = a', '0', 'my_scan')
+        a = testing.shaped_random(shape, numpy, dtype)
+        out = kern(cupy.asarray(a), axis=axis, exclusive=self.exclusive)
+        expect = numpy.cumsum(a, axis=axis, dtype=dtype)
+        if self.exclusive:
+            expect -= a.ravel() if axis is None else a
+        testing.assert_allclose(out, expect, rtol=1e-4)
+
+    def test_non_commutative(self):
+        # Forward fill of zeros, which depends on the order of the operands.
+        shape, axis = self.shape_axis
+        kern = cupy.ScanKernel(
+            'T x', 'T y', 'x', 'b != 0 ? b : a', 'y = a', '0', 'my_fill')
+        a = testing.shaped_random(shape, numpy, numpy.int32, scale=3)
+        out = kern(cupy.asarray(a), axis=axis, exclusive=self.exclusive)
+        if axis is None:
+            a = a.ravel()
+            axis = 0
+        a = numpy.moveaxis(a, axis, 0)
+        expect = numpy.zeros_like(a)
+        last = numpy.zeros_like(a[0])
+        for i in range(a.shape[0]):
+            if self.exclusive:
+                expect[i] = last
+            last = numpy.where(a[i] != 0, a[i], last)
+            if not self.exclusive:
+                expect[i] = last
+        testing.assert_array_equal(out, numpy.moveaxis(expect, 0, axis))
+
+
+@testing.gpu
+class TestScanKernelCall(unittest.TestCase):
+
+    def setUp(self):
+        self.kern = cupy.ScanKernel(
+            'T x', 'U y', 'x', 'a + b', 'y = a', '0', 'my_scan')
+
+    def test_dtype_promotion(self):
+        a = cupy.full((1000,), 100, dtype=numpy.int8)
+        out = self.kern(a, cupy.empty((1000,), dtype=numpy.int64))
+        testing.assert_array_equal(out, numpy.arange(1, 1001) * 100)
+
+    def test_broadcast_out(self):
+        a = cupy.ones((3, 1), dtype=numpy.float32)
+        out = self.kern(cupy.broadcast_to(a, (3, 2000)),
+                        cupy.empty((3, 2000), numpy.float32), axis=1)
+        testing.assert_array_equal(out, numpy.tile(numpy.arange(1, 2001),
+                                                   (3, 1)))
+
+    def test_zero_size(self):
+        a = cupy.empty((0, 3), dtype=numpy.float32)
+        out = self.kern(a, cupy.empty((0, 3), numpy.float32), axis=1)
+        self.assertEqual(out.shape, (0, 3))
+
+    def test_invalid_axis(self):
+        a = cupy.ones((3, 4), dtype=numpy.float32)
+        with self.assertRaises(cupy.core.core._AxisError):
+            self.kern(a, cupy.empty((3, 4), numpy.float32), axis=2)
+
+    def test_wrong_out_shape(self):
+        a = cupy.ones((3, 4), dtype=numpy.float32)
+        with self.assertRaises(ValueError):
+            self.kern(a, cupy.empty((3, 4), numpy.float32))
+
+
+class TestScanKernelSource(unittest.TestCase):
+
+    def _source(self, stage, exclusive=False):
+        source = cupy.core.core._get_simple_scan_kernel_source(
+            'my_scan', 256, 4, 'float', 'CArray<float, 1> _raw_x', '0',
+            'x', 'a + b', 'y = a', '', 'const float x = _raw_x[_j];',
+            'float &y = _raw_y[_j];', '', stage, exclusive)
+        self.assertNotIn('$', source)
+        return source
+
+    def test_single_pass(self):
+        source = self._source(0)
+        self.assertIn('_type_scan _p = _type_scan(0);', source)
+        self.assertIn('POST_MAP(_sitems[_k]);', source)
+        self.assertNotIn('_carries', source)
+
+    def test_reduce_tiles(self):
+        source = self._source(1)
+        self.assertIn('_carries_data[blockIdx.x] = _sval[_tid];', source)
+        self.assertNotIn('POST_MAP(_sitems[_k]);', source)
+        self.assertIn('sizeof(_type_scan) <= 32 ? 1 : -1', source)
+
+    def test_scan_carries(self):
+        source = self._source(2)
+        self.assertIn('_base += 256 * 16', source)
+        self.assertNotIn('_sitems', source)
+
+    def test_scan_tiles(self):
+        source = self._source(3)
+        self.assertIn('_type_scan _p = _carries_data[blockIdx.x];', source)
+
+    def test_exclusive(self):
+        source = self._source(0, exclusive=True)
+        self.assertIn('_sitems[_k] = _p;\n        _p = SCAN(_p, _v);', source)
+
+    def test_shared_memory_size(self):
+        source = self._source(0)
+        self.assertIn('sizeof(_type_scan) * 1024]', source)
+        self.assertNotIn('extern __shared__', source)
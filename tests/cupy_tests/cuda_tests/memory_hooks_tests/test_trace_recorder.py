@@ -0,0 +1,78 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import cupy.cuda
+from cupy.cuda import memory
+from cupy.cuda import memory_hooks
+from cupy.cuda.memory_hooks import trace_recorder
+from cupy import testing
+
+
+@testing.gpu
+class TestTraceRecorderHook(unittest.TestCase):
+
+    def setUp(self):
+        self.io = io.BytesIO()
+        self.hook = memory_hooks.TraceRecorderHook(self.io, buffer_size=2)
+        self.pool = memory.MemoryPool()
+
+    def test_record(self):
+        device_id = 0
+        stream = cupy.cuda.Stream()
+        with cupy.cuda.Device(device_id):
+            with self.hook:
+                mem = self.pool.malloc(1)
+                ptr1 = mem.ptr
+                del mem
+                with stream:
+                    mem = self.pool.malloc(600)
+                    ptr2 = mem.ptr
+                del mem
+        self.io.seek(0)
+        events = memory_hooks.load_trace(self.io)
+        self.assertEqual(
+            [(e.op, e.device_id, e.size, e.ptr, e.stream) for e in events],
+            [(trace_recorder.MALLOC, device_id, 1, ptr1, 0),
+             (trace_recorder.FREE, device_id, 512, ptr1, 0),
+             (trace_recorder.MALLOC, device_id, 600, ptr2, stream.ptr),
+             (trace_recorder.FREE, device_id, 1024, ptr2, 0)])
+        timestamps = [e.timestamp for e in events]
+        self.assertEqual(sorted(timestamps), timestamps)
+
+    def test_zero_size(self):
+        with cupy.cuda.Device(0):
+            with self.hook:
+                self.pool.malloc(0)
+        self.io.seek(0)
+        self.assertEqual(memory_hooks.load_trace(self.io), [])
+
+    def test_path(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, 'trace.bin')
+            with cupy.cuda.Device(0):
+                with memory_hooks.TraceRecorderHook(path):
+                    mem = self.pool.malloc(1)
+                    del mem
+            events = memory_hooks.load_trace(path)
+            self.assertEqual(len(events), 2)
+        finally:
+            shutil.rmtree(tempdir)
+
+
+class TestLoadTrace(unittest.TestCase):
+
+    def test_invalid_header(self):
+        with self.assertRaises(ValueError):
+            memory_hooks.load_trace(io.BytesIO(b'invalid trace'))
+
+    def test_truncated(self):
+        data = trace_recorder._MAGIC + trace_recorder._RECORD.pack(
+            trace_recorder.MALLOC, 0, 0, 1, 1, 0)
+        events = memory_hooks.load_trace(io.BytesIO(data))
+        self.assertEqual(len(events), 1)
+        with self.assertRaises(ValueError):
+            memory_hooks.load_trace(io.BytesIO(data[:-1]))
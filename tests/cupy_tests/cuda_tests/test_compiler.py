@@ -1,3 +1,4 @@
+import threading
 import unittest
 
 import mock
@@ -92,3 +93,227 @@ class TestIsValidKernelName(unittest.TestCase):
 
     def test_space(self):
         self.assertFalse(compiler.is_valid_kernel_name('invalid name'))
+
+
+class TestCompileWithCacheMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.memory_cache = compiler.get_memory_cache()
+        self.memory_cache.clear()
+
+    def tearDown(self):
+        self.memory_cache.clear()
+
+    def test_memory_hit_does_not_touch_disk(self):
+        arch = 'compute_30'
+        self.memory_cache.put(
+            (arch, ('-ftz=true',), 'source', None), b'cubin')
+        with mock.patch('cupy.cuda.function.Module') as module, \
+                mock.patch('cupy.cuda.kernel_cache.get_cache') as get_cache:
+            mod = compiler.compile_with_cache('source', arch=arch)
+        self.assertIs(mod, module.return_value)
+        mod.load.assert_called_once_with(b'cubin')
+        self.assertFalse(get_cache.called)
+        self.assertEqual(self.memory_cache.stats()['hits'], 1)
+
+
+class TestGetCacheKey(unittest.TestCase):
+
+    def setUp(self):
+        compiler.get_memory_cache().clear()
+
+    def tearDown(self):
+        compiler.get_memory_cache().clear()
+
+    def test_same_as_compile_with_cache(self):
+        arch = 'compute_30'
+        with mock.patch('cupy.cuda.compiler._get_nvrtc_version',
+                        return_value=(9, 0)), \
+                mock.patch('cupy.cuda.compiler._preprocess',
+                           return_value='base'), \
+                mock.patch('cupy.cuda.function.Module'), \
+                mock.patch('cupy.cuda.kernel_cache.get_cache') as get_cache:
+            get_cache.return_value.load.return_value = b'cubin'
+            compiler.compile_with_cache(
+                'source', ('-O3',), arch=arch, extra_source='extra')
+            key = compiler.get_cache_key(
+                'source', ('-O3',), arch=arch, extra_source='extra')
+        get_cache.return_value.load.assert_called_once_with(key)
+        self.assertTrue(key.endswith('_2.cubin'))
+
+
+class TestInFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.in_flight = compiler._InFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+
+    def _compile(self, result=b'cubin', error=None):
+        def func():
+            self.calls.append(result)
+            self.started.set()
+            self.release.wait()
+            if error is not None:
+                raise error
+            return result
+        return func
+
+    def _run_in_thread(self, key, func):
+        results = []
+
+        def target():
+            try:
+                results.append(self.in_flight.run(key, func))
+            except Exception as e:
+                results.append(e)
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        return thread, results
+
+    def test_run(self):
+        self.release.set()
+        self.assertEqual(self.in_flight.run('key', self._compile()), b'cubin')
+        self.assertEqual(len(self.in_flight), 0)
+
+    def test_wait_for_same_key(self):
+        owner, owner_results = self._run_in_thread('key', self._compile())
+        self.started.wait()
+        waiter, waiter_results = self._run_in_thread(
+            'key', self._compile(b'other'))
+        self.release.set()
+        owner.join()
+        waiter.join()
+        self.assertEqual(self.calls, [b'cubin'])
+        self.assertEqual(owner_results, [b'cubin'])
+        self.assertEqual(waiter_results, [b'cubin'])
+        self.assertEqual(len(self.in_flight), 0)
+
+    def test_different_keys(self):
+        self.release.set()
+        self.in_flight.run('key1', self._compile(b'a'))
+        self.in_flight.run('key2', self._compile(b'b'))
+        self.assertEqual(self.calls, [b'a', b'b'])
+
+    def test_error(self):
+        error = ValueError('error')
+        owner, owner_results = self._run_in_thread(
+            'key', self._compile(error=error))
+        self.started.wait()
+        waiter, waiter_results = self._run_in_thread('key', self._compile())
+        self.release.set()
+        owner.join()
+        waiter.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertIs(owner_results[0], error)
+        self.assertIs(waiter_results[0], error)
+        self.assertEqual(len(self.in_flight), 0)
+
+
+class DummyExecutor(object):
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, *args):
+        self.submitted.append(args)
+        f = compiler.futures.Future()
+        f.set_result(func(*args))
+        return f
+
+
+@unittest.skipUnless(compiler._futures_available,
+                     'concurrent.futures is not available')
+class TestAsyncCompiler(unittest.TestCase):
+
+    def setUp(self):
+        compiler.get_memory_cache().clear()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.ptx_calls = []
+        mock.patch('cupy.cuda.compiler._get_nvrtc_version',
+                   return_value=(9, 0)).start()
+        mock.patch('cupy.cuda.compiler._preprocess',
+                   return_value='base').start()
+        mock.patch('cupy.cuda.compiler.compile_using_nvrtc',
+                   side_effect=self._compile_ptx).start()
+        mock.patch('cupy.cuda.device.get_device_id', return_value=0).start()
+        mock.patch('cupy.cuda.device.Device').start()
+        mock.patch('cupy.cuda.function.Module').start()
+        mock.patch('cupy.cuda.function.LinkState').start()
+        get_cache = mock.patch('cupy.cuda.kernel_cache.get_cache').start()
+        self.cache = get_cache.return_value
+        self.cache.load.return_value = None
+
+    def tearDown(self):
+        self.release.set()
+        mock.patch.stopall()
+        compiler.get_memory_cache().clear()
+
+    def _compile_ptx(self, source, options, arch):
+        self.ptx_calls.append(source)
+        self.started.set()
+        self.release.wait()
+        return 'ptx'
+
+    def test_submit_many(self):
+        self.release.set()
+        with compiler.AsyncCompiler(4) as c:
+            fs = c.submit_many(['a', 'b', 'c'], arch='compute_30')
+            for f in fs:
+                f.result()
+        self.assertEqual(sorted(self.ptx_calls), ['a', 'b', 'c'])
+        self.assertEqual(self.cache.save.call_count, 3)
+
+    def test_deduplicate_in_flight(self):
+        with compiler.AsyncCompiler(4) as c:
+            f1 = c.submit('a', arch='compute_30')
+            f2 = c.submit('a', arch='compute_30')
+            self.release.set()
+            f1.result()
+            f2.result()
+        self.assertEqual(self.ptx_calls, ['a'])
+        self.assertEqual(self.cache.save.call_count, 1)
+
+    def test_compile_with_cache_waits(self):
+        with compiler.AsyncCompiler(1) as c:
+            f = c.submit('a', arch='compute_30')
+            self.started.wait()
+            thread = threading.Thread(
+                target=compiler.compile_with_cache, args=('a',),
+                kwargs={'arch': 'compute_30'})
+            thread.start()
+            self.release.set()
+            f.result()
+            thread.join()
+        self.assertEqual(self.ptx_calls, ['a'])
+
+    def test_process_executor(self):
+        self.release.set()
+        executor = DummyExecutor()
+        with compiler.AsyncCompiler(1, process_executor=executor) as c:
+            c.submit('a', ('-O3',), arch='compute_30').result()
+        self.assertEqual(
+            executor.submitted, [('a', ('-O3', '-ftz=true'), 'compute_30')])
+
+    def test_error(self):
+        self.release.set()
+        with mock.patch('cupy.cuda.compiler.compile_using_nvrtc',
+                        side_effect=compiler.CompileException(
+                            'error', 'a', 'kern', ())):
+            with compiler.AsyncCompiler(1) as c:
+                f = c.submit('a', arch='compute_30')
+                with self.assertRaises(compiler.CompileException):
+                    f.result()
+
+
+class TestCompileException(unittest.TestCase):
+
+    def test_pickle(self):
+        e = compiler.CompileException('msg', 'source', 'name', ('-O3',))
+        e2 = six.moves.cPickle.loads(six.moves.cPickle.dumps(e))
+        self.assertEqual(e2.get_message(), 'msg')
+        self.assertEqual(e2.source, 'source')
+        self.assertEqual(e2.options, ('-O3',))
@@ -0,0 +1,395 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import six
+
+from cupy.cuda import kernel_cache
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+class TestMemoryCache(unittest.TestCase):
+
+    def test_get_and_put(self):
+        cache = kernel_cache.MemoryCache(2)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', b'cubin')
+        self.assertEqual(cache.get('a'), b'cubin')
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['total_size'], 5)
+
+    def test_lru_eviction(self):
+        cache = kernel_cache.MemoryCache(2)
+        cache.put('a', b'a')
+        cache.put('b', b'b')
+        cache.get('a')
+        cache.put('c', b'c')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), b'a')
+        self.assertEqual(cache.get('c'), b'c')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_disabled(self):
+        cache = kernel_cache.MemoryCache(0)
+        cache.put('a', b'a')
+        self.assertEqual(len(cache), 0)
+
+    def test_set_max_entries(self):
+        cache = kernel_cache.MemoryCache(2)
+        cache.put('a', b'a')
+        cache.put('b', b'b')
+        cache.set_max_entries(1)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get('b'), b'b')
+        with self.assertRaises(ValueError):
+            cache.set_max_entries(-1)
+
+    def test_clear(self):
+        cache = kernel_cache.MemoryCache(2)
+        cache.put('a', b'a')
+        cache.get('a')
+        cache.clear()
+        self.assertEqual(cache.stats()['n_entries'], 0)
+        self.assertEqual(cache.stats()['hits'], 0)
+
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _cache(self, max_size=0):
+        return kernel_cache.FileCache(
+            self.cache_dir, max_size=max_size, clock=self.clock)
+
+    def test_save_and_load(self):
+        cache = self._cache()
+        self.assertIsNone(cache.load('a_2.cubin'))
+        cache.save('a_2.cubin', b'cubin')
+        self.assertEqual(cache.load('a_2.cubin'), b'cubin')
+        stats = cache.stats()
+        self.assertEqual(stats['n_entries'], 1)
+        self.assertEqual(stats['total_size'], 32 + 5)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_file_format(self):
+        # The format must be compatible with caches written by older versions
+        self._cache().save('a_2.cubin', b'cubin')
+        with open(os.path.join(self.cache_dir, 'a_2.cubin'), 'rb') as f:
+            data = f.read()
+        self.assertEqual(data[32:], b'cubin')
+
+    def test_corrupted(self):
+        cache = self._cache()
+        cache.save('a_2.cubin', b'cubin')
+        with open(os.path.join(self.cache_dir, 'a_2.cubin'), 'r+b') as f:
+            f.seek(32)
+            f.write(b'x')
+        self.assertIsNone(cache.load('a_2.cubin'))
+
+    def test_save_source(self):
+        self._cache().save('a_2.cubin', b'cubin', 'source')
+        with open(os.path.join(self.cache_dir, 'a_2.cubin.cu')) as f:
+            self.assertEqual(f.read(), 'source')
+
+    def test_lru_eviction(self):
+        cache = self._cache(max_size=3 * (32 + 5))
+        for name in ('a', 'b', 'c'):
+            cache.save(name + '_2.cubin', b'cubin')
+        # Access `a` so that `b` becomes the least recently used entry
+        cache.load('a_2.cubin')
+        cache.save('d_2.cubin', b'cubin')
+        self.assertFalse(
+            os.path.exists(os.path.join(self.cache_dir, 'b_2.cubin')))
+        for name in ('a', 'c', 'd'):
+            self.assertEqual(cache.load(name + '_2.cubin'), b'cubin')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_evicts_source(self):
+        cache = self._cache(max_size=32 + 5)
+        cache.save('a_2.cubin', b'cubin', 'source')
+        cache.save('b_2.cubin', b'cubin')
+        self.assertFalse(
+            os.path.exists(os.path.join(self.cache_dir, 'a_2.cubin.cu')))
+
+    def test_keeps_new_entry(self):
+        cache = self._cache(max_size=1)
+        cache.save('a_2.cubin', b'cubin')
+        self.assertEqual(cache.load('a_2.cubin'), b'cubin')
+
+    def test_index(self):
+        self._cache().save('a_2.cubin', b'cubin')
+        with open(os.path.join(self.cache_dir, 'index.json')) as f:
+            index = json.load(f)
+        self.assertEqual(index['entries']['a_2.cubin'][0], 32 + 5)
+
+    def test_index_shared_between_instances(self):
+        self._cache().save('a_2.cubin', b'cubin')
+        self._cache().save('b_2.cubin', b'cubin')
+        self.assertEqual(self._cache().stats()['n_entries'], 2)
+
+    def test_index_flush_interval(self):
+        cache = kernel_cache.FileCache(
+            self.cache_dir, max_size=0, clock=self.clock, flush_interval=100)
+        cache.save('a_2.cubin', b'cubin')
+        cache.save('b_2.cubin', b'cubin')
+        # The second save is not written to the index until flushed
+        self.assertEqual(self._cache().stats()['n_entries'], 1)
+        cache.flush()
+        self.assertEqual(self._cache().stats()['n_entries'], 2)
+
+    def test_total_size(self):
+        cache = self._cache(max_size=2 * (32 + 5))
+        cache.save('a_2.cubin', b'cubin')
+        cache.save('a_2.cubin', b'cubin')
+        self.assertEqual(cache.total_size(), 32 + 5)
+        cache.save('b_2.cubin', b'cubin')
+        cache.save('c_2.cubin', b'cubin')
+        self.assertEqual(cache.total_size(), 2 * (32 + 5))
+        os.remove(os.path.join(self.cache_dir, 'b_2.cubin'))
+        cache.load('b_2.cubin')
+        self.assertEqual(cache.total_size(), 32 + 5)
+
+    def test_rebuild_index(self):
+        self._cache().save('a_2.cubin', b'cubin')
+        with open(os.path.join(self.cache_dir, 'index.json'), 'w') as f:
+            f.write('broken')
+        self.assertEqual(self._cache().stats()['n_entries'], 1)
+
+    def test_prune(self):
+        cache = self._cache()
+        for name in ('a', 'b', 'c'):
+            cache.save(name + '_2.cubin', b'cubin')
+        evicted = cache.prune(32 + 5)
+        self.assertEqual(sorted(evicted), ['a_2.cubin', 'b_2.cubin'])
+        self.assertEqual(cache.stats()['n_entries'], 1)
+
+    def test_prune_finds_unindexed_files(self):
+        cache = self._cache()
+        cache.save('a_2.cubin', b'cubin')
+        shutil.copy(os.path.join(self.cache_dir, 'a_2.cubin'),
+                    os.path.join(self.cache_dir, 'b_2.cubin'))
+        cache.prune(0)
+        self.assertEqual(cache.stats()['n_entries'], 2)
+
+    def test_missing_file_is_removed_from_index(self):
+        cache = self._cache()
+        cache.save('a_2.cubin', b'cubin')
+        os.remove(os.path.join(self.cache_dir, 'a_2.cubin'))
+        self.assertIsNone(cache.load('a_2.cubin'))
+        self.assertEqual(cache.stats()['n_entries'], 0)
+
+
+class TestSqliteCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _cache(self, max_size=0, preload=False, fallback=True):
+        return kernel_cache.SqliteCache(
+            self.cache_dir, max_size=max_size, preload=preload,
+            fallback=fallback, clock=self.clock)
+
+    def test_save_and_load(self):
+        cache = self._cache()
+        self.assertIsNone(cache.load('a_2.cubin'))
+        cache.save('a_2.cubin', b'cubin')
+        self.assertEqual(cache.load('a_2.cubin'), b'cubin')
+        stats = cache.stats()
+        self.assertEqual(stats['backend'], 'sqlite')
+        self.assertEqual(stats['n_entries'], 1)
+        self.assertEqual(stats['total_size'], 5)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        cache.close()
+
+    def test_single_file(self):
+        cache = self._cache()
+        for name in ('a', 'b', 'c'):
+            cache.save(name + '_2.cubin', b'cubin')
+        cache.close()
+        self.assertEqual(os.listdir(self.cache_dir), ['kernel_cache.sqlite'])
+
+    def test_shared_between_connections(self):
+        cache1 = self._cache()
+        cache2 = self._cache()
+        cache1.save('a_2.cubin', b'cubin')
+        self.assertEqual(cache2.load('a_2.cubin'), b'cubin')
+        cache1.close()
+        cache2.close()
+
+    def test_corrupted(self):
+        cache = self._cache()
+        cache.save('a_2.cubin', b'cubin')
+        cache._connect().execute('UPDATE kernels SET crc = crc + 1')
+        self.assertIsNone(cache.load('a_2.cubin'))
+        cache.close()
+
+    def test_preload(self):
+        cache = self._cache()
+        cache.save('a_2.cubin', b'cubin')
+        cache.close()
+        cache = self._cache(preload=True)
+        self.assertEqual(cache.load('a_2.cubin'), b'cubin')
+        # Subsequent lookups do not touch the database.
+        cache._connect().execute('DELETE FROM kernels')
+        self.assertEqual(cache.load('a_2.cubin'), b'cubin')
+        cache.close()
+
+    def test_preload_finds_new_entry(self):
+        cache = self._cache(preload=True)
+        self.assertIsNone(cache.load('a_2.cubin'))
+        other = self._cache()
+        other.save('a_2.cubin', b'cubin')
+        other.close()
+        self.assertEqual(cache.load('a_2.cubin'), b'cubin')
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = self._cache(max_size=15)
+        for name in ('a', 'b', 'c'):
+            cache.save(name + '_2.cubin', b'cubin')
+        cache.load('a_2.cubin')
+        cache.save('d_2.cubin', b'cubin')
+        self.assertIsNone(cache.load('b_2.cubin'))
+        for name in ('a', 'c', 'd'):
+            self.assertEqual(cache.load(name + '_2.cubin'), b'cubin')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        cache.close()
+
+    def test_prune(self):
+        cache = self._cache()
+        for name in ('a', 'b', 'c'):
+            cache.save(name + '_2.cubin', b'cubin')
+        self.assertEqual(sorted(cache.prune(5)), ['a_2.cubin', 'b_2.cubin'])
+        self.assertEqual(cache.stats()['n_entries'], 1)
+        cache.close()
+
+    def _make_file_cache(self):
+        file_cache = kernel_cache.FileCache(self.cache_dir, max_size=0)
+        file_cache.save('a_2.cubin', b'cubin_a', 'source')
+        file_cache.save('b_2.cubin', b'cubin_b')
+
+    def test_fallback_to_files(self):
+        self._make_file_cache()
+        cache = self._cache()
+        self.assertEqual(cache.load('a_2.cubin'), b'cubin_a')
+        os.remove(os.path.join(self.cache_dir, 'a_2.cubin'))
+        self.assertEqual(cache.load('a_2.cubin'), b'cubin_a')
+        cache.close()
+
+    def test_no_fallback(self):
+        self._make_file_cache()
+        cache = self._cache(fallback=False)
+        self.assertIsNone(cache.load('a_2.cubin'))
+        cache.close()
+
+    def test_import_files(self):
+        self._make_file_cache()
+        cache = self._cache(fallback=False)
+        self.assertEqual(cache.import_files(), 2)
+        self.assertEqual(cache.load('a_2.cubin'), b'cubin_a')
+        self.assertEqual(cache.load('b_2.cubin'), b'cubin_b')
+        source = cache._connect().execute(
+            'SELECT source FROM kernels WHERE name = ?',
+            ('a_2.cubin',)).fetchone()[0]
+        self.assertEqual(source, 'source')
+        # Importing twice does not duplicate entries
+        self.assertEqual(cache.import_files(), 0)
+        cache.close()
+
+
+class TestGetCacheBackend(unittest.TestCase):
+
+    def test_default(self):
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertEqual(kernel_cache.get_cache_backend(), 'file')
+
+    def test_sqlite(self):
+        with mock.patch.dict(os.environ, {'CUPY_CACHE_BACKEND': 'sqlite'}):
+            self.assertEqual(kernel_cache.get_cache_backend(), 'sqlite')
+
+    def test_invalid(self):
+        with mock.patch.dict(os.environ, {'CUPY_CACHE_BACKEND': 'foo'}):
+            with self.assertRaises(ValueError):
+                kernel_cache.get_cache_backend()
+
+
+class TestGetCacheMaxSize(unittest.TestCase):
+
+    def test_default(self):
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertEqual(kernel_cache.get_cache_max_size(), 0)
+
+    def test_env(self):
+        with mock.patch.dict(os.environ, {'CUPY_CACHE_MAX_SIZE': '1024'}):
+            self.assertEqual(kernel_cache.get_cache_max_size(), 1024)
+
+    def test_invalid(self):
+        with mock.patch.dict(os.environ, {'CUPY_CACHE_MAX_SIZE': 'abc'}):
+            with self.assertRaises(ValueError):
+                kernel_cache.get_cache_max_size()
+        with mock.patch.dict(os.environ, {'CUPY_CACHE_MAX_SIZE': '-1'}):
+            with self.assertRaises(ValueError):
+                kernel_cache.get_cache_max_size()
+
+
+class TestMain(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_prune(self):
+        cache = kernel_cache.FileCache(self.cache_dir, max_size=0)
+        cache.save('a_2.cubin', b'cubin')
+        cache.save('b_2.cubin', b'cubin')
+        with mock.patch('sys.stdout', new_callable=six.StringIO) as out:
+            kernel_cache.main(
+                ['prune', '--dir', self.cache_dir, '--max-size', '0'])
+        self.assertIn('n_entries: 2', out.getvalue())
+        with mock.patch('sys.stdout', new_callable=six.StringIO) as out:
+            kernel_cache.main(
+                ['prune', '--dir', self.cache_dir, '--max-size', '40'])
+        self.assertIn('Evicted 1 entries', out.getvalue())
+        self.assertIn('n_entries: 1', out.getvalue())
+
+    def test_migrate(self):
+        kernel_cache.FileCache(self.cache_dir, max_size=0).save(
+            'a_2.cubin', b'cubin')
+        with mock.patch('sys.stdout', new_callable=six.StringIO) as out:
+            kernel_cache.main(['migrate', '--dir', self.cache_dir])
+        self.assertIn('Imported 1 entries', out.getvalue())
+        self.assertIn('backend: sqlite', out.getvalue())
+
+    def test_inspect(self):
+        kernel_cache.FileCache(self.cache_dir, max_size=0).save(
+            'a_2.cubin', b'cubin')
+        with mock.patch('sys.stdout', new_callable=six.StringIO) as out:
+            kernel_cache.main(['inspect', '--dir', self.cache_dir])
+        self.assertIn('total_size: 37', out.getvalue())
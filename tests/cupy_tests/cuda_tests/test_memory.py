@@ -1,8 +1,11 @@
 import ctypes
+import os
 import sys
 import threading
 import unittest
 
+import mock
+
 import cupy.cuda
 from cupy.cuda import memory
 from cupy.cuda import stream as stream_module
@@ -110,6 +113,13 @@ class TestSingleDeviceMemoryPool(unittest.TestCase):
         self.stream = stream_module.Stream()
         self.stream_ptr = self.stream.ptr
 
+    def test_device_id(self):
+        self.assertEqual(
+            self.pool._device_id, cupy.cuda.device.get_device_id())
+        pool = memory.SingleDeviceMemoryPool(allocator=mock_alloc,
+                                             device_id=1)
+        self.assertEqual(pool._device_id, 1)
+
     def test_round_size(self):
         self.assertEqual(self.pool._round_size(self.unit - 1), self.unit)
         self.assertEqual(self.pool._round_size(self.unit), self.unit)
@@ -400,6 +410,677 @@ class TestSingleDeviceMemoryPool(unittest.TestCase):
         self.assertEqual(self.unit * 6, self.pool.total_bytes())
         del p2
 
+    def test_get_stats(self):
+        p1 = self.pool.malloc(self.unit * 4)
+        p2 = self.pool.malloc(self.unit * 2)
+        del p1
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['used_bytes'], self.unit * 2)
+        self.assertEqual(stats['used_blocks'], 1)
+        self.assertEqual(stats['free_bytes'], self.unit * 4)
+        self.assertEqual(stats['free_blocks'], 1)
+        self.assertEqual(stats['total_bytes'], self.unit * 6)
+        self.assertEqual(stats['peak_used_bytes'], self.unit * 6)
+        self.assertEqual(stats['peak_total_bytes'], self.unit * 6)
+        self.assertEqual(stats['n_mallocs'], 2)
+        self.assertEqual(stats['n_frees'], 0)
+        self.assertEqual(stats['limit'], 0)
+
+        self.pool.free_all_blocks()
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['free_bytes'], 0)
+        self.assertEqual(stats['free_blocks'], 0)
+        self.assertEqual(stats['peak_total_bytes'], self.unit * 6)
+        self.assertEqual(stats['n_frees'], 1)
+        del p2
+
+    def test_get_stats_split_merge(self):
+        p = self.pool.malloc(self.unit * 4)
+        del p
+        head = self.pool.malloc(self.unit)
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['used_bytes'], self.unit)
+        self.assertEqual(stats['free_bytes'], self.unit * 3)
+        self.assertEqual(stats['free_blocks'], 1)
+        mid = self.pool.malloc(self.unit)
+        self.assertEqual(self.pool.n_free_blocks(), 1)
+        del head
+        self.assertEqual(self.pool.n_free_blocks(), 2)
+        del mid
+        # All the blocks are merged into the original one.
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['free_bytes'], self.unit * 4)
+        self.assertEqual(stats['free_blocks'], 1)
+        self.assertEqual(stats['used_blocks'], 0)
+        self.assertEqual(stats['n_mallocs'], 1)
+
+    def test_get_stats_stream(self):
+        p1 = self.pool.malloc(self.unit * 4)
+        with self.stream:
+            p2 = self.pool.malloc(self.unit * 2)
+        del p1
+        streams = self.pool.get_stats()['streams']
+        null_ptr = stream_module.Stream.null.ptr
+        self.assertEqual(streams[null_ptr], {
+            'used_bytes': 0, 'used_blocks': 0,
+            'free_bytes': self.unit * 4, 'free_blocks': 1})
+        self.assertEqual(streams[self.stream_ptr], {
+            'used_bytes': self.unit * 2, 'used_blocks': 1,
+            'free_bytes': 0, 'free_blocks': 0})
+        del p2
+        self.pool.free_all_blocks()
+        self.assertEqual(self.pool.get_stats()['streams'], {})
+
+    def test_counters_match_blocks(self):
+        ptrs = []
+        sizes = [1, 3, 2, 8, 1, 5, 2, 2]
+        for i in range(4):
+            for size in sizes:
+                ptrs.append(self.pool.malloc(self.unit * size))
+            del ptrs[::2]
+            if i % 2:
+                self.pool.free_all_blocks()
+        used = sum(p.mem.size for p in ptrs)
+        free_lists = [
+            free_list
+            for free_list in self.pool._arena(stream_module.Stream.null.ptr)
+            if free_list]
+        free = sum(chunk.size for free_list in free_lists
+                   for chunk in free_list)
+        n_free = sum(len(free_list) for free_list in free_lists)
+        self.assertEqual(self.pool.used_bytes(), used)
+        self.assertEqual(self.pool.free_bytes(), free)
+        self.assertEqual(self.pool.n_free_blocks(), n_free)
+
+
+class CountingAllocator(object):
+
+    def __init__(self):
+        self.sizes = []
+        self.fail = False
+
+    def __call__(self, size):
+        if self.fail:
+            raise ValueError('allocation failed')
+        self.sizes.append(size)
+        return mock_alloc(size)
+
+
+@testing.gpu
+class TestSingleDeviceMemoryPoolLimit(unittest.TestCase):
+
+    def setUp(self):
+        self.allocator = CountingAllocator()
+        self.pool = memory.SingleDeviceMemoryPool(allocator=self.allocator)
+        self.unit = self.pool._allocation_unit_size
+
+    def test_no_limit(self):
+        self.assertEqual(self.pool.get_limit(), 0)
+        p = self.pool.malloc(self.unit * 1024)
+        self.assertEqual(self.unit * 1024, self.pool.total_bytes())
+        del p
+
+    def test_set_limit_size(self):
+        self.pool.set_limit(size=self.unit * 4)
+        self.assertEqual(self.pool.get_limit(), self.unit * 4)
+        p1 = self.pool.malloc(self.unit * 2)
+        p2 = self.pool.malloc(self.unit * 2)
+        with self.assertRaises(memory.OutOfMemoryError):
+            self.pool.malloc(self.unit)
+        # The allocator is never called for the rejected request.
+        self.assertEqual(self.allocator.sizes, [self.unit * 2] * 2)
+        del p1, p2
+
+    def test_limit_frees_cached_blocks(self):
+        self.pool.set_limit(size=self.unit * 4)
+        p1 = self.pool.malloc(self.unit)
+        p2 = self.pool.malloc(self.unit * 2)
+        del p2
+        # The free block is too small to serve the request, so it is
+        # released to make room under the limit.
+        p3 = self.pool.malloc(self.unit * 3)
+        self.assertEqual(self.pool.n_free_blocks(), 0)
+        self.assertEqual(self.pool.total_bytes(), self.unit * 4)
+        self.assertEqual(self.allocator.sizes,
+                         [self.unit, self.unit * 2, self.unit * 3])
+        del p1, p3
+
+    def test_limit_split_blocks_are_kept(self):
+        self.pool.set_limit(size=self.unit * 4)
+        p = self.pool.malloc(self.unit * 4)
+        del p
+        head = self.pool.malloc(self.unit * 2)
+        with self.assertRaises(memory.OutOfMemoryError):
+            self.pool.malloc(self.unit * 3)
+        # The remaining split block is still usable.
+        tail = self.pool.malloc(self.unit * 2)
+        self.assertEqual(head.ptr + self.unit * 2, tail.ptr)
+        del head, tail
+
+    def test_limit_allocator_error(self):
+        self.pool.set_limit(size=self.unit * 4)
+        self.allocator.fail = True
+        with self.assertRaises(ValueError):
+            self.pool.malloc(self.unit * 4)
+        # The failed allocation does not count against the limit.
+        self.allocator.fail = False
+        p = self.pool.malloc(self.unit * 4)
+        del p
+
+    def test_set_limit_after_allocation(self):
+        p = self.pool.malloc(self.unit * 4)
+        self.pool.set_limit(size=self.unit * 2)
+        with self.assertRaises(memory.OutOfMemoryError):
+            self.pool.malloc(self.unit)
+        self.pool.set_limit(size=0)
+        self.pool.malloc(self.unit)
+        del p
+
+    def test_set_limit_fraction(self):
+        _, total = cupy.cuda.runtime.memGetInfo()
+        self.pool.set_limit(fraction=0.5)
+        self.assertEqual(self.pool.get_limit(), int(total * 0.5))
+        self.pool.set_limit(fraction=0)
+        self.assertEqual(self.pool.get_limit(), 0)
+
+    def test_set_limit_invalid(self):
+        with self.assertRaises(ValueError):
+            self.pool.set_limit(size=-1)
+        with self.assertRaises(ValueError):
+            self.pool.set_limit(fraction=1.5)
+        with self.assertRaises(ValueError):
+            self.pool.set_limit(size=1, fraction=0.5)
+
+    def test_limit_from_env(self):
+        with mock.patch.dict(os.environ, {'CUPY_GPU_MEMORY_LIMIT': '1024'}):
+            pool = memory.SingleDeviceMemoryPool(allocator=self.allocator)
+        self.assertEqual(pool.get_limit(), 1024)
+
+    def test_limit_fraction_from_env(self):
+        _, total = cupy.cuda.runtime.memGetInfo()
+        with mock.patch.dict(os.environ, {'CUPY_GPU_MEMORY_LIMIT': '25%'}):
+            pool = memory.SingleDeviceMemoryPool(allocator=self.allocator)
+        self.assertEqual(pool.get_limit(), int(total * 0.25))
+
+    def test_invalid_limit_from_env(self):
+        with mock.patch.dict(os.environ, {'CUPY_GPU_MEMORY_LIMIT': 'x'}):
+            with self.assertRaises(ValueError):
+                memory.SingleDeviceMemoryPool(allocator=self.allocator)
+
+
+@testing.gpu
+class TestSingleDeviceMemoryPoolSlab(unittest.TestCase):
+
+    def setUp(self):
+        self.allocator = CountingAllocator()
+        self.pool = memory.SingleDeviceMemoryPool(allocator=self.allocator)
+        self.unit = self.pool._allocation_unit_size
+        self.pool.set_slab_size(self.unit * 8)
+
+    def test_small_allocations(self):
+        p1 = self.pool.malloc(self.unit)
+        p2 = self.pool.malloc(self.unit * 2)
+        p3 = self.pool.malloc(self.unit * 3)
+        self.assertEqual(self.allocator.sizes, [self.unit * 8])
+        self.assertEqual(p1.ptr + self.unit, p2.ptr)
+        self.assertEqual(p2.ptr + self.unit * 2, p3.ptr)
+        self.assertEqual(self.pool.used_bytes(), self.unit * 6)
+        self.assertEqual(self.pool.free_bytes(), self.unit * 2)
+        del p1, p2, p3
+
+    def test_large_allocation(self):
+        p = self.pool.malloc(self.unit * 4)
+        self.assertEqual(self.allocator.sizes, [self.unit * 4])
+        self.assertEqual(self.pool.free_bytes(), 0)
+        del p
+
+    def test_threshold(self):
+        self.pool.set_slab_size(self.unit * 8, threshold=self.unit * 6)
+        p = self.pool.malloc(self.unit * 5)
+        self.assertEqual(self.allocator.sizes, [self.unit * 8])
+        del p
+
+    def test_free_all_blocks(self):
+        p1 = self.pool.malloc(self.unit)
+        p2 = self.pool.malloc(self.unit)
+        del p1
+        # The slab is not released while a part of it is in use.
+        self.pool.free_all_blocks()
+        self.assertEqual(self.pool.total_bytes(), self.unit * 8)
+        del p2
+        self.pool.free_all_blocks()
+        self.assertEqual(self.pool.total_bytes(), 0)
+        self.assertEqual(self.pool.get_stats()['n_frees'], 1)
+
+    def test_slab_over_limit(self):
+        self.pool.set_limit(size=self.unit * 2)
+        p = self.pool.malloc(self.unit)
+        self.assertEqual(self.allocator.sizes, [self.unit])
+        del p
+
+    def test_disable(self):
+        self.pool.set_slab_size(0)
+        p = self.pool.malloc(self.unit)
+        self.assertEqual(self.allocator.sizes, [self.unit])
+        del p
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            self.pool.set_slab_size(-1)
+        with self.assertRaises(ValueError):
+            self.pool.set_slab_size(self.unit, threshold=self.unit * 2)
+
+
+@testing.gpu
+class TestSingleDeviceMemoryPoolSizeClasses(unittest.TestCase):
+
+    def setUp(self):
+        self.allocator = CountingAllocator()
+        self.pool = memory.SingleDeviceMemoryPool(allocator=self.allocator)
+        self.unit = self.pool._allocation_unit_size
+        self.cutoff = self.unit * 8
+        self.pool.set_size_classes(self.cutoff, n_classes=2)
+
+    def test_bin_index_from_size(self):
+        bin_index = self.pool._bin_index_from_size
+        self.assertEqual(bin_index(self.unit), 0)
+        self.assertEqual(bin_index(self.cutoff), 7)
+        self.assertEqual(bin_index(self.cutoff + self.unit), 8)
+        self.assertEqual(bin_index(self.cutoff * 3 // 2), 8)
+        self.assertEqual(bin_index(self.cutoff * 3 // 2 + self.unit), 9)
+        self.assertEqual(bin_index(self.cutoff * 2), 9)
+        self.assertEqual(bin_index(self.cutoff * 2 + self.unit), 10)
+        self.assertEqual(bin_index(self.cutoff * 4), 11)
+        self.assertEqual(bin_index(self.cutoff * 64), 19)
+
+    def test_bin_index_monotonic(self):
+        indices = [self.pool._bin_index_from_size(self.unit * i)
+                   for i in range(1, 1024)]
+        self.assertEqual(indices, sorted(indices))
+
+    def test_smaller_block_in_same_bin(self):
+        p = self.pool.malloc(self.cutoff + self.unit)
+        del p
+        # The cached block is in the same size class but too small.
+        p = self.pool.malloc(self.cutoff + self.unit * 2)
+        self.assertEqual(
+            self.allocator.sizes,
+            [self.cutoff + self.unit, self.cutoff + self.unit * 2])
+        self.assertEqual(self.pool.n_free_blocks(), 1)
+        del p
+
+    def test_larger_block_in_same_bin(self):
+        p = self.pool.malloc(self.cutoff + self.unit * 2)
+        ptr = p.ptr
+        del p
+        p = self.pool.malloc(self.cutoff + self.unit)
+        self.assertEqual(ptr, p.ptr)
+        self.assertEqual(len(self.allocator.sizes), 1)
+        del p
+
+    def test_max_oversize(self):
+        self.pool.set_size_classes(self.cutoff, n_classes=2, max_oversize=2)
+        p = self.pool.malloc(self.cutoff * 8)
+        del p
+        # The cached block is too large to be split for the request.
+        p1 = self.pool.malloc(self.cutoff * 2)
+        self.assertEqual(self.allocator.sizes,
+                         [self.cutoff * 8, self.cutoff * 2])
+        del p1
+        p2 = self.pool.malloc(self.cutoff * 4)
+        self.assertEqual(len(self.allocator.sizes), 2)
+        del p2
+
+    def test_max_oversize_small_request(self):
+        self.pool.set_size_classes(self.cutoff, n_classes=2, max_oversize=2)
+        p = self.pool.malloc(self.cutoff * 2)
+        del p
+        # Small requests may split blocks up to the cutoff times the ratio.
+        p = self.pool.malloc(self.unit)
+        self.assertEqual(len(self.allocator.sizes), 1)
+        del p
+
+    def test_rebin_free_blocks(self):
+        self.pool.set_size_classes()
+        ps = [self.pool.malloc(self.cutoff * i) for i in (1, 2, 3)]
+        ptrs = [p.ptr for p in ps]
+        del ps
+        self.pool.set_size_classes(self.cutoff, n_classes=2)
+        self.assertEqual(self.pool.n_free_blocks(), 3)
+        self.assertEqual(self.pool.free_bytes(), self.cutoff * 6)
+        ps = [self.pool.malloc(self.cutoff * i) for i in (3, 2, 1)]
+        self.assertEqual(sorted(p.ptr for p in ps), sorted(ptrs))
+        self.assertEqual(len(self.allocator.sizes), 3)
+        del ps
+
+    def test_invalid_size_classes(self):
+        with self.assertRaises(ValueError):
+            self.pool.set_size_classes(-1)
+        with self.assertRaises(ValueError):
+            self.pool.set_size_classes(self.cutoff, n_classes=0)
+        with self.assertRaises(ValueError):
+            self.pool.set_size_classes(self.cutoff, max_oversize=0.5)
+
+
+@testing.gpu
+class TestSingleDeviceMemoryPoolCrossStream(unittest.TestCase):
+
+    def setUp(self):
+        self.allocator = CountingAllocator()
+        self.pool = memory.SingleDeviceMemoryPool(allocator=self.allocator)
+        self.unit = self.pool._allocation_unit_size
+        self.stream = stream_module.Stream()
+        self.pool.set_cross_stream_reuse()
+
+    def test_reuse(self):
+        p1 = self.pool.malloc(self.unit * 4)
+        ptr1 = p1.ptr
+        del p1
+        with self.stream:
+            p2 = self.pool.malloc(self.unit * 4)
+        self.assertEqual(ptr1, p2.ptr)
+        self.assertEqual(len(self.allocator.sizes), 1)
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['cross_stream_reuses'], 1)
+        self.assertEqual(stats['cross_stream_reused_bytes'], self.unit * 4)
+        self.assertEqual(
+            stats['streams'][self.stream.ptr]['used_bytes'], self.unit * 4)
+        del p2
+        # The block is now cached for the new stream.
+        with self.stream:
+            p3 = self.pool.malloc(self.unit * 4)
+        self.assertEqual(ptr1, p3.ptr)
+        self.assertEqual(self.pool.get_stats()['cross_stream_reuses'], 1)
+        del p3
+
+    def test_reuse_split(self):
+        p = self.pool.malloc(self.unit * 4)
+        ptr = p.ptr
+        del p
+        with self.stream:
+            head = self.pool.malloc(self.unit)
+            tail = self.pool.malloc(self.unit * 3)
+        self.assertEqual(ptr, head.ptr)
+        self.assertEqual(ptr + self.unit, tail.ptr)
+        self.assertEqual(self.pool.get_stats()['cross_stream_reuses'], 1)
+        del head, tail
+        self.assertEqual(self.pool.n_free_blocks(), 1)
+
+    def test_split_chunks_do_not_share_recorded_event(self):
+        p = self.pool.malloc(self.unit * 4)
+        del p
+        a = self.pool.malloc(self.unit)
+        b = self.pool.malloc(self.unit)
+        # `a` is left behind on the null stream while the other block split
+        # from the same block is reused and freed on another stream.
+        del a
+        with self.stream:
+            c = self.pool.malloc(self.unit * 2)
+        self.assertEqual(self.pool.get_stats()['cross_stream_reuses'], 1)
+        del c
+        events = []
+        for stream_ptr in (stream_module.Stream.null.ptr, self.stream.ptr):
+            chunks = [chunk for free_list in self.pool._arena(stream_ptr)
+                      if free_list for chunk in free_list]
+            self.assertEqual(len(chunks), 1)
+            events.append(chunks[0].event)
+        self.assertIsNot(events[0], events[1])
+        del b
+
+    def test_own_stream_first(self):
+        p1 = self.pool.malloc(self.unit * 4)
+        with self.stream:
+            p2 = self.pool.malloc(self.unit * 4)
+            ptr2 = p2.ptr
+        del p1, p2
+        with self.stream:
+            p3 = self.pool.malloc(self.unit * 4)
+        self.assertEqual(ptr2, p3.ptr)
+        self.assertEqual(self.pool.get_stats()['cross_stream_reuses'], 0)
+        del p3
+
+    def test_reuse_ready_only(self):
+        self.pool.set_cross_stream_reuse(wait=False)
+        p1 = self.pool.malloc(self.unit * 4)
+        ptr1 = p1.ptr
+        del p1
+        stream_module.Stream.null.synchronize()
+        with self.stream:
+            p2 = self.pool.malloc(self.unit * 4)
+        self.assertEqual(ptr1, p2.ptr)
+        del p2
+
+    def test_freed_before_enabled(self):
+        self.pool.set_cross_stream_reuse(False)
+        p1 = self.pool.malloc(self.unit * 4)
+        ptr1 = p1.ptr
+        del p1
+        self.pool.set_cross_stream_reuse()
+        with self.stream:
+            p2 = self.pool.malloc(self.unit * 4)
+        self.assertNotEqual(ptr1, p2.ptr)
+        del p2
+
+    def test_disabled(self):
+        self.pool.set_cross_stream_reuse(False)
+        p1 = self.pool.malloc(self.unit * 4)
+        ptr1 = p1.ptr
+        del p1
+        with self.stream:
+            p2 = self.pool.malloc(self.unit * 4)
+        self.assertNotEqual(ptr1, p2.ptr)
+        self.assertEqual(self.pool.get_stats()['cross_stream_reuses'], 0)
+        del p2
+
+
+@testing.gpu
+class TestSingleDeviceMemoryPoolAllocationStats(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = memory.SingleDeviceMemoryPool(allocator=mock_alloc)
+        self.unit = self.pool._allocation_unit_size
+
+    def test_disabled(self):
+        p = self.pool.malloc(self.unit)
+        del p
+        stats = self.pool.get_allocation_stats()
+        self.assertFalse(stats['enabled'])
+        self.assertEqual(stats['size_classes'], {})
+        self.assertEqual(stats['malloc_latency'], {})
+        self.assertEqual(stats['free_latency'], {})
+
+    def test_size_classes(self):
+        self.pool.set_allocation_stats()
+        p1 = self.pool.malloc(1)
+        del p1
+        p2 = self.pool.malloc(self.unit)
+        p3 = self.pool.malloc(self.unit * 3)
+        del p2
+        stats = self.pool.get_allocation_stats()
+        self.assertTrue(stats['enabled'])
+        self.assertEqual(stats['size_classes'], {
+            self.unit: {'mallocs': 2, 'malloc_bytes': self.unit * 2,
+                        'hits': 1, 'misses': 1, 'frees': 2},
+            self.unit * 2: {'mallocs': 1, 'malloc_bytes': self.unit * 3,
+                            'hits': 0, 'misses': 1, 'frees': 0},
+        })
+        self.assertEqual(sum(stats['malloc_latency'].values()), 3)
+        self.assertEqual(sum(stats['free_latency'].values()), 2)
+        del p3
+
+    def test_zero_size(self):
+        self.pool.set_allocation_stats()
+        self.pool.malloc(0)
+        self.assertEqual(self.pool.get_allocation_stats()['size_classes'], {})
+
+    def test_reset(self):
+        self.pool.set_allocation_stats()
+        p = self.pool.malloc(self.unit)
+        del p
+        stats = self.pool.get_allocation_stats(reset=True)
+        self.assertEqual(len(stats['size_classes']), 1)
+        stats = self.pool.get_allocation_stats()
+        self.assertEqual(stats['size_classes'], {})
+        self.assertEqual(stats['malloc_latency'], {})
+
+    def test_disable(self):
+        self.pool.set_allocation_stats()
+        p = self.pool.malloc(self.unit)
+        self.pool.set_allocation_stats(False)
+        del p
+        p = self.pool.malloc(self.unit)
+        del p
+        stats = self.pool.get_allocation_stats()
+        self.assertEqual(stats['size_classes'][self.unit]['mallocs'], 1)
+        self.assertEqual(stats['size_classes'][self.unit]['frees'], 0)
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+@testing.gpu
+class TestSingleDeviceMemoryPoolTrim(unittest.TestCase):
+
+    def setUp(self):
+        self.allocator = CountingAllocator()
+        self.pool = memory.SingleDeviceMemoryPool(allocator=self.allocator)
+        self.unit = self.pool._allocation_unit_size
+        self.clock = FakeClock()
+
+    def test_idle_time(self):
+        self.pool.set_trim_policy(idle_time=10, clock=self.clock)
+        p1 = self.pool.malloc(self.unit)
+        p2 = self.pool.malloc(self.unit * 2)
+        del p1
+        self.clock.time = 5
+        del p2
+        self.clock.time = 12
+        self.assertEqual(self.pool.trim(), self.unit)
+        self.assertEqual(self.pool.total_bytes(), self.unit * 2)
+        self.assertEqual(self.pool.n_free_blocks(), 1)
+        self.clock.time = 15
+        self.assertEqual(self.pool.trim(), self.unit * 2)
+        self.assertEqual(self.pool.total_bytes(), 0)
+        stats = self.pool.get_stats()
+        self.assertEqual(stats['trimmed_blocks'], 2)
+        self.assertEqual(stats['trimmed_bytes'], self.unit * 3)
+        self.assertEqual(stats['n_frees'], 2)
+        self.assertEqual(stats['streams'], {})
+
+    def test_reused_block_not_trimmed(self):
+        self.pool.set_trim_policy(idle_time=10, clock=self.clock)
+        p = self.pool.malloc(self.unit)
+        del p
+        self.clock.time = 8
+        p = self.pool.malloc(self.unit)
+        del p
+        self.clock.time = 12
+        self.assertEqual(self.pool.trim(), 0)
+        self.assertEqual(self.pool.free_bytes(), self.unit)
+
+    def test_split_block_not_trimmed(self):
+        self.pool.set_trim_policy(idle_time=10, clock=self.clock)
+        p = self.pool.malloc(self.unit * 2)
+        del p
+        p = self.pool.malloc(self.unit)
+        self.clock.time = 20
+        self.assertEqual(self.pool.trim(), 0)
+        del p
+        self.clock.time = 40
+        self.assertEqual(self.pool.trim(), self.unit * 2)
+
+    def test_high_water(self):
+        self.pool.set_trim_policy(
+            high_water=self.unit * 4, interval=100, clock=self.clock)
+        ps = [self.pool.malloc(self.unit * 2) for _ in range(3)]
+        ptrs = [p.ptr for p in ps]
+        while ps:
+            self.clock.time += 1
+            del ps[0]
+        self.assertEqual(self.pool.trim(), self.unit * 2)
+        self.assertEqual(self.pool.total_bytes(), self.unit * 4)
+        # The least recently freed block is released.
+        p1 = self.pool.malloc(self.unit * 2)
+        p2 = self.pool.malloc(self.unit * 2)
+        self.assertEqual({p1.ptr, p2.ptr}, set(ptrs[1:]))
+        del p1, p2
+
+    def test_high_water_in_use(self):
+        self.pool.set_trim_policy(high_water=self.unit, clock=self.clock)
+        p = self.pool.malloc(self.unit * 2)
+        self.assertEqual(self.pool.trim(), 0)
+        self.assertEqual(self.pool.total_bytes(), self.unit * 2)
+        del p
+
+    def test_trim_on_free(self):
+        self.pool.set_trim_policy(idle_time=10, interval=5, clock=self.clock)
+        p1 = self.pool.malloc(self.unit)
+        p2 = self.pool.malloc(self.unit)
+        del p1
+        self.clock.time = 11
+        del p2
+        self.assertEqual(self.pool.total_bytes(), self.unit)
+        self.assertEqual(self.pool.get_stats()['trimmed_blocks'], 1)
+
+    def test_trim_on_malloc(self):
+        self.pool.set_trim_policy(idle_time=10, interval=5, clock=self.clock)
+        p = self.pool.malloc(self.unit)
+        del p
+        self.clock.time = 11
+        p = self.pool.malloc(self.unit * 2)
+        self.assertEqual(self.pool.total_bytes(), self.unit * 2)
+        self.assertEqual(self.pool.get_stats()['trimmed_blocks'], 1)
+        del p
+
+    def test_interval(self):
+        self.pool.set_trim_policy(idle_time=1, interval=5, clock=self.clock)
+        p1 = self.pool.malloc(self.unit)
+        p2 = self.pool.malloc(self.unit)
+        del p1
+        self.clock.time = 2
+        del p2
+        self.assertEqual(self.pool.total_bytes(), self.unit * 2)
+
+    def test_freed_before_set(self):
+        p = self.pool.malloc(self.unit)
+        del p
+        self.clock.time = 100
+        self.pool.set_trim_policy(idle_time=10, clock=self.clock)
+        self.assertEqual(self.pool.trim(), 0)
+        self.clock.time = 110
+        self.assertEqual(self.pool.trim(), self.unit)
+
+    def test_disabled(self):
+        p = self.pool.malloc(self.unit)
+        del p
+        self.assertEqual(self.pool.trim(), 0)
+        self.assertEqual(self.pool.free_bytes(), self.unit)
+
+    def test_limit(self):
+        self.pool.set_limit(self.unit * 2)
+        self.pool.set_trim_policy(idle_time=10, clock=self.clock)
+        p = self.pool.malloc(self.unit * 2)
+        del p
+        self.clock.time = 10
+        self.pool.trim()
+        p = self.pool.malloc(self.unit)
+        p = self.pool.malloc(self.unit)
+        del p
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            self.pool.set_trim_policy(idle_time=-1)
+        with self.assertRaises(ValueError):
+            self.pool.set_trim_policy(high_water=-1)
+        with self.assertRaises(ValueError):
+            self.pool.set_trim_policy(idle_time=1, interval=-1)
+
 
 @testing.parameterize(*testing.product({
     'allocator': [memory._malloc, memory.malloc_managed],
@@ -475,6 +1156,190 @@ class TestMemoryPool(unittest.TestCase):
         with cupy.cuda.Device(0):
             self.assertEqual(0, self.pool.total_bytes())
 
+    def test_get_stats(self):
+        with cupy.cuda.Device(0):
+            stats = self.pool.get_stats()
+            self.assertEqual(0, stats['total_bytes'])
+            self.assertEqual({}, stats['streams'])
+
+    def test_set_limit(self):
+        with cupy.cuda.Device(0):
+            self.pool.set_limit(size=1024)
+            self.assertEqual(1024, self.pool.get_limit())
+            p = self.pool.malloc(1024)
+            with self.assertRaises(memory.OutOfMemoryError):
+                self.pool.malloc(512)
+            del p
+            self.pool.set_limit(size=0)
+            self.assertEqual(0, self.pool.get_limit())
+
+    def test_allocation_stats(self):
+        with cupy.cuda.Device(0):
+            self.pool.set_allocation_stats()
+            p = self.pool.malloc(1024)
+            del p
+            stats = self.pool.get_allocation_stats(reset=True)
+            self.assertEqual(stats['size_classes'][1024]['mallocs'], 1)
+            self.pool.set_allocation_stats(False)
+
+    def test_trim(self):
+        with cupy.cuda.Device(0):
+            self.pool.set_trim_policy(high_water=1)
+            p = self.pool.malloc(1024)
+            del p
+            self.assertEqual(1024, self.pool.trim())
+            self.assertEqual(0, self.pool.total_bytes())
+            self.pool.set_trim_policy()
+
+
+@testing.gpu
+class TestScopedPool(unittest.TestCase):
+
+    def setUp(self):
+        self.allocator = CountingAllocator()
+        self.pool = memory.SingleDeviceMemoryPool(allocator=self.allocator)
+        self.unit = self.pool._allocation_unit_size
+        memory.set_allocator(self.pool.malloc)
+
+    def tearDown(self):
+        memory.set_allocator()
+
+    def test_alloc_from_region(self):
+        with memory.scoped_pool(region_size=self.unit * 8) as scope:
+            p1 = memory.alloc(100)
+            p2 = memory.alloc(self.unit + 1)
+            p3 = memory.alloc(1)
+            self.assertEqual(p1.ptr + self.unit, p2.ptr)
+            self.assertEqual(p2.ptr + self.unit * 2, p3.ptr)
+            self.assertEqual(scope._n_regions, 1)
+            self.assertEqual(scope._n_live, 3)
+            self.assertEqual(self.pool.used_bytes(), self.unit * 8)
+            del p1, p2, p3
+            self.assertEqual(scope._n_live, 0)
+        self.assertEqual(self.pool.used_bytes(), 0)
+        self.assertEqual(self.allocator.sizes, [self.unit * 8])
+
+    def test_new_region(self):
+        with memory.scoped_pool(region_size=self.unit * 4,
+                                max_size=self.unit * 4) as scope:
+            p1 = memory.alloc(self.unit * 3)
+            p2 = memory.alloc(self.unit * 2)
+            self.assertEqual(scope._n_regions, 2)
+            self.assertEqual(self.pool.used_bytes(), self.unit * 8)
+            del p1
+            # The first region is returned as it is no longer current.
+            self.assertEqual(self.pool.used_bytes(), self.unit * 4)
+            del p2
+        self.assertEqual(self.pool.used_bytes(), 0)
+
+    def test_reuse_region(self):
+        with memory.scoped_pool(region_size=self.unit * 4) as scope:
+            p = memory.alloc(self.unit)
+            ptr = p.ptr
+            del p
+            p = memory.alloc(self.unit)
+            self.assertEqual(ptr, p.ptr)
+            self.assertEqual(scope._n_regions, 1)
+            del p
+
+    def test_large_allocation(self):
+        with memory.scoped_pool(region_size=self.unit * 8) as scope:
+            p = memory.alloc(self.unit * 2 + 1)
+            self.assertIsInstance(p.mem, memory.PooledMemory)
+            self.assertEqual(scope._n_regions, 0)
+            self.assertEqual(scope._n_live, 0)
+            del p
+
+    def test_zero_size(self):
+        with memory.scoped_pool() as scope:
+            p = memory.alloc(0)
+            self.assertEqual(p.ptr, 0)
+            self.assertEqual(scope._n_regions, 0)
+
+    def test_stream(self):
+        stream = stream_module.Stream()
+        with memory.scoped_pool(region_size=self.unit * 4) as scope:
+            p1 = memory.alloc(self.unit)
+            with stream:
+                p2 = memory.alloc(self.unit)
+            self.assertEqual(scope._n_regions, 2)
+            self.assertNotEqual(p1.ptr + self.unit, p2.ptr)
+            del p1, p2
+
+    def test_outlive(self):
+        with testing.assert_warns(UserWarning):
+            with memory.scoped_pool(region_size=self.unit * 4):
+                p = memory.alloc(self.unit)
+                q = memory.alloc(self.unit)
+                del q
+        # The region is kept while the allocation is alive.
+        self.assertEqual(self.pool.used_bytes(), self.unit * 4)
+        del p
+        self.assertEqual(self.pool.used_bytes(), 0)
+
+    def test_allocator_restored(self):
+        with memory.scoped_pool(region_size=self.unit * 4) as scope:
+            pass
+        p = memory.alloc(self.unit)
+        self.assertIsInstance(p.mem, memory.PooledMemory)
+        self.assertEqual(self.pool.used_bytes(), self.unit)
+        with self.assertRaises(RuntimeError):
+            scope.malloc(self.unit)
+        del p
+
+    def test_nested(self):
+        with memory.scoped_pool(region_size=self.unit * 8) as outer:
+            with memory.scoped_pool(region_size=self.unit * 2) as inner:
+                p = memory.alloc(1)
+                self.assertEqual(inner._n_live, 1)
+                self.assertEqual(outer._n_live, 1)
+                del p
+            self.assertEqual(outer._n_live, 0)
+        self.assertEqual(self.pool.used_bytes(), 0)
+
+    def test_other_thread(self):
+        result = []
+
+        def job():
+            result.append(memory.alloc(self.unit))
+
+        with memory.scoped_pool() as scope:
+            t = threading.Thread(target=job)
+            t.start()
+            t.join()
+            self.assertEqual(scope._n_live, 0)
+        self.assertIsInstance(result[0].mem, memory.PooledMemory)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            memory.scoped_pool(region_size=0)
+        with self.assertRaises(ValueError):
+            memory.scoped_pool(region_size=1024, max_size=2048)
+
+
+@testing.multi_gpu(2)
+class TestScopedPoolMultiGPU(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = memory.MemoryPool()
+        memory.set_allocator(self.pool.malloc)
+
+    def tearDown(self):
+        memory.set_allocator()
+
+    def test_device(self):
+        with memory.scoped_pool() as scope:
+            with cupy.cuda.Device(0):
+                p0 = memory.alloc(512)
+            with cupy.cuda.Device(1):
+                p1 = memory.alloc(512)
+            self.assertEqual(scope._n_regions, 2)
+            self.assertEqual(p0.device.id, 0)
+            self.assertEqual(p1.device.id, 1)
+            with cupy.cuda.Device(1):
+                self.assertEqual(self.pool.used_bytes(), 1 << 22)
+            del p0, p1
+
 
 @testing.gpu
 class TestAllocator(unittest.TestCase):
@@ -1,5 +1,8 @@
 import unittest
 
+import six
+
+from cupy.cuda import memory
 from cupy.cuda import pinned_memory
 from cupy import testing
 
@@ -95,6 +98,93 @@ class TestSingleDeviceMemoryPool(unittest.TestCase):
         p2 = self.pool.malloc(2000)
         self.assertNotEqual(ptr1, p2.ptr)
 
+    def test_split(self):
+        p = self.pool.malloc(2048)
+        ptr = p.ptr
+        del p
+        head = self.pool.malloc(512)
+        tail = self.pool.malloc(1536)
+        self.assertEqual(ptr, head.ptr)
+        self.assertEqual(ptr + 512, tail.ptr)
+        self.assertEqual(self.pool.n_free_blocks(), 0)
+
+    def test_best_fit(self):
+        p1 = self.pool.malloc(4096)
+        p2 = self.pool.malloc(1024)
+        ptr2 = p2.ptr
+        del p1, p2
+        p = self.pool.malloc(1000)
+        self.assertEqual(ptr2, p.ptr)
+
+    def test_merge(self):
+        p = self.pool.malloc(2048)
+        ptr = p.ptr
+        del p
+        head = self.pool.malloc(512)
+        tail = self.pool.malloc(1536)
+        del head
+        self.assertEqual(self.pool.n_free_blocks(), 1)
+        del tail
+        self.assertEqual(self.pool.n_free_blocks(), 1)
+        p = self.pool.malloc(2048)
+        self.assertEqual(ptr, p.ptr)
+
+    def test_free_all_blocks_split(self):
+        p = self.pool.malloc(2048)
+        del p
+        head = self.pool.malloc(512)
+        # The split block is not released.
+        self.pool.free_all_blocks()
+        self.assertEqual(self.pool.n_free_blocks(), 1)
+        self.assertEqual(self.pool.total_bytes(), 2048)
+        del head
+        self.pool.free_all_blocks()
+        self.assertEqual(self.pool.n_free_blocks(), 0)
+        self.assertEqual(self.pool.total_bytes(), 0)
+
+    def test_bytes(self):
+        p1 = self.pool.malloc(1000)
+        p2 = self.pool.malloc(2000)
+        self.assertEqual(self.pool.used_bytes(), 3072)
+        self.assertEqual(self.pool.free_bytes(), 0)
+        self.assertEqual(self.pool.total_bytes(), 3072)
+        del p1
+        self.assertEqual(self.pool.used_bytes(), 2048)
+        self.assertEqual(self.pool.free_bytes(), 1024)
+        self.assertEqual(self.pool.total_bytes(), 3072)
+        q = self.pool.malloc(100)
+        self.assertEqual(self.pool.used_bytes(), 2560)
+        self.assertEqual(self.pool.free_bytes(), 512)
+        del p2, q
+        self.pool.free_all_blocks()
+        self.assertEqual(self.pool.used_bytes(), 0)
+        self.assertEqual(self.pool.free_bytes(), 0)
+        self.assertEqual(self.pool.total_bytes(), 0)
+
+    def test_limit(self):
+        self.assertEqual(self.pool.get_limit(), 0)
+        self.pool.set_limit(2048)
+        self.assertEqual(self.pool.get_limit(), 2048)
+        p1 = self.pool.malloc(1024)
+        p2 = self.pool.malloc(1024)
+        with six.assertRaisesRegex(self, memory.OutOfMemoryError,
+                                   r'\(total 2560 bytes\)'):
+            self.pool.malloc(512)
+        del p1, p2
+
+    def test_limit_release_free_blocks(self):
+        self.pool.set_limit(2048)
+        p = self.pool.malloc(1024)
+        del p
+        p = self.pool.malloc(2048)
+        self.assertEqual(self.pool.total_bytes(), 2048)
+        self.assertEqual(self.pool.n_free_blocks(), 0)
+        del p
+
+    def test_limit_invalid(self):
+        with self.assertRaises(ValueError):
+            self.pool.set_limit(-1)
+
     def test_free_all_blocks(self):
         p1 = self.pool.malloc(1000)
         ptr1 = p1.ptr
@@ -0,0 +1,473 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import numpy
+
+import cupy
+from cupy import core
+from cupy.cuda import compiler
+from cupy.cuda import precompile
+from cupy import testing
+
+
+class TestValidateManifest(unittest.TestCase):
+
+    def _check_invalid(self, manifest):
+        with self.assertRaises(ValueError):
+            precompile.validate_manifest(manifest)
+
+    def test_valid(self):
+        entries = [{'kind': 'ufunc', 'kernel': 'cupy.add',
+                    'dtypes': ['float32', 'float32']}]
+        self.assertEqual(
+            precompile.validate_manifest({'kernels': entries}), entries)
+
+    def test_no_kernels(self):
+        self._check_invalid({})
+        self._check_invalid([])
+
+    def test_unknown_kind(self):
+        self._check_invalid({'kernels': [
+            {'kind': 'scan', 'kernel': 'cupy.add', 'dtypes': []}]})
+
+    def test_kernel_and_definition(self):
+        self._check_invalid({'kernels': [
+            {'kind': 'elementwise', 'dtypes': []}]})
+        self._check_invalid({'kernels': [
+            {'kind': 'elementwise', 'kernel': 'a.b', 'definition': {},
+             'dtypes': []}]})
+
+    def test_no_dtypes(self):
+        self._check_invalid({'kernels': [
+            {'kind': 'ufunc', 'kernel': 'cupy.add'}]})
+
+    def test_load(self):
+        entries = [{'kind': 'ufunc', 'kernel': 'cupy.add',
+                    'dtypes': ['float32', 'float32']}]
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'kernels': entries}, f)
+            self.assertEqual(precompile.load_manifest(path), entries)
+        finally:
+            os.remove(path)
+
+
+class TestGenerateSource(unittest.TestCase):
+
+    def test_ufunc(self):
+        name, source, options = precompile.generate_source(
+            {'kind': 'ufunc', 'kernel': 'cupy.add',
+             'dtypes': ['float32', 'float32'], 'ndim': 2})
+        self.assertEqual(name, 'cupy_add')
+        self.assertEqual(options, ())
+        self.assertIn('CArray<float, 2> _raw_in0', source)
+        self.assertIn('typedef float out0_type;', source)
+        self.assertIn('CIndexer<2> _ind', source)
+
+    def test_ufunc_routine(self):
+        _, source, _ = precompile.generate_source(
+            {'kind': 'ufunc', 'kernel': 'cupy.add',
+             'dtypes': ['int8', 'float32']})
+        self.assertIn('typedef float in0_type;', source)
+        self.assertIn('CArray<signed char, 1> _raw_in0', source)
+
+    def test_ufunc_signature(self):
+        _, source, _ = precompile.generate_source(
+            {'kind': 'ufunc', 'kernel': 'cupy.add',
+             'dtypes': ['float32', 'float32'], 'signature': 'dd->d'})
+        self.assertIn('typedef double in0_type;', source)
+
+    def test_ufunc_scalar(self):
+        _, source, _ = precompile.generate_source(
+            {'kind': 'ufunc', 'kernel': 'cupy.add',
+             'dtypes': ['float32', 'float32'], 'scalars': [1]})
+        self.assertIn('float in1', source)
+        self.assertNotIn('_raw_in1', source)
+
+    def test_ufunc_wrong_type(self):
+        with self.assertRaises(TypeError):
+            precompile.generate_source(
+                {'kind': 'ufunc', 'kernel': 'cupy.add', 'dtypes': ['float32'],
+                 'signature': 'ff->f'})
+        with self.assertRaises(TypeError):
+            precompile.generate_source(
+                {'kind': 'ufunc', 'kernel': 'cupy.add',
+                 'dtypes': ['float32', 'float32'], 'signature': 'xx->x'})
+
+    def test_ufunc_definition(self):
+        name, source, _ = precompile.generate_source(
+            {'kind': 'ufunc',
+             'definition': {'name': 'test_sub',
+                            'ops': [['ff->f', 'out0 = in0 - in1']]},
+             'dtypes': ['float32', 'float32']})
+        self.assertEqual(name, 'test_sub')
+        self.assertIn('out0 = in0 - in1', source)
+
+    def test_wrong_kind(self):
+        with self.assertRaises(TypeError):
+            precompile.generate_source(
+                {'kind': 'elementwise', 'kernel': 'cupy.add',
+                 'dtypes': ['float32', 'float32']})
+
+    def test_elementwise(self):
+        name, source, options = precompile.generate_source(
+            {'kind': 'elementwise',
+             'definition': {'in_params': 'T x, raw T y', 'out_params': 'T z',
+                            'operation': 'z = x + y[0]',
+                            'name': 'test_precompile',
+                            'options': ['-O3']},
+             'dtypes': ['float64', 'float64'], 'ndim': 2,
+             'arg_ndims': [2, 1, 2]})
+        self.assertEqual(name, 'test_precompile')
+        self.assertEqual(options, ('-O3',))
+        self.assertIn('typedef double T;', source)
+        self.assertIn('CArray<double, 1> y', source)
+        self.assertIn('CArray<double, 2> _raw_z', source)
+        self.assertIn('z = x + y[0]', source)
+
+    def test_elementwise_scalar(self):
+        _, source, _ = precompile.generate_source(
+            {'kind': 'elementwise',
+             'definition': {'in_params': 'T x, float32 a',
+                            'out_params': 'T z', 'operation': 'z = a * x'},
+             'dtypes': ['int32', None], 'scalars': [1]})
+        self.assertIn('float a', source)
+        self.assertIn('typedef int T;', source)
+
+    def test_reduction(self):
+        name, source, options = precompile.generate_source(
+            {'kind': 'reduction',
+             'definition': {'in_params': 'T x', 'out_params': 'T y',
+                            'map_expr': 'x * x', 'reduce_expr': 'a + b',
+                            'post_map_expr': 'y = a', 'identity': '0',
+                            'name': 'sqsum'},
+             'dtypes': ['float32'], 'ndim': 2, 'out_ndim': 1})
+        self.assertEqual(name, 'sqsum')
+        self.assertEqual(options, ())
+        self.assertIn('CArray<float, 2> _raw_x', source)
+        self.assertIn('CArray<float, 1> _raw_y', source)
+        self.assertIn('CIndexer<2> _in_ind, CIndexer<1> _out_ind', source)
+        self.assertIn('int _block_stride', source)
+        self.assertNotIn('_partials', source)
+
+    def test_reduction_two_stage(self):
+        entry = {'kind': 'reduction',
+                 'definition': {'in_params': 'T x', 'out_params': 'T y',
+                                'map_expr': 'x * x', 'reduce_expr': 'a + b',
+                                'post_map_expr': 'y = a', 'identity': '0',
+                                'name': 'sqsum'},
+                 'dtypes': ['float32'], 'ndim': 1, 'out_ndim': 0}
+        for stage in (1, 2):
+            entry['stage'] = stage
+            _, source, _ = precompile.generate_source(entry)
+            self.assertIn(
+                'CArray<unsigned char, 1> _partials, int _n_segments', source)
+
+    def test_simple_reduction(self):
+        name, source, options = precompile.generate_source(
+            {'kind': 'simple_reduction', 'kernel': 'cupy.core.core._sum',
+             'dtypes': ['float32']})
+        self.assertEqual(name, 'cupy_sum')
+        self.assertIn('typedef float type_in0_raw;', source)
+        self.assertIn('CArray<float, 0> _raw_out0', source)
+
+    def test_simple_reduction_definition(self):
+        _, source, _ = precompile.generate_source(
+            {'kind': 'simple_reduction',
+             'definition': {'name': 'test_max', 'ops': ['f->f'],
+                            'routine': ['in0', 'max(a, b)', 'out0 = a',
+                                        None]},
+             'dtypes': ['float32']})
+        self.assertIn('#define REDUCE(a, b) (max(a, b))', source)
+
+    def test_simple_reduction_out_dtype(self):
+        _, source, _ = precompile.generate_source(
+            {'kind': 'simple_reduction', 'kernel': 'cupy.core.core._sum',
+             'dtypes': ['int8', 'int64']})
+        self.assertIn('typedef long long type_out0_raw;', source)
+
+
+_f32 = numpy.float32
+_f64 = numpy.float64
+
+
+class TestMakeEntry(unittest.TestCase):
+
+    def _check(self, kind, source, args):
+        entry = precompile.make_entry(kind, source, args)
+        self.assertIsNotNone(entry)
+        json.dumps(entry)
+        self.assertEqual(precompile.generate_source(entry)[1], source)
+        return entry
+
+    def test_ufunc(self):
+        args = ((_f32, _f32), (_f32,), 'out0 = in0 + in1',
+                ((core.ndarray, _f32, 2), (_f32, _f32, 0),
+                 (core.ndarray, _f32, 2), (core.Indexer, None, 2)),
+                cupy.add._params, 'cupy_add', '')
+        entry = self._check(
+            'ufunc', core.core._get_ufunc_kernel_source(*args), args)
+        self.assertEqual(entry['signature'], 'ff->f')
+        self.assertEqual(entry['scalars'], [1])
+        self.assertEqual(entry['ndim'], 2)
+
+    def test_elementwise(self):
+        kernel = core.ElementwiseKernel(
+            'T x, raw T y', 'T z', 'z = x + y[0]', 'test_record',
+            loop_prep='int k = 0', options=('-O3',))
+        args = (((core.ndarray, _f64, 2), (core.ndarray, _f64, 1),
+                 (core.ndarray, _f64, 2), (core.Indexer, None, 2)),
+                (('T', _f64),), kernel.params, kernel.operation,
+                kernel.name, kernel.preamble, kernel.kwargs)
+        entry = self._check(
+            'elementwise', core.core._get_elementwise_kernel_source(*args),
+            args)
+        self.assertEqual(entry['dtypes'], ['float64', 'float64'])
+        self.assertEqual(entry['arg_ndims'], [2, 1, 2])
+        self.assertEqual(entry['definition']['in_params'], 'T x, raw T y')
+        self.assertEqual(entry['definition']['options'], ['-O3'])
+
+    def test_elementwise_output_types(self):
+        kernel = core.ElementwiseKernel('T x', 'U z', 'z = x', 'test_record')
+        args = (((core.ndarray, _f32, 1), (core.ndarray, _f64, 1),
+                 (core.Indexer, None, 1)),
+                (('U', _f64), ('T', _f32)), kernel.params, kernel.operation,
+                kernel.name, kernel.preamble, kernel.kwargs)
+        entry = self._check(
+            'elementwise', core.core._get_elementwise_kernel_source(*args),
+            args)
+        self.assertEqual(entry['dtypes'], ['float32', 'float64'])
+
+    def test_reduction(self):
+        kernel = core.ReductionKernel(
+            'T x', 'T y', 'x * x', 'a + b', 'y = a', '0', 'test_record')
+        args = (kernel.params,
+                ((core.ndarray, _f32, 2), (core.ndarray, _f32, 1),
+                 (core.Indexer, None, 2), (core.Indexer, None, 1),
+                 (numpy.int32, numpy.int32, 0)),
+                (('T', _f32),), kernel.name, kernel._block_size,
+                kernel.reduce_type, kernel.identity, kernel.map_expr,
+                kernel.reduce_expr, kernel.post_map_expr, kernel.preamble,
+                0, True, False, kernel.options)
+        entry = self._check(
+            'reduction', core.core._get_reduction_kernel_source(*args[:-1]),
+            args)
+        self.assertEqual(entry['ndim'], 2)
+        self.assertEqual(entry['out_ndim'], 1)
+        self.assertNotIn('stage', entry)
+
+    def test_reduction_two_stage(self):
+        kernel = core.ReductionKernel(
+            'T x', 'T y', 'x * x', 'a + b', 'y = a', '0', 'test_record')
+        for stage in (1, 2):
+            args = (kernel.params,
+                    ((core.ndarray, _f32, 1), (core.ndarray, _f32, 0),
+                     (core.Indexer, None, 1), (core.Indexer, None, 0),
+                     (numpy.int32, numpy.int32, 0),
+                     (core.ndarray, numpy.uint8, 1),
+                     (numpy.int32, numpy.int32, 0)),
+                    (('T', _f32),), kernel.name, kernel._block_size,
+                    kernel.reduce_type, kernel.identity, kernel.map_expr,
+                    kernel.reduce_expr, kernel.post_map_expr,
+                    kernel.preamble, stage, True, stage == 2,
+                    kernel.options)
+            entry = self._check(
+                'reduction',
+                core.core._get_reduction_kernel_source(*args[:-1]), args)
+            self.assertEqual(entry['stage'], stage)
+            self.assertEqual(entry.get('int64_index', False), stage == 2)
+
+    def test_simple_reduction(self):
+        func = core.core._sum
+        in_types, out_types, routine = [
+            op for op in func._ops if op[0] == (_f32,)][0]
+        args = (routine, func._params,
+                ((core.ndarray, _f32, 1), (core.ndarray, _f32, 0),
+                 (core.Indexer, None, 1), (core.Indexer, None, 0),
+                 (numpy.int32, numpy.int32, 0)),
+                _f32, _f32, out_types, func.name, func._block_size,
+                func.identity, func._input_expr, func._output_expr,
+                func._preamble, 0, True, False, ())
+        self._check(
+            'simple_reduction',
+            core.core._get_simple_reduction_function_source(*args[:-1]),
+            args)
+
+    def test_simple_reduction_two_stage(self):
+        func = core.core._sum
+        in_types, out_types, routine = [
+            op for op in func._ops if op[0] == (_f32,)][0]
+        for stage in (1, 2):
+            args = (routine, func._params,
+                    ((core.ndarray, _f32, 1), (core.ndarray, _f32, 0),
+                     (core.Indexer, None, 1), (core.Indexer, None, 0),
+                     (numpy.int32, numpy.int32, 0),
+                     (core.ndarray, numpy.uint8, 1),
+                     (numpy.int32, numpy.int32, 0)),
+                    _f32, _f32, out_types, func.name, func._block_size,
+                    func.identity, func._input_expr, func._output_expr,
+                    func._preamble, stage, True, stage == 2, ())
+            entry = self._check(
+                'simple_reduction',
+                core.core._get_simple_reduction_function_source(*args[:-1]),
+                args)
+            self.assertEqual(entry['stage'], stage)
+            self.assertEqual(entry.get('int64_index', False), stage == 2)
+
+    def test_not_reproducible(self):
+        args = ((_f32, _f32), (_f32,), 'out0 = in0 + in1',
+                ((core.ndarray, _f32, 1), (core.ndarray, _f32, 1),
+                 (core.ndarray, _f32, 1), (core.Indexer, None, 1)),
+                cupy.add._params, 'cupy_add', '')
+        self.assertIsNone(precompile.make_entry('ufunc', 'source', args))
+
+
+class TestKernelRecorder(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.args = ((_f32, _f32), (_f32,), 'out0 = in0 + in1',
+                     ((core.ndarray, _f32, 1), (core.ndarray, _f32, 1),
+                      (core.ndarray, _f32, 1), (core.Indexer, None, 1)),
+                     cupy.add._params, 'cupy_add', '')
+        self.source = core.core._get_ufunc_kernel_source(*self.args)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_record(self):
+        recorder = precompile.KernelRecorder(self.path)
+        recorder('ufunc', self.source, self.args)
+        recorder('ufunc', self.source, self.args)
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        entries = precompile.load_manifest(self.path)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(
+            precompile.generate_source(entries[0])[1], self.source)
+
+    def test_load_duplicates(self):
+        precompile.KernelRecorder(self.path)(
+            'ufunc', self.source, self.args)
+        precompile.KernelRecorder(self.path)(
+            'ufunc', self.source, self.args)
+        self.assertEqual(len(precompile.load_manifest(self.path)), 1)
+
+    def test_not_reproducible(self):
+        recorder = precompile.KernelRecorder(self.path)
+        with testing.assert_warns(UserWarning):
+            recorder('ufunc', 'source', self.args)
+        self.assertEqual(os.path.getsize(self.path), 0)
+
+
+class TestPrecompile(unittest.TestCase):
+
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.source_dir)
+
+    def test_keys_and_sources(self):
+        entries = [{'kind': 'ufunc', 'kernel': 'cupy.add',
+                    'dtypes': ['float32', 'float32']}]
+        with mock.patch('cupy.cuda.compiler.get_cache_key',
+                        return_value='key_2.cubin') as get_cache_key, \
+                mock.patch('cupy.cuda.compiler.compile_with_cache') as comp:
+            results = precompile.precompile(
+                entries, arch='compute_30', source_dir=self.source_dir)
+        self.assertEqual(
+            results,
+            [{'name': 'cupy_add', 'kind': 'ufunc', 'key': 'key_2.cubin'}])
+        self.assertFalse(comp.called)
+        source, options, arch, extra_source = get_cache_key.call_args[0]
+        self.assertEqual(arch, 'compute_30')
+        with open(os.path.join(self.source_dir, 'key_2.cubin.cu')) as f:
+            self.assertEqual(f.read(), source)
+
+
+@testing.gpu
+class TestPrecompileMatchesRuntime(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        compiler.get_memory_cache().clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        compiler.get_memory_cache().clear()
+
+    def _check(self, entry, run):
+        with mock.patch.dict(os.environ, {'CUPY_CACHE_DIR': self.cache_dir}):
+            run()
+            result, = precompile.precompile([entry])
+        self.assertTrue(
+            os.path.exists(os.path.join(self.cache_dir, result['key'])))
+
+    def test_ufunc(self):
+        ufunc = core.create_ufunc(
+            'test_precompile_ufunc', ('ff->f', 'dd->d'), 'out0 = in0 - in1')
+        a = testing.shaped_arange((2, 3), cupy, numpy.float32)
+        with mock.patch('cupy.cuda.precompile._import_object',
+                        return_value=ufunc):
+            self._check(
+                {'kind': 'ufunc', 'kernel': 'ufunc',
+                 'dtypes': ['float32', 'float32']},
+                lambda: ufunc(a, a))
+
+    def test_elementwise(self):
+        definition = {'in_params': 'T x', 'out_params': 'T y',
+                      'operation': 'y = x * 3 - 1',
+                      'name': 'test_precompile_elementwise'}
+        kernel = core.ElementwiseKernel(**definition)
+        a = testing.shaped_arange((2, 3), cupy, numpy.float64)
+        self._check(
+            {'kind': 'elementwise', 'definition': definition,
+             'dtypes': ['float64']},
+            lambda: kernel(a))
+
+    def test_reduction(self):
+        definition = {'in_params': 'T x', 'out_params': 'T y',
+                      'map_expr': 'x + 3', 'reduce_expr': 'a + b',
+                      'post_map_expr': 'y = a', 'identity': '0',
+                      'name': 'test_precompile_reduction'}
+        kernel = core.ReductionKernel(**definition)
+        a = testing.shaped_arange((2, 3), cupy, numpy.float32)
+        self._check(
+            {'kind': 'reduction', 'definition': definition,
+             'dtypes': ['float32'], 'ndim': 2, 'out_ndim': 1},
+            lambda: kernel(a, axis=1))
+
+
+@testing.gpu
+class TestRecording(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.cache_dir, 'kernels.jsonl')
+        compiler.get_memory_cache().clear()
+
+    def tearDown(self):
+        precompile.stop_recording()
+        shutil.rmtree(self.cache_dir)
+        compiler.get_memory_cache().clear()
+
+    def test_record_and_precompile(self):
+        kernel = core.ElementwiseKernel(
+            'T x, T y', 'T z', 'z = x * 5 - y', 'test_recording')
+        a = testing.shaped_arange((2, 3), cupy, numpy.float32)
+        with mock.patch.dict(os.environ, {'CUPY_CACHE_DIR': self.cache_dir}):
+            precompile.start_recording(self.path)
+            kernel(a, a[0])
+            precompile.stop_recording()
+            entries = precompile.load_manifest(self.path)
+            results = precompile.precompile(entries)
+        self.assertEqual(len(results), 1)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.cache_dir, results[0]['key'])))
@@ -0,0 +1,129 @@
+import unittest
+
+from cupy.cuda import cufft
+from cupy.fft import cache
+
+
+class DummyPlan(object):
+
+    def __init__(self, nx, fft_type, batch, work_size):
+        self.nx = nx
+        self.fft_type = fft_type
+        self.batch = batch
+        self.work_size = work_size
+
+
+class DummyPlanFactory(object):
+
+    def __init__(self, work_size=1024):
+        self.work_size = work_size
+        self.created = []
+
+    def __call__(self, nx, fft_type, batch):
+        plan = DummyPlan(nx, fft_type, batch, self.work_size)
+        self.created.append(plan)
+        return plan
+
+
+class TestPlanCache(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = DummyPlanFactory()
+
+    def _cache(self, size=16, memsize=-1):
+        return cache.PlanCache(size, memsize, plan_factory=self.factory)
+
+    def test_hit(self):
+        c = self._cache()
+        p1 = c.get_plan(8, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        p2 = c.get_plan(8, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        self.assertIs(p1, p2)
+        self.assertEqual(len(self.factory.created), 1)
+        info = c.get_info()
+        self.assertEqual(info['hits'], 1)
+        self.assertEqual(info['misses'], 1)
+        self.assertEqual(info['n_plans'], 1)
+        self.assertEqual(info['curr_memsize'], 1024)
+
+    def test_key(self):
+        c = self._cache()
+        c.get_plan(8, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        c.get_plan(16, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        c.get_plan(8, cufft.CUFFT_Z2Z, 1, stream_ptr=0)
+        c.get_plan(8, cufft.CUFFT_C2C, 2, stream_ptr=0)
+        c.get_plan(8, cufft.CUFFT_C2C, 1, stream_ptr=1)
+        self.assertEqual(len(c), 5)
+        self.assertEqual(c.get_info()['hits'], 0)
+
+    def test_lru_eviction_by_size(self):
+        c = self._cache(size=2)
+        c.get_plan(1, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        c.get_plan(2, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        # Touch the first plan so that the second one is evicted.
+        c.get_plan(1, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        c.get_plan(3, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        self.assertEqual(
+            c.keys(),
+            [(1, cufft.CUFFT_C2C, 1, 0), (3, cufft.CUFFT_C2C, 1, 0)])
+        self.assertEqual(c.get_info()['evictions'], 1)
+
+    def test_eviction_by_memsize(self):
+        c = self._cache(memsize=2048)
+        for nx in (1, 2, 3):
+            c.get_plan(nx, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        self.assertEqual(len(c), 2)
+        self.assertEqual(c.curr_memsize, 2048)
+        self.assertNotIn((1, cufft.CUFFT_C2C, 1, 0), c)
+
+    def test_plan_larger_than_memsize(self):
+        c = self._cache(memsize=512)
+        plan = c.get_plan(1, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        self.assertIsNotNone(plan)
+        self.assertEqual(len(c), 0)
+        self.assertEqual(c.curr_memsize, 0)
+
+    def test_disabled(self):
+        c = self._cache(size=0)
+        c.get_plan(1, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        c.get_plan(1, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        self.assertEqual(len(c), 0)
+        self.assertEqual(len(self.factory.created), 2)
+
+    def test_set_size(self):
+        c = self._cache()
+        for nx in (1, 2, 3):
+            c.get_plan(nx, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        c.set_size(1)
+        self.assertEqual(c.keys(), [(3, cufft.CUFFT_C2C, 1, 0)])
+        self.assertEqual(c.curr_memsize, 1024)
+
+    def test_set_memsize(self):
+        c = self._cache()
+        for nx in (1, 2, 3):
+            c.get_plan(nx, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        c.set_memsize(0)
+        self.assertEqual(len(c), 0)
+        self.assertEqual(c.curr_memsize, 0)
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            self._cache(size=-2)
+        with self.assertRaises(ValueError):
+            self._cache().set_memsize(-2)
+
+    def test_clear(self):
+        c = self._cache()
+        c.get_plan(1, cufft.CUFFT_C2C, 1, stream_ptr=0)
+        c.clear()
+        self.assertEqual(len(c), 0)
+        info = c.get_info()
+        self.assertEqual(info['curr_memsize'], 0)
+        self.assertEqual(info['misses'], 0)
+
+
+class TestGetPlanCache(unittest.TestCase):
+
+    def test_per_device(self):
+        c0 = cache.get_plan_cache(0)
+        self.assertIs(c0, cache.get_plan_cache(0))
+        self.assertIsNot(c0, cache.get_plan_cache(1))
@@ -1,7 +1,11 @@
 import unittest
 
+import mock
 import numpy as np
 
+import cupy
+from cupy.fft import config
+from cupy.fft import fft as fft_module
 from cupy import testing
 
 
@@ -370,3 +374,174 @@ class TestFftshift(unittest.TestCase):
         out = xp.fft.ifftshift(x, self.axes)
 
         return out
+
+
+class TestNdPlanIsPossible(unittest.TestCase):
+
+    def test_trailing_axes(self):
+        self.assertTrue(fft_module._nd_plan_is_possible((-2, -1), 3, 'C2C'))
+        self.assertTrue(fft_module._nd_plan_is_possible((1, 2), 3, 'C2C'))
+        self.assertTrue(fft_module._nd_plan_is_possible((-1, -2), 2, 'C2C'))
+        self.assertTrue(
+            fft_module._nd_plan_is_possible((-3, -2, -1), 4, 'R2C'))
+
+    def test_non_trailing_axes(self):
+        self.assertFalse(fft_module._nd_plan_is_possible((0, 1), 3, 'C2C'))
+        self.assertFalse(fft_module._nd_plan_is_possible((0, 2), 3, 'C2C'))
+
+    def test_rank(self):
+        self.assertFalse(fft_module._nd_plan_is_possible((-1,), 2, 'C2C'))
+        self.assertFalse(
+            fft_module._nd_plan_is_possible((0, 1, 2, 3), 4, 'C2C'))
+
+    def test_real(self):
+        # The last axis of R2C transforms must be the last axis of the array
+        self.assertFalse(fft_module._nd_plan_is_possible((-1, -2), 2, 'R2C'))
+        self.assertFalse(fft_module._nd_plan_is_possible((-2, -1), 2, 'C2R'))
+
+
+@testing.parameterize(*testing.product({
+    'shape': [(3, 4), (2, 3, 4), (2, 3, 4, 5)],
+    'axes': [None, (-2, -1), (-1, -2), (0, 1)],
+}))
+@testing.gpu
+class TestFftnPlanPath(unittest.TestCase):
+
+    def _transform(self, func, a):
+        old = config.enable_nd_planning
+        try:
+            config.enable_nd_planning = False
+            expected = func(a, axes=self.axes)
+            config.enable_nd_planning = True
+            actual = func(a, axes=self.axes)
+        finally:
+            config.enable_nd_planning = old
+        testing.assert_allclose(actual, expected, rtol=1e-4, atol=1e-7)
+
+    @testing.for_float_dtypes()
+    def test_fftn(self, dtype):
+        a = testing.shaped_random(self.shape, cupy, dtype)
+        self._transform(cupy.fft.fftn, a)
+
+    @testing.for_float_dtypes()
+    def test_rfftn(self, dtype):
+        a = testing.shaped_random(self.shape, cupy, dtype)
+        self._transform(cupy.fft.rfftn, a)
+
+
+class TestOutputArrayHelpers(unittest.TestCase):
+
+    def test_output_shape_and_dtype_c2c(self):
+        shape, dtype = fft_module._get_output_shape_and_dtype(
+            (3, 4), np.complex64, 'C2C')
+        self.assertEqual(shape, (3, 4))
+        self.assertEqual(dtype, np.complex64)
+
+    def test_output_shape_and_dtype_r2c(self):
+        shape, dtype = fft_module._get_output_shape_and_dtype(
+            (3, 4), np.float64, 'R2C', axis=0)
+        self.assertEqual(shape, (2, 4))
+        self.assertEqual(dtype, np.complex128)
+
+    def test_output_shape_and_dtype_c2r(self):
+        shape, dtype = fft_module._get_output_shape_and_dtype(
+            (3, 4), np.complex64, 'C2R', out_size=6)
+        self.assertEqual(shape, (3, 6))
+        self.assertEqual(dtype, np.float32)
+
+    def _array(self, c_contiguous=True, base=None):
+        a = mock.Mock()
+        a.flags.c_contiguous = c_contiguous
+        a.base = base
+        return a
+
+    def test_can_exec_inplace(self):
+        a = self._array()
+        self.assertTrue(fft_module._can_exec_inplace(a, 'C2C', True))
+        self.assertFalse(fft_module._can_exec_inplace(a, 'C2C', False))
+        self.assertFalse(fft_module._can_exec_inplace(a, 'R2C', True))
+        self.assertFalse(fft_module._can_exec_inplace(a, 'C2R', True))
+
+    def test_cannot_exec_inplace_on_view(self):
+        a = self._array(base=self._array())
+        self.assertFalse(fft_module._can_exec_inplace(a, 'C2C', True))
+        a = self._array(c_contiguous=False)
+        self.assertFalse(fft_module._can_exec_inplace(a, 'C2C', True))
+
+    def test_get_output_array_inplace(self):
+        plan = mock.Mock()
+        a = self._array()
+        self.assertIs(
+            fft_module._get_output_array(plan, a, 'C2C', True, None, None),
+            a)
+        self.assertFalse(plan.get_output_array.called)
+
+    def test_get_output_array_out_of_place(self):
+        plan = mock.Mock()
+        a = self._array()
+        ret = fft_module._get_output_array(plan, a, 'C2C', False, None, None)
+        self.assertIs(ret, plan.get_output_array.return_value)
+
+    def test_get_output_array_out(self):
+        plan = mock.Mock()
+        a = self._array()
+        out = self._array()
+        self.assertIs(
+            fft_module._get_output_array(plan, a, 'C2C', True, out, None),
+            out)
+
+
+@testing.gpu
+class TestFftOut(unittest.TestCase):
+
+    @testing.for_complex_dtypes()
+    def test_fft_out(self, dtype):
+        a = testing.shaped_random((3, 4), cupy, dtype)
+        out = cupy.empty_like(a)
+        ret = cupy.fft.fft(a, out=out)
+        self.assertIs(ret, out)
+        testing.assert_allclose(out, cupy.fft.fft(a), rtol=1e-4, atol=1e-7)
+
+    @testing.for_complex_dtypes()
+    def test_fft_out_non_last_axis(self, dtype):
+        a = testing.shaped_random((3, 4), cupy, dtype)
+        out = cupy.empty_like(a)
+        ret = cupy.fft.fft(a, axis=0, out=out)
+        self.assertIs(ret, out)
+        testing.assert_allclose(
+            out, cupy.fft.fft(a, axis=0), rtol=1e-4, atol=1e-7)
+
+    @testing.for_float_dtypes(no_float16=True)
+    def test_rfftn_out(self, dtype):
+        a = testing.shaped_random((2, 3, 4), cupy, dtype)
+        expected = cupy.fft.rfftn(a)
+        out = cupy.empty_like(expected)
+        cupy.fft.rfftn(a, out=out)
+        testing.assert_allclose(out, expected, rtol=1e-4, atol=1e-7)
+
+    def test_out_invalid_shape(self):
+        a = testing.shaped_random((3, 4), cupy, np.complex64)
+        out = cupy.empty((3, 3), np.complex64)
+        with self.assertRaises(ValueError):
+            cupy.fft.fft(a, out=out)
+
+    def test_out_invalid_dtype(self):
+        a = testing.shaped_random((3, 4), cupy, np.complex64)
+        out = cupy.empty((3, 4), np.complex128)
+        with self.assertRaises(TypeError):
+            cupy.fft.fft(a, out=out)
+
+    @testing.for_complex_dtypes()
+    def test_fftn_overwrite_x(self, dtype):
+        a = testing.shaped_random((2, 3, 4), cupy, dtype)
+        expected = cupy.fft.fftn(a)
+        ret = cupy.fft.fftn(a, overwrite_x=True)
+        self.assertIs(ret, a)
+        testing.assert_allclose(ret, expected, rtol=1e-4, atol=1e-7)
+
+    @testing.for_complex_dtypes()
+    def test_fft_not_overwrite_x(self, dtype):
+        a = testing.shaped_random((3, 4), cupy, dtype)
+        a_copy = a.copy()
+        cupy.fft.fft(a)
+        testing.assert_array_equal(a, a_copy)
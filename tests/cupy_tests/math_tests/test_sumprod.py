@@ -192,6 +192,20 @@ class TestCumsum(unittest.TestCase):
         a = testing.shaped_arange(tuple(six.moves.range(4, 4 + n)), xp, dtype)
         return xp.cumsum(a, axis=self.axis)
 
+    @testing.for_all_dtypes(no_float16=True)
+    @testing.numpy_cupy_allclose(rtol=1e-4, contiguous_check=False)
+    def test_cumsum_axis_large(self, xp, dtype):
+        a = testing.shaped_random((3, 4, 500), xp, dtype)
+        return xp.cumsum(a, axis=self.axis)
+
+    @testing.for_all_dtypes()
+    @testing.numpy_cupy_allclose()
+    def test_cumsum_out(self, xp, dtype):
+        a = testing.shaped_arange((4, 5), xp, dtype)
+        out = xp.zeros((4, 5), dtype=dtype)
+        xp.cumsum(a, axis=1, out=out)
+        return out
+
     @testing.for_all_dtypes()
     @testing.with_requires('numpy>=1.13')
     @testing.numpy_cupy_raises()
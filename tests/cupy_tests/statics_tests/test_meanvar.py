@@ -1,5 +1,8 @@
 import unittest
 
+import numpy
+
+import cupy
 from cupy import testing
 
 
@@ -127,3 +130,76 @@ class TestMeanVar(unittest.TestCase):
     def test_external_std_axis_ddof(self, xp, dtype):
         a = testing.shaped_arange((2, 3, 4), xp, dtype)
         return xp.std(a, axis=1, ddof=1)
+
+    @testing.for_all_dtypes(no_complex=True)
+    @testing.numpy_cupy_allclose()
+    def test_var_keepdims(self, xp, dtype):
+        a = testing.shaped_arange((2, 3, 4), xp, dtype)
+        return a.var(axis=(0, 2), keepdims=True)
+
+    @testing.for_dtypes('fd')
+    @testing.numpy_cupy_allclose(rtol=1e-6)
+    def test_var_out(self, xp, dtype):
+        a = testing.shaped_arange((2, 3, 4), xp, dtype)
+        out = xp.empty((2, 4), 'd')
+        xp.var(a, axis=1, out=out)
+        return out
+
+    @testing.for_dtypes('fd')
+    @testing.numpy_cupy_allclose(rtol=1e-6)
+    def test_std_out(self, xp, dtype):
+        a = testing.shaped_arange((2, 3, 4), xp, dtype)
+        out = xp.empty((2, 4), 'd')
+        xp.std(a, axis=1, out=out)
+        return out
+
+    @testing.numpy_cupy_allclose(rtol=1e-5)
+    def test_var_large(self, xp):
+        # The mean is large compared to the deviation.
+        a = testing.shaped_random((1 << 20,), xp, 'd') + 1e4
+        return a.var()
+
+    @testing.numpy_cupy_allclose()
+    def test_var_ddof_too_large(self, xp):
+        a = testing.shaped_arange((2, 3), xp, 'd')
+        return a.var(axis=1, ddof=3)
+
+
+@testing.gpu
+class TestMeanVarFused(unittest.TestCase):
+
+    _multiprocess_can_split_ = True
+
+    def check(self, shape, dtype, rtol=1e-5, **kwargs):
+        a = testing.shaped_random(shape, cupy, dtype)
+        a_cpu = a.get()
+        mean, var = cupy.mean_var(a, **kwargs)
+        ddof = kwargs.pop('ddof', 0)
+        testing.assert_allclose(
+            mean, a_cpu.mean(**kwargs), rtol=rtol)
+        testing.assert_allclose(
+            var, a_cpu.var(ddof=ddof, **kwargs), rtol=rtol)
+        self.assertEqual(mean.dtype, var.dtype)
+
+    @testing.for_all_dtypes(no_complex=True, no_float16=True)
+    def test_mean_var_all(self, dtype):
+        self.check((2, 3, 4), dtype)
+
+    @testing.for_all_dtypes(no_complex=True, no_float16=True)
+    def test_mean_var_axis(self, dtype):
+        self.check((2, 3, 4), dtype, axis=1, ddof=1)
+
+    def test_mean_var_float16(self):
+        self.check((2, 3, 4), numpy.float16, rtol=1e-3, axis=(0, 2))
+
+    def test_mean_var_keepdims(self):
+        self.check((2, 3, 4), numpy.float32, axis=2, keepdims=True)
+
+    def test_mean_var_large(self):
+        self.check((1 << 20, 3), numpy.float64, axis=0)
+
+    def test_mean_var_dtype(self):
+        a = testing.shaped_arange((2, 3), cupy, 'i')
+        mean, var = cupy.mean_var(a, dtype='f')
+        self.assertEqual(mean.dtype, numpy.float32)
+        self.assertEqual(var.dtype, numpy.float32)
@@ -0,0 +1,182 @@
+import os
+import unittest
+
+import mock
+
+import cupy
+from cupy import cuda
+from cupy import testing
+from cupy import util
+
+
+class TestMemoize(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def _memoize(self, **kwargs):
+        @util.memoize(**kwargs)
+        def f(x, y=0):
+            self.calls.append((x, y))
+            return x + y
+        return f
+
+    def test_memoize(self):
+        f = self._memoize()
+        self.assertEqual(f(1), 1)
+        self.assertEqual(f(1), 1)
+        self.assertEqual(f(1, y=2), 3)
+        self.assertEqual(self.calls, [(1, 0), (1, 2)])
+
+    def test_stats(self):
+        f = self._memoize()
+        f(1)
+        f(1)
+        f(2)
+        self.assertEqual(
+            f._memo.stats(),
+            {'hits': 1, 'misses': 2, 'evictions': 0, 'size': 2,
+             'maxsize': None})
+
+    def test_memo_stats(self):
+        @util.memoize(maxsize=4)
+        def memo_stats_target():
+            return 1
+        memo_stats_target()
+        stats = util.memo_stats()[__name__ + '.memo_stats_target']
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['maxsize'], 4)
+
+    def test_none_result(self):
+        @util.memoize()
+        def g():
+            self.calls.append(None)
+        g()
+        g()
+        self.assertEqual(len(self.calls), 1)
+
+    def test_maxsize(self):
+        f = self._memoize(maxsize=2)
+        f(1)
+        f(2)
+        # Touch the first result so that the second one is evicted.
+        f(1)
+        f(3)
+        self.assertEqual(f._memo.stats()['evictions'], 1)
+        self.assertEqual(f._memo.stats()['size'], 2)
+        del self.calls[:]
+        f(1)
+        f(3)
+        self.assertEqual(self.calls, [])
+        f(2)
+        self.assertEqual(self.calls, [(2, 0)])
+
+    def test_maxsize_zero(self):
+        f = self._memoize(maxsize=0)
+        f(1)
+        f(1)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(f._memo.stats()['size'], 0)
+
+    def test_invalid_maxsize(self):
+        with self.assertRaises(ValueError):
+            util.memoize(maxsize=-1)
+
+    def test_set_maxsize(self):
+        f = self._memoize()
+        f(1)
+        f(2)
+        f(3)
+        util.set_memo_maxsize(1, f)
+        self.assertEqual(
+            f._memo.stats(),
+            {'hits': 0, 'misses': 3, 'evictions': 2, 'size': 1,
+             'maxsize': 1})
+        del self.calls[:]
+        f(3)
+        self.assertEqual(self.calls, [])
+        util.set_memo_maxsize(None, f)
+        self.assertIsNone(f._memo.stats()['maxsize'])
+
+    def test_set_invalid_maxsize(self):
+        with self.assertRaises(ValueError):
+            util.set_memo_maxsize(-1, self._memoize())
+
+    def test_clear_func(self):
+        f = self._memoize()
+        g = self._memoize()
+        f(1)
+        g(1)
+        util.clear_memo(f)
+        f(1)
+        g(1)
+        self.assertEqual(self.calls, [(1, 0), (1, 0), (1, 0)])
+
+    def test_clear_not_memoized(self):
+        with self.assertRaises(TypeError):
+            util.clear_memo(len)
+
+
+class TestKernelMemoMaxsize(unittest.TestCase):
+
+    def test_default(self):
+        with mock.patch.dict(os.environ, {'CUPY_KERNEL_MEMO_MAXSIZE': ''}):
+            self.assertEqual(util.get_kernel_memo_maxsize(), 1024)
+
+    def test_env(self):
+        with mock.patch.dict(os.environ, {'CUPY_KERNEL_MEMO_MAXSIZE': '16'}):
+            self.assertEqual(util.get_kernel_memo_maxsize(), 16)
+        with mock.patch.dict(os.environ, {'CUPY_KERNEL_MEMO_MAXSIZE': '0'}):
+            self.assertIsNone(util.get_kernel_memo_maxsize())
+
+    def test_invalid(self):
+        for val in ('x', '-1'):
+            with mock.patch.dict(os.environ,
+                                 {'CUPY_KERNEL_MEMO_MAXSIZE': val}):
+                with self.assertRaises(ValueError):
+                    util.get_kernel_memo_maxsize()
+
+    def test_kernel_getters_are_bounded(self):
+        memo = cupy.core.core._get_elementwise_kernel._memo
+        self.assertEqual(
+            memo.stats()['maxsize'], util.get_kernel_memo_maxsize())
+
+
+@testing.gpu
+class TestElementwiseKernelMemoEviction(unittest.TestCase):
+
+    def setUp(self):
+        self.getter = cupy.core.core._get_elementwise_kernel
+        self.maxsize = self.getter._memo.maxsize
+        util.set_memo_maxsize(1, self.getter)
+        util.clear_memo(self.getter)
+
+    def tearDown(self):
+        util.set_memo_maxsize(
+            None if self.maxsize < 0 else self.maxsize, self.getter)
+
+    def test_eviction(self):
+        x = cupy.arange(3)
+        evictions = self.getter._memo.stats()['evictions']
+        for i in range(3):
+            kernel = cupy.ElementwiseKernel(
+                'T x', 'T y', 'y = x + {}'.format(i), 'memo_eviction')
+            testing.assert_array_equal(kernel(x), x + i)
+        stats = self.getter._memo.stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['evictions'], evictions + 2)
+
+
+@testing.gpu
+class TestMemoizeForEachDevice(unittest.TestCase):
+
+    def test_clear_device(self):
+        @util.memoize(for_each_device=True)
+        def f(x):
+            return x
+        f(1)
+        device_id = cuda.Device().id
+        util.clear_memo(f, device_id=device_id + 1)
+        self.assertEqual(f._memo.stats()['size'], 1)
+        util.clear_memo(f, device_id=device_id)
+        self.assertEqual(f._memo.stats()['size'], 0)